@@ -0,0 +1,166 @@
+"""
+A client turning individual ``get`` calls into ``get_many`` calls.
+
+Code that reads keys one at a time in a loop pays a network round trip per
+key. The :py:class:`BatchingClient` collects the keys asked for with
+``load`` and only sends them, as a single ``get_many``, when one of the
+results is actually needed:
+
+.. code-block:: python
+
+    from pymemcache.batching import BatchingClient
+    from pymemcache.client.hash import HashClient
+
+    client = BatchingClient(HashClient(servers))
+    futures = [client.load(key) for key in keys]
+    values = [future.result() for future in futures]  # one get_many
+
+With a ``HashClient``, the ``get_many`` is split into one request per
+server. ``get`` (and ``get_many``) calls made from several threads are
+batched together as well: before sending a batch, the client waits up to
+``max_delay`` seconds for other threads to add keys to it. Every other
+method is forwarded as is to the wrapped client, which must be thread-safe
+when the ``BatchingClient`` is shared between threads.
+"""
+
+import sys
+import threading
+
+import six
+
+
+class BatchFuture(object):
+    """The eventual value of a key passed to :py:meth:`BatchingClient.load`.
+    """
+
+    def __init__(self, loader, key, batch):
+        self.key = key
+        self._loader = loader
+        self._batch = batch
+        self._event = threading.Event()
+        self._value = None
+        self._exc_info = None
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self):
+        """Return the value of the key (None if it wasn't found), sending
+        the batch the key belongs to if it wasn't sent yet."""
+        if not self._event.is_set():
+            self._loader._dispatch(self._batch)
+            self._event.wait()
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+        return self._value
+
+    def _set(self, value=None, exc_info=None):
+        self._value = value
+        self._exc_info = exc_info
+        self._event.set()
+
+
+class BatchingClient(object):
+    """
+    Args:
+      client: the client used to talk to memcached.
+      max_delay: float, seconds to wait for other threads to add keys to a
+                 batch before sending it. Defaults to 0.001, use 0 to send
+                 batches as soon as a result is needed.
+      max_batch_size: int, a batch is sent as soon as it contains that many
+                      keys.
+      lock_generator: a callback/type that takes no arguments that will be
+                      called to create the lock protecting the batches.
+    """
+
+    def __init__(self, client, max_delay=0.001, max_batch_size=100,
+                 lock_generator=None):
+        if max_batch_size < 1:
+            raise ValueError('"max_batch_size" must be at least 1')
+        self.client = client
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size
+        if lock_generator is None:
+            lock = threading.Lock()
+        else:
+            lock = lock_generator()
+        self._cond = threading.Condition(lock)
+        self._batch = []
+
+    def _take(self, batch):
+        # Must be called with the lock held
+        if batch is not self._batch:
+            return None
+        self._batch = []
+        self._cond.notify_all()
+        return batch
+
+    def _dispatch(self, batch):
+        with self._cond:
+            if batch is not self._batch:
+                # Already sent by another thread
+                return
+            if self.max_delay and len(batch) < self.max_batch_size:
+                self._cond.wait(self.max_delay)
+            batch = self._take(batch)
+
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch):
+        keys = list(set(future.key for future in batch))
+        try:
+            result = self.client.get_many(keys)
+        except Exception:
+            exc_info = sys.exc_info()
+            for future in batch:
+                future._set(exc_info=exc_info)
+            return
+
+        for future in batch:
+            future._set(result.get(future.key))
+
+    def load(self, key):
+        """
+        Add ``key`` to the next batch.
+
+        Returns:
+          A :py:class:`BatchFuture` for the value of the key.
+        """
+        return self.load_many([key])[0]
+
+    def load_many(self, keys):
+        """Add ``keys`` to the next batch, and return a list of
+        :py:class:`BatchFuture` (in the same order)."""
+        futures = []
+        full = []
+        with self._cond:
+            for key in keys:
+                future = BatchFuture(self, key, self._batch)
+                self._batch.append(future)
+                futures.append(future)
+                if len(self._batch) >= self.max_batch_size:
+                    full.append(self._take(self._batch))
+
+        for batch in full:
+            self._send(batch)
+        return futures
+
+    def get(self, key, default=None):
+        value = self.load(key).result()
+        if value is None:
+            return default
+        return value
+
+    def get_many(self, keys):
+        result = {}
+        for future in self.load_many(keys):
+            value = future.result()
+            if value is not None:
+                result[future.key] = value
+        return result
+
+    get_multi = get_many
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
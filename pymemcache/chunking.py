@@ -0,0 +1,257 @@
+"""
+A client storing values larger than the memcached item size limit.
+
+Memcached refuses items larger than its item size limit (1MB by default).
+The :py:class:`ChunkingClient` serializes values itself, and splits the
+ones that don't fit in a single item into chunks:
+
+.. code-block:: python
+
+    from pymemcache import serde
+    from pymemcache.chunking import ChunkingClient
+    from pymemcache.client.hash import HashClient
+
+    client = ChunkingClient(HashClient(servers),
+                            serializer=serde.python_memcache_serializer,
+                            deserializer=serde.python_memcache_deserializer)
+    client.set('features', large_array)
+    client.get('features')
+
+A chunked value is stored as a manifest under its own key, and chunks under
+``key:generation:index`` keys. Every write uses a new random generation, so
+that a reader never mixes the chunks of two writes, and the manifest holds a
+checksum of the whole value, checked before deserializing it. Values are
+read with a ``get`` (or ``get_many``) for the manifests followed by a single
+``get_many`` for all the chunks.
+
+The wrapped client must store bytes as is, that is have no serializer (or
+one leaving bytes untouched). Values are stored with a small header, which
+clients other than a ``ChunkingClient`` won't understand. Only ``get``,
+``get_many``, ``set``, ``set_many``, ``add``, ``replace``, ``delete`` and
+``delete_many`` support chunked values, other methods are forwarded as is
+to the wrapped client. Deleting a chunked value only deletes its manifest,
+the chunks are left to expire or be evicted.
+"""
+
+import binascii
+import logging
+import os
+import struct
+import zlib
+
+import six
+
+# Room for the key and the item header
+DEFAULT_CHUNK_SIZE = 1024 * 1024 - 1024
+
+_SINGLE = 0
+_MANIFEST = 1
+# kind, flags
+_SINGLE_HEADER = struct.Struct('>BI')
+# kind, flags, length, chunk count, crc32, followed by the generation
+_MANIFEST_HEADER = struct.Struct('>BIIII')
+
+
+def _to_bytes(key):
+    if isinstance(key, six.text_type):
+        return key.encode('utf8')
+    return key
+
+
+def _chunk_keys(key, generation, count):
+    prefix = _to_bytes(key) + b':' + generation + b':'
+    return [prefix + str(index).encode('ascii') for index in range(count)]
+
+
+class ChunkingClient(object):
+    """
+    Args:
+      client: the client used to talk to memcached, storing bytes as is.
+      serializer: optional function, see the notes of
+                  :py:class:`pymemcache.client.base.Client`.
+      deserializer: optional function, see the notes of
+                    :py:class:`pymemcache.client.base.Client`.
+      chunk_size: int, maximum size of the stored items. Defaults to a bit
+                  less than the default memcached item size limit.
+    """
+
+    def __init__(self, client, serializer=None, deserializer=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        if chunk_size <= _MANIFEST_HEADER.size:
+            raise ValueError('"chunk_size" is too small')
+        self.client = client
+        self.serializer = serializer
+        self.deserializer = deserializer
+        self.chunk_size = chunk_size
+
+    def _encode(self, key, value):
+        """
+        Serialize a value.
+
+        Returns:
+          A tuple (item, chunks) of the bytes to store under ``key``, and a
+          dict of the chunk keys and chunks to store along with it.
+        """
+        flags = 0
+        if self.serializer:
+            value, flags = self.serializer(key, value)
+        if not isinstance(value, six.binary_type):
+            value = six.text_type(value).encode('ascii')
+
+        if len(value) + _SINGLE_HEADER.size <= self.chunk_size:
+            return _SINGLE_HEADER.pack(_SINGLE, flags) + value, {}
+
+        generation = binascii.hexlify(os.urandom(4))
+        size = self.chunk_size
+        count = (len(value) + size - 1) // size
+        chunks = dict(
+            (chunk_key, value[index * size:(index + 1) * size])
+            for index, chunk_key in enumerate(
+                _chunk_keys(key, generation, count)))
+        manifest = _MANIFEST_HEADER.pack(
+            _MANIFEST, flags, len(value), count,
+            zlib.crc32(value) & 0xffffffff) + generation
+        return manifest, chunks
+
+    def _decode(self, key, value, flags):
+        if self.deserializer:
+            return self.deserializer(key, value, flags)
+        return value
+
+    def _parse(self, key, item):
+        """
+        Parse the item stored under ``key``.
+
+        Returns:
+          A tuple (value, manifest), either the deserialized value of a
+          single item, or a tuple (flags, length, crc32, chunk keys) for a
+          chunked one. Both are None for invalid items.
+        """
+        kind = six.indexbytes(item, 0) if item else None
+        if kind == _SINGLE and len(item) >= _SINGLE_HEADER.size:
+            _, flags = _SINGLE_HEADER.unpack_from(item)
+            value = item[_SINGLE_HEADER.size:]
+            return self._decode(key, value, flags), None
+        elif kind == _MANIFEST and len(item) > _MANIFEST_HEADER.size:
+            _, flags, length, count, crc = _MANIFEST_HEADER.unpack_from(item)
+            generation = item[_MANIFEST_HEADER.size:]
+            chunk_keys = _chunk_keys(key, generation, count)
+            return None, (flags, length, crc, chunk_keys)
+
+        logging.info('Invalid item for key %r', key)
+        return None, None
+
+    def _assemble(self, key, manifest, chunks):
+        flags, length, crc, chunk_keys = manifest
+        try:
+            value = b''.join([chunks[chunk_key] for chunk_key in chunk_keys])
+        except KeyError:
+            # Some chunks were evicted
+            return None
+        if len(value) != length or zlib.crc32(value) & 0xffffffff != crc:
+            logging.info('Corrupted chunked value for key %r', key)
+            return None
+        return self._decode(key, value, flags)
+
+    def _store(self, name, key, value, expire, noreply):
+        item, chunks = self._encode(key, value)
+        if chunks:
+            # Chunks first, so that the manifest never points to missing
+            # chunks
+            failed = self.client.set_many(chunks, expire=expire,
+                                          noreply=False)
+            if failed:
+                return False
+        return getattr(self.client, name)(key, item, expire=expire,
+                                          noreply=noreply)
+
+    def set(self, key, value, expire=0, noreply=None):
+        return self._store('set', key, value, expire, noreply)
+
+    def add(self, key, value, expire=0, noreply=None):
+        return self._store('add', key, value, expire, noreply)
+
+    def replace(self, key, value, expire=0, noreply=None):
+        return self._store('replace', key, value, expire, noreply)
+
+    def set_many(self, values, expire=0, noreply=None):
+        items = {}
+        chunks = {}
+        chunked_keys = {}
+        for key, value in six.iteritems(values):
+            items[key], value_chunks = self._encode(key, value)
+            chunks.update(value_chunks)
+            for chunk_key in value_chunks:
+                chunked_keys[chunk_key] = key
+
+        failed = set()
+        if chunks:
+            for chunk_key in self.client.set_many(chunks, expire=expire,
+                                                  noreply=False):
+                failed.add(chunked_keys[chunk_key])
+            for key in failed:
+                del items[key]
+
+        failed.update(self.client.set_many(items, expire=expire,
+                                           noreply=noreply))
+        return list(failed)
+
+    set_multi = set_many
+
+    def get(self, key, default=None):
+        item = self.client.get(key)
+        if item is None:
+            return default
+        value, manifest = self._parse(key, item)
+        if manifest is not None:
+            chunks = self.client.get_many(manifest[3])
+            value = self._assemble(key, manifest, chunks)
+        if value is None:
+            return default
+        return value
+
+    def get_many(self, keys):
+        result = {}
+        manifests = {}
+        for key, item in six.iteritems(self.client.get_many(keys)):
+            value, manifest = self._parse(key, item)
+            if manifest is not None:
+                manifests[key] = manifest
+            elif value is not None:
+                result[key] = value
+
+        if manifests:
+            chunk_keys = []
+            for manifest in six.itervalues(manifests):
+                chunk_keys.extend(manifest[3])
+            chunks = self.client.get_many(chunk_keys)
+            for key, manifest in six.iteritems(manifests):
+                value = self._assemble(key, manifest, chunks)
+                if value is not None:
+                    result[key] = value
+        return result
+
+    get_multi = get_many
+
+    def delete(self, key, noreply=None):
+        return self.client.delete(key, noreply=noreply)
+
+    def delete_many(self, keys, noreply=None):
+        return self.client.delete_many(keys, noreply=noreply)
+
+    delete_multi = delete_many
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def __setitem__(self, key, value):
+        self.set(key, value, noreply=True)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError
+        return value
+
+    def __delitem__(self, key):
+        self.delete(key, noreply=True)
@@ -15,7 +15,13 @@ import errno
 import socket
 import six
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 from pymemcache import pool
+from pymemcache.serde import _batch_hook
 
 from pymemcache.exceptions import (
     MemcacheClientError,
@@ -109,6 +115,71 @@ def _check_key(key, allow_unicode_keys, key_prefix=b''):
     return key
 
 
+class LazyValues(MutableMapping):
+    """
+    The result of ``get_many`` for a client created with
+    ``lazy_deserialize=True``: a mapping keeping the values as read from
+    memcached, and deserializing each of them the first time it is accessed.
+    Deserialization errors are therefore raised on access, and are not
+    covered by ``ignore_exc``.
+    """
+
+    def __init__(self):
+        # key -> deserialized value
+        self._values = {}
+        # key -> (deserializer, value, flags), not deserialized yet
+        self._raw = {}
+
+    def add_raw(self, key, deserializer, value, flags):
+        """Store a value to deserialize with ``deserializer`` on access."""
+        self._values.pop(key, None)
+        self._raw[key] = (deserializer, value, flags)
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            deserializer, value, flags = self._raw[key]
+        value = deserializer(key, value, flags)
+        self._values[key] = value
+        self._raw.pop(key, None)
+        return value
+
+    def __setitem__(self, key, value):
+        self._raw.pop(key, None)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        if self._raw.pop(key, None) is None:
+            del self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values or key in self._raw
+
+    def __iter__(self):
+        for key in list(self._values):
+            yield key
+        for key in list(self._raw):
+            yield key
+
+    def __len__(self):
+        return len(self._values) + len(self._raw)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+    def update(self, *args, **kwargs):
+        # Keep the values of another LazyValues undeserialized
+        if len(args) == 1 and not kwargs and isinstance(args[0], LazyValues):
+            other = args[0]
+            for key, value in six.iteritems(other._values):
+                self[key] = value
+            for key, raw in six.iteritems(other._raw):
+                self.add_raw(key, *raw)
+        else:
+            super(LazyValues, self).update(*args, **kwargs)
+
+
 class Client(object):
     """
     A client for a single memcached server.
@@ -175,6 +246,15 @@ class Client(object):
 
              raise Exception("Unknown flags for value: {1}".format(flags))
 
+     The serialization function may also have a ``serialize_many`` attribute
+     (or be the method of an object having one) taking a list of (key, value)
+     tuples and returning a list of (serialized value, flags) tuples. It is
+     then used by ``set_many`` instead of serializing values one by one.
+     Likewise, a ``deserialize_many`` taking a list of (key, value, flags)
+     tuples and returning a list of values is used by ``get_many`` and
+     ``gets_many``. :py:class:`pymemcache.serde.SerdeRegistry` and
+     :py:class:`pymemcache.serde.SerdePipeline` have both.
+
     *Error Handling*
 
      All of the methods in this class that talk to memcached can throw one of
@@ -206,7 +286,12 @@ class Client(object):
                  socket_module=socket,
                  key_prefix=b'',
                  default_noreply=True,
-                 allow_unicode_keys=False):
+                 allow_unicode_keys=False,
+                 hot_key_sampler=None,
+                 negative_cache=None,
+                 deserialize_executor=None,
+                 deserialize_executor_min_size=1024 * 1024,
+                 lazy_deserialize=False):
         """
         Constructor.
 
@@ -233,6 +318,25 @@ class Client(object):
             store commands (except from cas, incr, and decr, which default to
             False).
           allow_unicode_keys: bool, support unicode (utf8) keys
+          hot_key_sampler: optional :py:class:`pymemcache.hotkeys.HotKeySampler`
+            counting the keys read with the get* methods.
+          negative_cache: optional
+            :py:class:`pymemcache.negativecache.NegativeCache` remembering the
+            keys the get* methods didn't find, which are then left out of the
+            next requests.
+          deserialize_executor: optional object with a
+            ``submit(func, *args)`` method returning a future, such as a
+            ``concurrent.futures.ThreadPoolExecutor``, deserializing the
+            values of the get* methods in parallel while the rest of the
+            response is read. Only worth it for deserializers releasing the
+            GIL, such as the decompressing ones.
+          deserialize_executor_min_size: int, minimum total size of the
+            values of a response for them to be deserialized on
+            ``deserialize_executor``, smaller responses are deserialized
+            inline. Defaults to 1MB.
+          lazy_deserialize: optional bool, True to have ``get_many`` return a
+            :py:class:`LazyValues` deserializing each value the first time
+            it is accessed, instead of a dict. Defaults to False.
 
         Notes:
           The constructor does not make a connection to memcached. The first
@@ -254,6 +358,11 @@ class Client(object):
         self.key_prefix = key_prefix
         self.default_noreply = default_noreply
         self.allow_unicode_keys = allow_unicode_keys
+        self.hot_key_sampler = hot_key_sampler
+        self.negative_cache = negative_cache
+        self.deserialize_executor = deserialize_executor
+        self.deserialize_executor_min_size = deserialize_executor_min_size
+        self.lazy_deserialize = lazy_deserialize
 
     def check_key(self, key):
         """Checks key and add key_prefix."""
@@ -447,6 +556,8 @@ class Client(object):
         Returns:
           The value for the key, or default if the key wasn't found.
         """
+        if self.hot_key_sampler is not None:
+            self.hot_key_sampler.record(key)
         return self._fetch_cmd(b'get', [key], False).get(key, default)
 
     def get_many(self, keys):
@@ -464,6 +575,8 @@ class Client(object):
         if not keys:
             return {}
 
+        if self.hot_key_sampler is not None:
+            self.hot_key_sampler.record_many(keys)
         return self._fetch_cmd(b'get', keys, False)
 
     get_multi = get_many
@@ -482,6 +595,8 @@ class Client(object):
           or (default, cas_defaults) if the key was not found.
         """
         defaults = (default, cas_default)
+        if self.hot_key_sampler is not None:
+            self.hot_key_sampler.record(key)
         return self._fetch_cmd(b'gets', [key], True).get(key, defaults)
 
     def gets_many(self, keys):
@@ -499,6 +614,8 @@ class Client(object):
         if not keys:
             return {}
 
+        if self.hot_key_sampler is not None:
+            self.hot_key_sampler.record_many(keys)
         return self._fetch_cmd(b'gets', keys, True)
 
     def delete(self, key, noreply=None):
@@ -710,6 +827,8 @@ class Client(object):
         if noreply:
             cmd += b' noreply'
         cmd += b'\r\n'
+        if self.negative_cache is not None:
+            self.negative_cache.clear()
         results = self._misc_cmd([cmd], b'flush_all', noreply)
         if noreply:
             return True
@@ -740,12 +859,39 @@ class Client(object):
             raise MemcacheServerError(error)
 
     def _fetch_cmd(self, name, keys, expect_cas):
+        negative_cache = None
+        if self.negative_cache is not None and name in (b'get', b'gets'):
+            negative_cache = self.negative_cache
+            keys, generation = negative_cache.filter(keys)
+            if not keys:
+                return {}
+
         prefixed_keys = [self.check_key(k) for k in keys]
         remapped_keys = dict(zip(prefixed_keys, keys))
 
         # It is important for all keys to be listed in their original order.
         cmd = name + b' ' + b' '.join(prefixed_keys) + b'\r\n'
 
+        # Values are deserialized all at once when the deserializer supports
+        # it, as (key, value, flags) in raw and the cas tokens in cas_values.
+        # With an executor, they are kept there until their total size
+        # reaches deserialize_executor_min_size, and then deserialized on
+        # the executor (as (key, cas, future) in futures) while reading the
+        # rest of the response.
+        deserialize_many = None
+        executor = None
+        if self.deserializer:
+            if len(keys) > 1:
+                deserialize_many = _batch_hook(self.deserializer,
+                                               'deserialize_many')
+            executor = self.deserialize_executor
+        raw = []
+        cas_values = []
+        futures = []
+        raw_size = 0
+        # Values of get_many are only deserialized when accessed
+        lazy = self.lazy_deserialize and self.deserializer and name == b'get'
+
         try:
             if self.sock is None:
                 self._connect()
@@ -753,11 +899,27 @@ class Client(object):
             self.sock.sendall(cmd)
 
             buf = b''
-            result = {}
+            result = LazyValues() if lazy else {}
             while True:
                 buf, line = _readline(self.sock, buf)
                 self._raise_errors(line, name)
                 if line == b'END' or line == b'OK':
+                    if raw:
+                        if deserialize_many is not None:
+                            values = deserialize_many(raw)
+                        else:
+                            values = [self.deserializer(*item)
+                                      for item in raw]
+                        for (key, _, _), value, cas in zip(raw, values,
+                                                           cas_values):
+                            result[key] = (value, cas) if expect_cas else value
+                    for key, cas, future in futures:
+                        value = future.result()
+                        result[key] = (value, cas) if expect_cas else value
+                    if negative_cache is not None:
+                        negative_cache.add_many(
+                            [key for key in keys if key not in result],
+                            generation)
                     return result
                 elif line.startswith(b'VALUE'):
                     if expect_cas:
@@ -772,7 +934,24 @@ class Client(object):
                     buf, value = _readvalue(self.sock, buf, int(size))
                     key = remapped_keys[key]
 
-                    if self.deserializer:
+                    if lazy:
+                        result.add_raw(key, self.deserializer, value,
+                                       int(flags))
+                        continue
+                    elif (deserialize_many is not None or
+                            executor is not None):
+                        raw.append((key, value, int(flags)))
+                        cas_values.append(cas if expect_cas else None)
+                        raw_size += len(value)
+                        if (executor is not None and
+                                raw_size >= self.deserialize_executor_min_size):
+                            for item, cas in zip(raw, cas_values):
+                                futures.append((item[0], cas, executor.submit(
+                                    self.deserializer, *item)))
+                            del raw[:]
+                            del cas_values[:]
+                        continue
+                    elif self.deserializer:
                         value = self.deserializer(key, value, int(flags))
 
                     if expect_cas:
@@ -795,6 +974,9 @@ class Client(object):
             raise
 
     def _store_cmd(self, name, values, expire, noreply, cas=None):
+        if self.negative_cache is not None:
+            self.negative_cache.discard_many(values)
+
         cmds = []
         keys = []
 
@@ -805,16 +987,23 @@ class Client(object):
             extra += b' noreply'
         expire = six.text_type(expire).encode('ascii')
 
+        items = []
         for key, data in six.iteritems(values):
             # must be able to reliably map responses back to the original order
             keys.append(key)
+            items.append((self.check_key(key), data))
+
+        serialize_many = None
+        if self.serializer and len(items) > 1:
+            serialize_many = _batch_hook(self.serializer, 'serialize_many')
+        if serialize_many is not None:
+            serialized = serialize_many(items)
+        elif self.serializer:
+            serialized = [self.serializer(key, data) for key, data in items]
+        else:
+            serialized = [(data, 0) for key, data in items]
 
-            key = self.check_key(key)
-            if self.serializer:
-                data, flags = self.serializer(key, data)
-            else:
-                flags = 0
-
+        for (key, _), (data, flags) in zip(items, serialized):
             if not isinstance(data, six.binary_type):
                 try:
                     data = six.text_type(data).encode('ascii')
@@ -920,7 +1109,12 @@ class PooledClient(object):
                  max_pool_size=None,
                  lock_generator=None,
                  default_noreply=True,
-                 allow_unicode_keys=False):
+                 allow_unicode_keys=False,
+                 hot_key_sampler=None,
+                 negative_cache=None,
+                 deserialize_executor=None,
+                 deserialize_executor_min_size=1024 * 1024,
+                 lazy_deserialize=False):
         self.server = server
         self.serializer = serializer
         self.deserializer = deserializer
@@ -931,6 +1125,11 @@ class PooledClient(object):
         self.socket_module = socket_module
         self.default_noreply = default_noreply
         self.allow_unicode_keys = allow_unicode_keys
+        self.hot_key_sampler = hot_key_sampler
+        self.negative_cache = negative_cache
+        self.deserialize_executor = deserialize_executor
+        self.deserialize_executor_min_size = deserialize_executor_min_size
+        self.lazy_deserialize = lazy_deserialize
         if isinstance(key_prefix, six.text_type):
             key_prefix = key_prefix.encode('ascii')
         if not isinstance(key_prefix, bytes):
@@ -960,7 +1159,13 @@ class PooledClient(object):
                         socket_module=self.socket_module,
                         key_prefix=self.key_prefix,
                         default_noreply=self.default_noreply,
-                        allow_unicode_keys=self.allow_unicode_keys)
+                        allow_unicode_keys=self.allow_unicode_keys,
+                        hot_key_sampler=self.hot_key_sampler,
+                        negative_cache=self.negative_cache,
+                        deserialize_executor=self.deserialize_executor,
+                        deserialize_executor_min_size=(
+                            self.deserialize_executor_min_size),
+                        lazy_deserialize=self.lazy_deserialize)
         return client
 
     def close(self):
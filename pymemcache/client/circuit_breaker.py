@@ -0,0 +1,119 @@
+import collections
+import threading
+import time
+
+
+class CircuitBreaker(object):
+    """
+    Tracks the health of a single server.
+
+    The breaker starts ``closed`` and lets every request through. Once
+    ``failure_threshold`` failures have been recorded within ``window``
+    seconds it opens, and requests are rejected until ``retry_timeout``
+    seconds have passed. It then becomes ``half-open`` and lets a single
+    probe request through: a success closes the breaker again, while a
+    failure re-opens it for ``retry_timeout`` multiplied by
+    ``backoff_factor`` for every failed probe (capped at
+    ``max_retry_timeout``).
+
+    ``allow_request`` and ``record_success`` do not take the lock while the
+    breaker is closed, so a healthy server costs O(1) per request.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=1, window=60, retry_timeout=1,
+                 backoff_factor=2, max_retry_timeout=None,
+                 lock_generator=None):
+        if failure_threshold < 1:
+            raise ValueError('"failure_threshold" must be at least 1')
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.retry_timeout = retry_timeout
+        self.backoff_factor = backoff_factor
+        self.max_retry_timeout = max_retry_timeout
+        self.state = self.CLOSED
+        # Number of failed probes since the breaker was last closed.
+        self.retries = 0
+        self.retry_at = 0
+        self._failures = collections.deque(maxlen=failure_threshold)
+        if lock_generator is None:
+            self._lock = threading.Lock()
+        else:
+            self._lock = lock_generator()
+
+    def _retry_delay(self):
+        delay = self.retry_timeout * (self.backoff_factor ** self.retries)
+        if self.max_retry_timeout is not None:
+            delay = min(delay, self.max_retry_timeout)
+        return delay
+
+    def available(self):
+        """
+        Return True if ``allow_request`` would let a request through.
+
+        Unlike ``allow_request``, this never turns the breaker half-open.
+        """
+        if self.state == self.CLOSED:
+            return True
+        return time.time() >= self.retry_at
+
+    def allow_request(self):
+        """Return True if a request may be sent to the server."""
+        if self.state == self.CLOSED:
+            return True
+
+        with self._lock:
+            current_time = time.time()
+            if self.state == self.CLOSED:
+                return True
+            if current_time < self.retry_at:
+                return False
+            # Let a single probe through. Other requests keep being
+            # rejected until it reports back, or until another retry delay
+            # has passed in case it never does.
+            self.state = self.HALF_OPEN
+            self.retry_at = current_time + self._retry_delay()
+            return True
+
+    def record_success(self):
+        if self.state == self.CLOSED and not self._failures:
+            return
+        self.reset()
+
+    def record_failure(self):
+        with self._lock:
+            current_time = time.time()
+            if self.state == self.HALF_OPEN:
+                self.retries += 1
+            elif self.state == self.CLOSED:
+                self._failures.append(current_time)
+                if (len(self._failures) < self.failure_threshold or
+                        current_time - self._failures[0] > self.window):
+                    return
+                self.retries = 0
+            else:
+                # A request sent before the breaker opened has failed, the
+                # breaker already knows about it.
+                return
+
+            self._failures.clear()
+            self.state = self.OPEN
+            self.retry_at = current_time + self._retry_delay()
+
+    def trip(self, timeout):
+        """Open the breaker for ``timeout`` seconds, whatever its state."""
+        with self._lock:
+            self._failures.clear()
+            self.state = self.OPEN
+            self.retry_at = time.time() + timeout
+
+    def reset(self):
+        """Close the breaker and forget about previous failures."""
+        with self._lock:
+            self._failures.clear()
+            self.state = self.CLOSED
+            self.retries = 0
+            self.retry_at = 0
@@ -1,15 +1,102 @@
+import functools
+import itertools
+import random
 import socket
+import sys
+import threading
 import time
 import logging
+import collections
 import six
 
-from pymemcache.client.base import Client, PooledClient, _check_key
+from pymemcache.client.base import (
+    Client, PooledClient, LazyValues, _check_key
+)
+from pymemcache.client.circuit_breaker import CircuitBreaker
 from pymemcache.client.rendezvous import RendezvousHash
 from pymemcache.exceptions import MemcacheError
 
 logger = logging.getLogger(__name__)
 
 
+def least_outstanding_selector(outstanding):
+    """Pick the connection with the fewest requests in flight."""
+    return outstanding.index(min(outstanding))
+
+
+class RoundRobinSelector(object):
+    """Pick each connection in turn, regardless of its load."""
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def __call__(self, outstanding):
+        return next(self._counter) % len(outstanding)
+
+
+CONNECTION_SELECTORS = {
+    'round_robin': RoundRobinSelector,
+    'least_outstanding': lambda: least_outstanding_selector,
+}
+
+
+class ClientGroup(object):
+    """
+    Several clients connected to the same memcached server.
+
+    Every call is forwarded to one of the underlying clients, chosen by
+    ``selector``: a callable that receives the list of requests currently in
+    flight on each client and returns the index of the client to use. This
+    prevents a slow response (a large value, for instance) from blocking
+    every other request sent to the same server.
+
+    The clients are not thread-safe, so a client is never used by two calls
+    at once: when ``selector`` picks a busy client, the next idle one is
+    used instead, and when every client is busy, calls wait for one of them
+    to be done.
+    """
+
+    def __init__(self, server, clients, selector):
+        self.server = server
+        self.clients = clients
+        self.outstanding = [0] * len(clients)
+        self._selector = selector
+        self._idle = threading.Condition(threading.Lock())
+
+    def _acquire(self):
+        with self._idle:
+            while 0 not in self.outstanding:
+                self._idle.wait()
+            count = len(self.outstanding)
+            index = self._selector(self.outstanding)
+            while self.outstanding[index]:
+                index = (index + 1) % count
+            self.outstanding[index] += 1
+            return index
+
+    def _release(self, index):
+        with self._idle:
+            self.outstanding[index] -= 1
+            self._idle.notify()
+
+    def _call(self, name, *args, **kwargs):
+        index = self._acquire()
+        try:
+            return getattr(self.clients[index], name)(*args, **kwargs)
+        finally:
+            self._release(index)
+
+    def __getattr__(self, name):
+        attr = getattr(self.clients[0], name)
+        if not callable(attr):
+            return attr
+        return functools.partial(self._call, name)
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+
 class HashClient(object):
     """
     A client for communicating with a cluster of memcached servers
@@ -33,7 +120,21 @@ class HashClient(object):
         dead_timeout=60,
         use_pooling=False,
         ignore_exc=False,
-        allow_unicode_keys=False
+        allow_unicode_keys=False,
+        connections_per_server=1,
+        connection_selector='round_robin',
+        health_check_interval=None,
+        retry_backoff=2,
+        failure_threshold=1,
+        failure_window=60,
+        failover=False,
+        replicas=1,
+        replica_selector='random',
+        hot_key_sampler=None,
+        negative_cache=None,
+        deserialize_executor=None,
+        deserialize_executor_min_size=1024 * 1024,
+        lazy_deserialize=False
     ):
         """
         Constructor.
@@ -52,8 +153,75 @@ class HashClient(object):
                           is marked dead and removed from the pool.
           retry_timeout (float): Time in seconds that should pass between retry
                                  attempts.
+          retry_backoff (float): Factor by which ``retry_timeout`` is
+                                 multiplied after each failed retry, up to
+                                 ``dead_timeout``. default: 2
           dead_timeout (float): Time in seconds before attempting to add a node
                                 back in the pool.
+          failure_threshold: Amount of failures within ``failure_window``
+                             seconds after which a server is considered as
+                             failing. default: 1
+          failure_window (float): See ``failure_threshold``. default: 60
+          failover: when a server is failing but not dead yet, send its keys
+                    to the next server in the hasher's preference order
+                    instead of treating them as misses. The hasher must
+                    provide ``get_nodes_ranked``. Writes fail over too, and
+                    the server keeps its values meanwhile: once it
+                    recovers, the values set during the failover are not
+                    seen anymore, and the values deleted or overwritten
+                    during the failover come back, until they expire.
+                    Only enable it for data which tolerates stale reads,
+                    or with short expiry times. default: False
+          replicas: Amount of servers each key is stored on. Writes go to
+                    the ``replicas`` best ranked servers for the key and
+                    return the result of the best ranked one. Reads are
+                    spread over them, falling back to the next replica on
+                    a miss or an error, and only raise when every replica
+                    failed. ``cas``, ``gets`` and ``gets_many`` only use
+                    the best ranked server, as cas tokens are specific to a
+                    server, and a successful ``cas`` then sets the value on
+                    the other replicas. The hasher must provide
+                    ``get_nodes_ranked``. default: 1
+          replica_selector: ``'random'`` or ``'least_outstanding'``, the
+                            order in which replicas are read from.
+                            default: ``'random'``
+          hot_key_sampler: optional
+                           :py:class:`pymemcache.hotkeys.HotKeySampler`
+                           counting the keys read with the get* methods.
+          negative_cache: optional
+                          :py:class:`pymemcache.negativecache.NegativeCache`,
+                          see :py:class:`.Client`. Misses are only recorded
+                          once every replica of a key was asked.
+          deserialize_executor: optional executor deserializing large
+                                responses in parallel, shared by the
+                                clients of every server, see
+                                :py:class:`.Client`.
+          deserialize_executor_min_size: see :py:class:`.Client`.
+          lazy_deserialize: True to have ``get_many`` return a
+                            :py:class:`pymemcache.client.base.LazyValues`
+                            deserializing each value the first time it is
+                            accessed. default: False
+          connections_per_server: Amount of clients to create for each
+                                  server. When greater than 1, requests are
+                                  spread over the clients with
+                                  ``connection_selector``, and each client
+                                  only serves one request at a time.
+                                  Not supported with ``use_pooling``,
+                                  whose pools already open a connection
+                                  per concurrent request. default: 1
+          connection_selector: ``'round_robin'``, ``'least_outstanding'``
+                               or a callable receiving the list of requests
+                               in flight per client of a server and
+                               returning the index of the client to use.
+                               default: ``'round_robin'``
+          health_check_interval (float): When set, a background thread
+                                         probes failed and dead servers with
+                                         the ``version`` command every
+                                         ``health_check_interval`` seconds and
+                                         brings back the ones that answer,
+                                         instead of waiting for
+                                         ``retry_timeout`` or
+                                         ``dead_timeout``. default: None
 
         Further arguments are interpreted as for :py:class:`.Client`
         constructor.
@@ -66,11 +234,48 @@ class HashClient(object):
         self.key_prefix = key_prefix
         self.ignore_exc = ignore_exc
         self.allow_unicode_keys = allow_unicode_keys
-        self._failed_clients = {}
-        self._dead_clients = {}
-        self._last_dead_check_time = time.time()
+        if connections_per_server < 1:
+            raise ValueError('"connections_per_server" must be at least 1')
+        if connections_per_server > 1 and use_pooling:
+            raise ValueError(
+                '"connections_per_server" requires use_pooling=False, pooled '
+                'clients already open as many connections as needed')
+        self.connections_per_server = connections_per_server
+        if (not callable(connection_selector) and
+                connection_selector not in CONNECTION_SELECTORS):
+            raise ValueError(
+                'Unknown connection selector %r' % (connection_selector,))
+        self.connection_selector = connection_selector
+        self.retry_backoff = retry_backoff
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self._breakers = {}
+        self._dead_servers = set()
+        self._next_revival = 0
+        self._lock = threading.Lock()
+        self.health_check_interval = health_check_interval
+        self._health_check_stop = threading.Event()
+        self._health_check_thread = None
 
         self.hasher = hasher()
+        if failover and not hasattr(self.hasher, 'get_nodes_ranked'):
+            raise ValueError(
+                'failover requires a hasher providing get_nodes_ranked')
+        self.failover = failover
+        if replicas < 1:
+            raise ValueError('"replicas" must be at least 1')
+        if replicas > 1 and not hasattr(self.hasher, 'get_nodes_ranked'):
+            raise ValueError(
+                'replicas require a hasher providing get_nodes_ranked')
+        if replica_selector not in ('random', 'least_outstanding'):
+            raise ValueError(
+                'Unknown replica selector %r' % (replica_selector,))
+        self.replicas = replicas
+        self.replica_selector = replica_selector
+        self._outstanding = collections.defaultdict(int)
+        self.hot_key_sampler = hot_key_sampler
+        self.negative_cache = negative_cache
+        self.lazy_deserialize = lazy_deserialize
 
         self.default_kwargs = {
             'connect_timeout': connect_timeout,
@@ -81,6 +286,9 @@ class HashClient(object):
             'serializer': serializer,
             'deserializer': deserializer,
             'allow_unicode_keys': allow_unicode_keys,
+            'deserialize_executor': deserialize_executor,
+            'deserialize_executor_min_size': deserialize_executor_min_size,
+            'lazy_deserialize': lazy_deserialize,
         }
 
         if use_pooling is True:
@@ -92,43 +300,168 @@ class HashClient(object):
         for server, port in servers:
             self.add_server(server, port)
 
-    def add_server(self, server, port):
-        key = '%s:%s' % (server, port)
+        if health_check_interval is not None:
+            self._health_check_thread = threading.Thread(
+                target=self._health_check_loop,
+                name='pymemcache-health-check'
+            )
+            self._health_check_thread.daemon = True
+            self._health_check_thread.start()
 
+    def _create_client(self, server, port):
         if self.use_pooling:
-            client = PooledClient(
+            return PooledClient(
                 (server, port),
                 **self.default_kwargs
             )
+        return Client((server, port), **self.default_kwargs)
+
+    def _create_selector(self):
+        if callable(self.connection_selector):
+            return self.connection_selector
+        return CONNECTION_SELECTORS[self.connection_selector]()
+
+    def add_server(self, server, port):
+        key = '%s:%s' % (server, port)
+
+        if self.connections_per_server > 1:
+            client = ClientGroup(
+                (server, port),
+                [self._create_client(server, port)
+                 for _ in range(self.connections_per_server)],
+                self._create_selector()
+            )
         else:
-            client = Client((server, port), **self.default_kwargs)
+            client = self._create_client(server, port)
 
-        self.clients[key] = client
-        self.hasher.add_node(key)
+        with self._lock:
+            self.clients[key] = client
+            self._breakers[(server, port)] = self._create_breaker()
+            self._dead_servers.discard((server, port))
+            self.hasher.add_node(key)
 
     def remove_server(self, server, port):
-        dead_time = time.time()
-        self._failed_clients.pop((server, port))
-        self._dead_clients[(server, port)] = dead_time
-        key = '%s:%s' % (server, port)
-        self.hasher.remove_node(key)
+        """
+        Mark a server as dead and take it out of rotation.
 
-    def _get_client(self, key):
-        _check_key(key, self.allow_unicode_keys, self.key_prefix)
-        if len(self._dead_clients) > 0:
+        The server is added back in the pool after ``dead_timeout`` seconds.
+        """
+        with self._lock:
+            if (server, port) in self._dead_servers:
+                return
+            breaker = self._get_breaker((server, port))
+            breaker.trip(self.dead_timeout)
+            self._dead_servers.add((server, port))
+            self._next_revival = min(
+                self._breakers[dead].retry_at for dead in self._dead_servers
+            )
+            key = '%s:%s' % (server, port)
+            self.hasher.remove_node(key)
+
+    def _create_breaker(self):
+        return CircuitBreaker(
+            failure_threshold=self.failure_threshold,
+            window=self.failure_window,
+            retry_timeout=self.retry_timeout,
+            backoff_factor=self.retry_backoff,
+            max_retry_timeout=self.dead_timeout,
+        )
+
+    def _get_breaker(self, server):
+        breaker = self._breakers.get(server)
+        if breaker is None:
+            # Clients registered without add_server()
+            breaker = self._breakers.setdefault(server, self._create_breaker())
+        return breaker
+
+    def _revive_dead_servers(self):
+        with self._lock:
             current_time = time.time()
-            ldc = self._last_dead_check_time
-            # we have dead clients and we have reached the
-            # timeout retry
-            if current_time - ldc > self.dead_timeout:
-                for server, dead_time in self._dead_clients.items():
-                    if current_time - dead_time > self.dead_timeout:
-                        logger.debug(
-                            'bringing server back into rotation %s',
-                            server
-                        )
-                        self.add_server(*server)
-                        self._last_dead_check_time = current_time
+            next_revival = None
+            for server in list(self._dead_servers):
+                retry_at = self._breakers[server].retry_at
+                if retry_at <= current_time:
+                    logger.debug(
+                        'bringing server back into rotation %s', server
+                    )
+                    # The breaker stays open, so that the first request sent
+                    # to the server is used as a probe.
+                    self._dead_servers.discard(server)
+                    self.hasher.add_node('%s:%s' % server)
+                elif next_revival is None or retry_at < next_revival:
+                    next_revival = retry_at
+            self._next_revival = next_revival or 0
+
+    def _probe_server(self, server):
+        client = Client(
+            server,
+            connect_timeout=self.default_kwargs['connect_timeout'],
+            timeout=self.default_kwargs['timeout'],
+            socket_module=self.default_kwargs['socket_module'],
+        )
+        try:
+            client.version()
+        except Exception:
+            return False
+        finally:
+            client.close()
+        return True
+
+    def check_servers(self):
+        """
+        Probe the failed and dead servers with the ``version`` command.
+
+        Servers that answer are brought back into rotation right away.
+
+        Returns:
+          The list of (hostname, port) tuples that were brought back.
+        """
+        recovered = []
+        for server, breaker in list(self._breakers.items()):
+            if breaker.state == CircuitBreaker.CLOSED:
+                continue
+            if not self._probe_server(server):
+                continue
+
+            with self._lock:
+                if server in self._dead_servers:
+                    logger.debug(
+                        'bringing server back into rotation %s', server
+                    )
+                    self._dead_servers.discard(server)
+                    self.hasher.add_node('%s:%s' % server)
+                else:
+                    logger.debug(
+                        'failed server is healthy again: %s', server
+                    )
+            breaker.reset()
+            recovered.append(server)
+
+        return recovered
+
+    def _health_check_loop(self):
+        while not self._health_check_stop.wait(self.health_check_interval):
+            try:
+                self.check_servers()
+            except Exception:
+                logger.exception('health check failed')
+
+    def close(self):
+        """Stop the health check thread and close every client."""
+        self._health_check_stop.set()
+        if self._health_check_thread is not None:
+            self._health_check_thread.join()
+            self._health_check_thread = None
+        for client in list(self.clients.values()):
+            client.close()
+
+    def _check_key(self, key):
+        _check_key(key, self.allow_unicode_keys, self.key_prefix)
+        if self._dead_servers and time.time() >= self._next_revival:
+            self._revive_dead_servers()
+
+    def _get_client(self, key):
+        self._check_key(key)
 
         server = self.hasher.get_node(key)
         # We've ran out of servers to try
@@ -138,37 +471,81 @@ class HashClient(object):
             raise MemcacheError('All servers seem to be down right now')
 
         client = self.clients[server]
+        if self.failover:
+            client = self._get_failover_client(key, client)
         return client
 
-    def _safely_run_func(self, client, func, default_val, *args, **kwargs):
+    def _get_replica_clients(self, key):
+        self._check_key(key)
+
+        nodes = self.hasher.get_nodes_ranked(key, self.replicas)
+        # We've ran out of servers to try
+        if not nodes:
+            if self.ignore_exc is True:
+                return []
+            raise MemcacheError('All servers seem to be down right now')
+
+        return [self.clients[node] for node in nodes]
+
+    def _get_write_clients(self, key):
+        if self.replicas > 1:
+            return self._get_replica_clients(key)
+
+        client = self._get_client(key)
+        if client is None:
+            return []
+        return [client]
+
+    def _get_read_clients(self, key):
+        clients = self._get_replica_clients(key)
+        if self.replica_selector == 'least_outstanding':
+            return sorted(
+                clients, key=lambda client: self._outstanding[client.server]
+            )
+        random.shuffle(clients)
+        return clients
+
+    def _run_tracked(self, client, func, default_val, *args, **kwargs):
+        with self._lock:
+            self._outstanding[client.server] += 1
         try:
-            if client.server in self._failed_clients:
-                # This server is currently failing, lets check if it is in
-                # retry or marked as dead
-                failed_metadata = self._failed_clients[client.server]
-
-                # we haven't tried our max amount yet, if it has been enough
-                # time lets just retry using it
-                if failed_metadata['attempts'] < self.retry_attempts:
-                    failed_time = failed_metadata['failed_time']
-                    if time.time() - failed_time > self.retry_timeout:
-                        logger.debug(
-                            'retrying failed server: %s', client.server
-                        )
-                        result = func(*args, **kwargs)
-                        # we were successful, lets remove it from the failed
-                        # clients
-                        self._failed_clients.pop(client.server)
-                        return result
-                    return default_val
-                else:
-                    # We've reached our max retry attempts, we need to mark
-                    # the sever as dead
-                    logger.debug('marking server as dead: %s', client.server)
-                    self.remove_server(*client.server)
+            return self._safely_run_func(
+                client, func, default_val, *args, **kwargs
+            )
+        finally:
+            with self._lock:
+                self._outstanding[client.server] -= 1
+
+    def _get_failover_client(self, key, client):
+        breaker = self._breakers.get(client.server)
+        if breaker is None or breaker.available():
+            return client
+
+        ranked = self.hasher.get_nodes_ranked(key, len(self.clients))
+        for node in ranked[1:]:
+            candidate = self.clients[node]
+            breaker = self._breakers.get(candidate.server)
+            if breaker is None or breaker.available():
+                logger.debug(
+                    'failing over from %s to %s', client.server,
+                    candidate.server
+                )
+                return candidate
+
+        return client
+
+    def _safely_run_func(self, client, func, default_val, *args, **kwargs):
+        breaker = self._get_breaker(client.server)
+        if not breaker.allow_request():
+            # This server is currently failing and it isn't time to retry
+            # it yet
+            return default_val
+
+        if breaker.state != CircuitBreaker.CLOSED:
+            logger.debug('retrying failed server: %s', client.server)
 
+        try:
             result = func(*args, **kwargs)
-            return result
 
         # Connecting to the server fail, we should enter
         # retry mode
@@ -183,52 +560,33 @@ class HashClient(object):
             return default_val
         except Exception:
             # any exceptions that aren't socket.error we need to handle
-            # gracefully as well
+            # gracefully as well, the server did answer though
+            breaker.record_success()
             if not self.ignore_exc:
                 raise
 
             return default_val
 
+        breaker.record_success()
+        return result
+
     def _safely_run_set_many(self, client, values, *args, **kwargs):
+        breaker = self._get_breaker(client.server)
+        if not breaker.allow_request():
+            return list(values.keys())
+
+        if breaker.state != CircuitBreaker.CLOSED:
+            logger.debug('retrying failed server: %s', client.server)
+
         failed = []
         succeeded = []
         try:
-            if client.server in self._failed_clients:
-                # This server is currently failing, lets check if it is in
-                # retry or marked as dead
-                failed_metadata = self._failed_clients[client.server]
-
-                # we haven't tried our max amount yet, if it has been enough
-                # time lets just retry using it
-                if failed_metadata['attempts'] < self.retry_attempts:
-                    failed_time = failed_metadata['failed_time']
-                    if time.time() - failed_time > self.retry_timeout:
-                        logger.debug(
-                            'retrying failed server: %s', client.server
-                        )
-                        succeeded, failed, err = self._set_many(
-                            client, values, *args, **kwargs)
-                        if err is not None:
-                            raise err
-                        # we were successful, lets remove it from the failed
-                        # clients
-                        self._failed_clients.pop(client.server)
-                        return failed
-                    return values.keys()
-                else:
-                    # We've reached our max retry attempts, we need to mark
-                    # the sever as dead
-                    logger.debug('marking server as dead: %s', client.server)
-                    self.remove_server(*client.server)
-
             succeeded, failed, err = self._set_many(
                 client, values, *args, **kwargs
             )
             if err is not None:
                 raise err
 
-            return failed
-
         # Connecting to the server fail, we should enter
         # retry mode
         except socket.error:
@@ -243,40 +601,26 @@ class HashClient(object):
         except Exception:
             # any exceptions that aren't socket.error we need to handle
             # gracefully as well
+            breaker.record_success()
             if not self.ignore_exc:
                 raise
 
             return list(set(values.keys()) - set(succeeded))
 
+        breaker.record_success()
+        return failed
+
     def _mark_failed_server(self, server):
-        # This client has never failed, lets mark it for failure
+        breaker = self._get_breaker(server)
+        breaker.record_failure()
+        # We've reached our max retry attempts (or we aren't allowing any
+        # retries), we need to mark the server as dead
         if (
-                server not in self._failed_clients and
-                self.retry_attempts > 0
+            breaker.state == CircuitBreaker.OPEN and
+            breaker.retries >= self.retry_attempts
         ):
-            self._failed_clients[server] = {
-                'failed_time': time.time(),
-                'attempts': 0,
-            }
-        # We aren't allowing any retries, we should mark the server as
-        # dead immediately
-        elif (
-            server not in self._failed_clients and
-            self.retry_attempts <= 0
-        ):
-            self._failed_clients[server] = {
-                'failed_time': time.time(),
-                'attempts': 0,
-            }
             logger.debug("marking server as dead %s", server)
             self.remove_server(*server)
-        # This client has failed previously, we need to update the metadata
-        # to reflect that we have attempted it again
-        else:
-            failed_metadata = self._failed_clients[server]
-            failed_metadata['attempts'] += 1
-            failed_metadata['failed_time'] = time.time()
-            self._failed_clients[server] = failed_metadata
 
     def _run_cmd(self, cmd, key, default_val, *args, **kwargs):
         client = self._get_client(key)
@@ -307,48 +651,161 @@ class HashClient(object):
 
         return succeeded, failed, None
 
-    def set(self, key, *args, **kwargs):
-        return self._run_cmd('set', key, False, *args, **kwargs)
+    def _run_write_cmd(self, cmd, key, default_val, *args, **kwargs):
+        if self.negative_cache is not None:
+            self.negative_cache.discard_many([key])
+        if self.replicas == 1:
+            return self._run_cmd(cmd, key, default_val, *args, **kwargs)
 
-    def get(self, key, *args, **kwargs):
-        return self._run_cmd('get', key, None, *args, **kwargs)
+        args = list(args)
+        args.insert(0, key)
+        results = [
+            self._safely_run_func(
+                client, getattr(client, cmd), default_val, *args, **kwargs
+            )
+            for client in self._get_replica_clients(key)
+        ]
+        # Report the result of the best ranked replica, so that an add
+        # refused by it fails even if other replicas accepted it
+        if not results:
+            return default_val
+        return results[0]
+
+    def set(self, key, *args, **kwargs):
+        return self._run_write_cmd('set', key, False, *args, **kwargs)
+
+    def get(self, key, default=None):
+        if self.hot_key_sampler is not None:
+            self.hot_key_sampler.record(key)
+        if self.replicas > 1 or self.negative_cache is not None:
+            answered = set()
+            end = self._get_many_filtered([key], False, answered)
+            # A key without any server available is a miss, not the False
+            # reported by get_many
+            if key not in answered:
+                return default
+            return end.get(key, default)
+        return self._run_cmd('get', key, None, default)
 
     def incr(self, key, *args, **kwargs):
-        return self._run_cmd('incr', key, False, *args, **kwargs)
+        return self._run_write_cmd('incr', key, False, *args, **kwargs)
 
     def decr(self, key, *args, **kwargs):
-        return self._run_cmd('decr', key, False, *args, **kwargs)
+        return self._run_write_cmd('decr', key, False, *args, **kwargs)
 
     def set_many(self, values, *args, **kwargs):
+        if self.negative_cache is not None:
+            self.negative_cache.discard_many(values)
         client_batches = {}
         failed = []
 
         for key, value in six.iteritems(values):
-            client = self._get_client(key)
+            clients = self._get_write_clients(key)
 
-            if client is None:
+            if not clients:
                 failed.append(key)
                 continue
 
-            if client.server not in client_batches:
-                client_batches[client.server] = {}
-
-            client_batches[client.server][key] = value
+            for client in clients:
+                if client.server not in client_batches:
+                    client_batches[client.server] = (client, {})
 
-        for server, values in client_batches.items():
-            client = self.clients['%s:%s' % server]
+                client_batches[client.server][1][key] = value
 
+        for client, values in client_batches.values():
             failed += self._safely_run_set_many(
                 client, values, *args, **kwargs
             )
 
+        if self.replicas > 1:
+            # A key failed if it wasn't stored on every replica
+            failed = list(set(failed))
+
         return failed
 
     set_multi = set_many
 
+    def _get_many_from_replicas(self, keys, answered, *args, **kwargs):
+        end = LazyValues() if self.lazy_deserialize else {}
+        pending = {}
+        # Keys which a replica failed to read. Only the keys which every
+        # replica failed to read, and none answered for, raise an error.
+        failed = set()
+        exc_info = None
+
+        for key in keys:
+            clients = self._get_read_clients(key)
+
+            if not clients:
+                end[key] = False
+                continue
+
+            pending[key] = clients
+
+        while pending:
+            client_batches = {}
+            for key, clients in six.iteritems(pending):
+                client = clients.pop(0)
+                if client.server not in client_batches:
+                    client_batches[client.server] = (client, [])
+
+                client_batches[client.server][1].append(key)
+
+            for client, batch in client_batches.values():
+                new_args = list(args)
+                new_args.insert(0, batch)
+                try:
+                    result = self._run_tracked(
+                        client, client.get_many, None, *new_args, **kwargs
+                    )
+                except Exception:
+                    exc_info = sys.exc_info()
+                    failed.update(batch)
+                    continue
+                if result is None:
+                    # The server is failing, or the error was ignored
+                    continue
+                answered.update(batch)
+                end.update(result)
+
+            # Look for missing keys on the next replica
+            pending = dict(
+                (key, clients) for key, clients in six.iteritems(pending)
+                if clients and key not in end
+            )
+
+        if failed - answered:
+            six.reraise(*exc_info)
+        return end
+
     def get_many(self, keys, gets=False, *args, **kwargs):
+        if self.hot_key_sampler is not None:
+            self.hot_key_sampler.record_many(keys)
+        return self._get_many_filtered(keys, gets, set(), *args, **kwargs)
+
+    get_multi = get_many
+
+    def _get_many_filtered(self, keys, gets, answered, *args, **kwargs):
+        # Adds the keys which a server answered for, found or not, to
+        # answered, so that only they are recorded as misses
+        negative_cache = self.negative_cache
+        if negative_cache is not None:
+            keys, generation = negative_cache.filter(keys)
+
+        if self.replicas > 1 and not gets:
+            end = self._get_many_from_replicas(
+                keys, answered, *args, **kwargs)
+        else:
+            end = self._get_many(keys, gets, answered, *args, **kwargs)
+
+        if negative_cache is not None:
+            negative_cache.add_many(
+                [key for key in answered if key not in end], generation)
+        return end
+
+    def _get_many(self, keys, gets, answered, *args, **kwargs):
         client_batches = {}
-        end = {}
+        end = LazyValues() if self.lazy_deserialize and not gets else {}
 
         for key in keys:
             client = self._get_client(key)
@@ -374,16 +831,29 @@ class HashClient(object):
 
             result = self._safely_run_func(
                 client,
-                get_func, {}, *new_args, **kwargs
+                get_func, None, *new_args, **kwargs
             )
-            end.update(result)
+            if result is not None:
+                answered.update(keys)
+                end.update(result)
 
         return end
 
-    get_multi = get_many
-
     def gets(self, key, *args, **kwargs):
-        return self._run_cmd('gets', key, None, *args, **kwargs)
+        if self.hot_key_sampler is not None:
+            self.hot_key_sampler.record(key)
+        negative_cache = self.negative_cache
+        if negative_cache is None:
+            return self._run_cmd('gets', key, None, *args, **kwargs)
+
+        keys, generation = negative_cache.filter([key])
+        if not keys:
+            return (None, None)
+        result = self._run_cmd('gets', key, None, *args, **kwargs)
+        # None when the server failed, (None, None) for a miss
+        if result is not None and result[0] is None:
+            negative_cache.add_many([key], generation)
+        return result
 
     def gets_many(self, keys, *args, **kwargs):
         return self.get_many(keys, gets=True, *args, **kwargs)
@@ -391,30 +861,55 @@ class HashClient(object):
     gets_multi = gets_many
 
     def add(self, key, *args, **kwargs):
-        return self._run_cmd('add', key, False, *args, **kwargs)
+        return self._run_write_cmd('add', key, False, *args, **kwargs)
 
     def prepend(self, key, *args, **kwargs):
-        return self._run_cmd('prepend', key, False, *args, **kwargs)
+        return self._run_write_cmd('prepend', key, False, *args, **kwargs)
 
     def append(self, key, *args, **kwargs):
-        return self._run_cmd('append', key, False, *args, **kwargs)
+        return self._run_write_cmd('append', key, False, *args, **kwargs)
 
     def delete(self, key, *args, **kwargs):
-        return self._run_cmd('delete', key, False, *args, **kwargs)
+        return self._run_write_cmd('delete', key, False, *args, **kwargs)
 
     def delete_many(self, keys, *args, **kwargs):
+        client_batches = {}
+
         for key in keys:
-            self._run_cmd('delete', key, False, *args, **kwargs)
+            for client in self._get_write_clients(key):
+                if client.server not in client_batches:
+                    client_batches[client.server] = (client, [])
+
+                client_batches[client.server][1].append(key)
+
+        for client, batch in client_batches.values():
+            new_args = list(args)
+            new_args.insert(0, batch)
+            self._safely_run_func(
+                client, client.delete_many, False, *new_args, **kwargs
+            )
         return True
 
     delete_multi = delete_many
 
-    def cas(self, key, *args, **kwargs):
-        return self._run_cmd('cas', key, False, *args, **kwargs)
+    def cas(self, key, value, cas, expire=0, noreply=False):
+        if self.negative_cache is not None:
+            self.negative_cache.discard_many([key])
+        result = self._run_cmd('cas', key, False, value, cas, expire, noreply)
+        if self.replicas > 1 and result:
+            # The cas token only applies to the best ranked server, copy the
+            # new value to the other replicas reads may be served by
+            for client in self._get_replica_clients(key)[1:]:
+                self._safely_run_func(
+                    client, client.set, False, key, value, expire, noreply
+                )
+        return result
 
     def replace(self, key, *args, **kwargs):
-        return self._run_cmd('replace', key, False, *args, **kwargs)
+        return self._run_write_cmd('replace', key, False, *args, **kwargs)
 
     def flush_all(self):
+        if self.negative_cache is not None:
+            self.negative_cache.clear()
         for _, client in self.clients.items():
             self._safely_run_func(client, client.flush_all, False)
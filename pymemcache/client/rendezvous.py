@@ -1,3 +1,5 @@
+import heapq
+
 from pymemcache.client.murmur3 import murmur3_32
 
 
@@ -44,3 +46,17 @@ class RendezvousHash(object):
                 (high_score, winner) = (score, max(str(node), str(winner)))
 
         return winner
+
+    def get_nodes_ranked(self, key, n):
+        """
+        Return up to ``n`` nodes for ``key``, best scoring first.
+
+        The first node is always the one returned by ``get_node``, the
+        following ones are where the key would land if the nodes before them
+        were removed.
+        """
+        scored = [
+            (self.hash_function("%s-%s" % (node, key)), str(node), node)
+            for node in self.nodes
+        ]
+        return [node for _, _, node in heapq.nlargest(n, scored)]
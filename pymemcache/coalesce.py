@@ -0,0 +1,129 @@
+"""
+A client sharing the result of concurrent reads of the same keys.
+
+When a popular key expires, many threads ask memcached for it at the same
+time, each using its own connection. The :py:class:`CoalescingClient` wraps
+a thread-safe client (``PooledClient``, or ``HashClient`` with
+``use_pooling=True``) so that only one request is sent for a key at a given
+time: the threads asking for a key that is already being fetched wait for
+that request and share its result.
+
+.. code-block:: python
+
+    from pymemcache.client.base import PooledClient
+    from pymemcache.coalesce import CoalescingClient
+
+    client = CoalescingClient(PooledClient(('localhost', 11211)))
+    client.get('some_key')
+
+``get`` and ``get_many`` are coalesced, ``get_many`` only fetches the keys
+that aren't already being fetched by another thread. Every other method is
+forwarded as is to the wrapped client.
+
+Note that a thread joining a request in flight may get a value that was
+read before a write it made itself, just as if its own request had been
+sent slightly earlier.
+"""
+
+import sys
+import threading
+
+import six
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+    def wait(self):
+        self.event.wait()
+        if self.exc_info is not None:
+            six.reraise(*self.exc_info)
+        return self.result
+
+
+class CoalescingClient(object):
+    """
+    Args:
+      client: the thread-safe client used to talk to memcached.
+      lock_generator: a callback/type that takes no arguments that will be
+                      called to create the lock protecting the requests in
+                      flight.
+    """
+
+    def __init__(self, client, lock_generator=None):
+        self.client = client
+        if lock_generator is None:
+            self._lock = threading.Lock()
+        else:
+            self._lock = lock_generator()
+        # key -> _Call fetching it
+        self._calls = {}
+
+    def _run(self, call, keys, func, *args):
+        try:
+            call.result = func(*args)
+        except Exception:
+            call.exc_info = sys.exc_info()
+        finally:
+            with self._lock:
+                for key in keys:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+            call.event.set()
+        return call.wait()
+
+    def _get_one(self, key):
+        return {key: self.client.get(key)}
+
+    def get(self, key, default=None):
+        with self._lock:
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = _Call()
+
+        if owner:
+            result = self._run(call, [key], self._get_one, key)
+        else:
+            result = call.wait()
+
+        value = result.get(key)
+        if value is None:
+            return default
+        return value
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+
+        owned = []
+        joined = {}
+        with self._lock:
+            call = _Call()
+            for key in keys:
+                other = self._calls.get(key)
+                if other is None:
+                    self._calls[key] = call
+                    owned.append(key)
+                elif other is not call:
+                    joined[key] = other
+
+        result = {}
+        # Our own keys are fetched before waiting for anybody else, so two
+        # threads waiting for each other's keys can't deadlock.
+        if owned:
+            result.update(self._run(call, owned, self.client.get_many, owned))
+
+        for key, other in six.iteritems(joined):
+            value = other.wait().get(key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    get_multi = get_many
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
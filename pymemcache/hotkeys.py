@@ -0,0 +1,200 @@
+"""
+Detection of hot keys from the client side.
+
+A :py:class:`HotKeySampler` can be given to
+:py:class:`pymemcache.client.base.Client`,
+:py:class:`pymemcache.client.base.PooledClient` or
+:py:class:`pymemcache.client.hash.HashClient` with the ``hot_key_sampler``
+argument. Every key read through ``get``, ``get_many``, ``gets`` and
+``gets_many`` is then counted in a count-min sketch, and the most frequent
+keys are kept in a small top-K table:
+
+.. code-block:: python
+
+    from pymemcache.client.base import Client
+    from pymemcache.hotkeys import HotKeySampler
+
+    def on_hot_key(key, count):
+        logging.warning('%s was read %d times', key, count)
+
+    sampler = HotKeySampler(threshold=10000, callback=on_hot_key)
+    client = Client(('localhost', 11211), hot_key_sampler=sampler)
+    ...
+    print(sampler.hot_keys(10))
+
+Counts cover the current and the previous ``window`` seconds. Memory usage
+is bounded by ``2 * width * depth`` counters and ``top_k`` keys, whatever
+the amount of distinct keys.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+class HotKeySampler(object):
+    """
+    Estimate the frequency of keys with a count-min sketch over a sliding
+    window.
+
+    Args:
+      width: number of counters per row of the sketch.
+      depth: number of rows (hash functions) of the sketch.
+      top_k: number of keys to keep track of in ``hot_keys``.
+      window: length in seconds of a window, counts cover the current and
+              the previous window.
+      threshold: optional int, ``callback`` is called the first time the
+                 estimated count of a key reaches it within a window.
+      callback: optional function taking a key and its estimated count.
+      sample_rate: fraction of the reads that are counted, counts are
+                   scaled back accordingly. Lower it to reduce the overhead.
+      lock_generator: a callback/type that takes no arguments that will be
+                      called to create the lock protecting the sketch.
+    """
+
+    def __init__(self, width=2048, depth=4, top_k=32, window=60,
+                 threshold=None, callback=None, sample_rate=1.0,
+                 lock_generator=None):
+        if width < 1 or depth < 1 or top_k < 1:
+            raise ValueError('"width", "depth" and "top_k" must be positive')
+        if window <= 0:
+            raise ValueError('"window" must be positive')
+        if not 0 < sample_rate <= 1:
+            raise ValueError('"sample_rate" must be within ]0, 1]')
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.window = window
+        self.threshold = threshold
+        self.callback = callback
+        self.sample_rate = sample_rate
+        if lock_generator is None:
+            self._lock = threading.Lock()
+        else:
+            self._lock = lock_generator()
+        self._current = self._new_sketch()
+        self._previous = self._new_sketch()
+        self._window_end = time.time() + window
+        self._top = {}
+        self._heap = []
+        self._reported = set()
+        # Keeps heap entries with the same count from comparing their keys
+        self._tiebreaker = itertools.count()
+
+    def _new_sketch(self):
+        return [[0] * self.width for _ in range(self.depth)]
+
+    def _indexes(self, key):
+        # Rows derived from the two halves of a single hash (Kirsch and
+        # Mitzenmacher): hashing (row, key) tuples gives correlated rows.
+        value = hash(key) & 0xffffffffffffffff
+        low = value & 0xffffffff
+        high = (value >> 32) | 1
+        return [(low + row * high) % self.width for row in range(self.depth)]
+
+    def _rotate(self, current_time):
+        elapsed_windows = (current_time - self._window_end) // self.window
+        if elapsed_windows >= 1:
+            # Nothing was recorded during the last full window
+            self._previous = self._new_sketch()
+        else:
+            self._previous = self._current
+        self._current = self._new_sketch()
+        self._window_end += (elapsed_windows + 1) * self.window
+        # Hot keys of the last window stay listed with their remaining count
+        self._top = dict((key, self._estimate(self._indexes(key)))
+                         for key in self._top)
+        self._heap = [(count, next(self._tiebreaker), key)
+                      for key, count in self._top.items()]
+        heapq.heapify(self._heap)
+        self._reported = set()
+
+    def _estimate(self, indexes):
+        current = self._current
+        previous = self._previous
+        return min(current[row][index] + previous[row][index]
+                   for row, index in enumerate(indexes))
+
+    def _update_top(self, key, count):
+        top = self._top
+        if key not in top and len(top) >= self.top_k:
+            # Drop stale heap entries until the real minimum shows up
+            heap = self._heap
+            while heap[0][0] != top.get(heap[0][2]):
+                heapq.heappop(heap)
+            if heap[0][0] >= count:
+                return
+            del top[heapq.heappop(heap)[2]]
+
+        top[key] = count
+        heapq.heappush(self._heap, (count, next(self._tiebreaker), key))
+        if len(self._heap) > 4 * self.top_k:
+            self._heap = [(c, next(self._tiebreaker), k)
+                          for k, c in top.items()]
+            heapq.heapify(self._heap)
+
+    def record(self, key):
+        """Count one read of ``key``."""
+        self.record_many((key,))
+
+    def record_many(self, keys):
+        """Count one read of each of ``keys``."""
+        if self.sample_rate < 1:
+            keys = [key for key in keys if random.random() < self.sample_rate]
+            if not keys:
+                return
+        increment = int(round(1 / self.sample_rate))
+        crossed = []
+
+        with self._lock:
+            current_time = time.time()
+            if current_time >= self._window_end:
+                self._rotate(current_time)
+
+            current = self._current
+            for key in keys:
+                indexes = self._indexes(key)
+                for row, index in enumerate(indexes):
+                    current[row][index] += increment
+                count = self._estimate(indexes)
+                self._update_top(key, count)
+
+                if (self.threshold is not None and count >= self.threshold and
+                        key not in self._reported):
+                    self._reported.add(key)
+                    crossed.append((key, count))
+
+        if self.callback is not None:
+            for key, count in crossed:
+                self.callback(key, count)
+
+    def estimate(self, key):
+        """Return the estimated amount of reads of ``key``."""
+        with self._lock:
+            return self._estimate(self._indexes(key))
+
+    def hot_keys(self, n=None):
+        """
+        Return the hottest keys.
+
+        Args:
+          n: optional int, the maximum number of keys to return (defaults to
+             ``top_k``).
+
+        Returns:
+          A list of (key, estimated count) tuples, hottest first.
+        """
+        with self._lock:
+            items = list(self._top.items())
+        items.sort(key=lambda item: item[1], reverse=True)
+        return items[:n]
+
+    def clear(self):
+        with self._lock:
+            self._current = self._new_sketch()
+            self._previous = self._new_sketch()
+            self._top = {}
+            self._heap = []
+            self._reported = set()
@@ -0,0 +1,299 @@
+"""
+Invalidation of groups of keys without ``flush_all``.
+
+Keys belonging to a namespace (a tenant, a user...) are prefixed with the
+namespace and its current generation, ``namespace:generation:key``. The
+generation is a counter stored in memcached: invalidating the namespace
+increments it, and every key written with the previous generation becomes
+unreachable at once, whatever the number of keys. Memcached evicts them
+eventually.
+
+.. code-block:: python
+
+    from pymemcache.client.hash import HashClient
+    from pymemcache.namespace import Namespaces
+
+    namespaces = Namespaces(HashClient(servers), ttl=1)
+    tenant = namespaces.namespaced_client(b'tenant42')
+    tenant.set(b'settings', b'...')   # stored as tenant42:<generation>:settings
+    tenant.get(b'settings')
+    namespaces.invalidate(b'tenant42')
+    tenant.get(b'settings')  # None
+
+Generations are cached in process for ``ttl`` seconds, so that reading a
+namespaced key costs a single request most of the time. Until the cached
+generation expires, other processes may therefore still read the values of
+an invalidated namespace.
+
+When a generation counter is evicted, it starts again from the current
+time in seconds, which is above any generation used before unless the
+namespace was invalidated more than once per second on average.
+"""
+
+import threading
+import time
+
+import six
+
+from pymemcache.client.base import _check_key
+
+
+def _to_bytes(value):
+    if isinstance(value, six.text_type):
+        return value.encode('utf8')
+    return value
+
+
+class Namespaces(object):
+    """
+    Args:
+      client: the client used to talk to memcached.
+      ttl: float, number of seconds the generations are cached in process.
+      key_prefix: prefix of the keys holding the generations.
+      lock_generator: a callback/type that takes no arguments that will be
+                      called to create the lock protecting the cached
+                      generations.
+    """
+
+    def __init__(self, client, ttl=1, key_prefix=b'namespace:',
+                 lock_generator=None):
+        self.client = client
+        self.ttl = ttl
+        self.key_prefix = _to_bytes(key_prefix)
+        if lock_generator is None:
+            self._lock = threading.Lock()
+        else:
+            self._lock = lock_generator()
+        # namespace -> (generation, expire time)
+        self._generations = {}
+
+    def _generation_key(self, namespace):
+        return self.key_prefix + _to_bytes(namespace)
+
+    def _cache(self, generations):
+        expire = time.time() + self.ttl
+        with self._lock:
+            for namespace, generation in six.iteritems(generations):
+                self._generations[namespace] = (generation, expire)
+
+    def _create(self, namespace):
+        key = self._generation_key(namespace)
+        generation = int(time.time())
+        if not self.client.add(key, generation, noreply=False):
+            # Created by somebody else in the meantime
+            value = self.client.get(key)
+            if value is not None:
+                generation = int(value)
+        return generation
+
+    def generations(self, namespaces):
+        """
+        Return the current generation of several namespaces, fetching the
+        ones that aren't cached in a single ``get_many``.
+
+        Returns:
+          A dict mapping each namespace to its generation.
+        """
+        result = {}
+        missing = []
+        with self._lock:
+            current_time = time.time()
+            for namespace in namespaces:
+                entry = self._generations.get(namespace)
+                if entry is None or entry[1] <= current_time:
+                    missing.append(namespace)
+                else:
+                    result[namespace] = entry[0]
+
+        if missing:
+            keys = dict((self._generation_key(namespace), namespace)
+                        for namespace in missing)
+            fetched = {}
+            for key, value in six.iteritems(self.client.get_many(list(keys))):
+                if value is not None:
+                    fetched[keys[key]] = int(value)
+            for namespace in missing:
+                if namespace not in fetched:
+                    fetched[namespace] = self._create(namespace)
+            self._cache(fetched)
+            result.update(fetched)
+        return result
+
+    def generation(self, namespace):
+        """Return the current generation of ``namespace``."""
+        return self.generations([namespace])[namespace]
+
+    def prefix(self, namespace, generation=None):
+        """Return the prefix of the keys of ``namespace``."""
+        if generation is None:
+            generation = self.generation(namespace)
+        return b''.join([_to_bytes(namespace), b':',
+                         ('%d' % generation).encode('ascii'), b':'])
+
+    def invalidate(self, namespace):
+        """
+        Make every key of ``namespace`` unreachable, by incrementing its
+        generation.
+
+        Returns:
+          The new generation of the namespace.
+        """
+        generation = self.client.incr(self._generation_key(namespace), 1,
+                                      noreply=False)
+        if generation is None:
+            generation = self._create(namespace)
+        else:
+            generation = int(generation)
+        self._cache({namespace: generation})
+        return generation
+
+    def namespaced_client(self, namespace):
+        """Return a :py:class:`NamespacedClient` for ``namespace``."""
+        return NamespacedClient(self, namespace)
+
+    def get_many(self, keys_by_namespace):
+        """
+        Read keys from several namespaces, with a single ``get_many`` for
+        the generations that aren't cached and a single ``get_many`` for
+        the keys.
+
+        Args:
+          keys_by_namespace: dict mapping namespaces to lists of keys.
+
+        Returns:
+          A dict mapping each namespace to a dict of the keys found and
+          their values.
+        """
+        generations = self.generations(list(keys_by_namespace))
+        allow_unicode_keys = getattr(self.client, 'allow_unicode_keys',
+                                     False)
+        prefixed = {}
+        for namespace, keys in six.iteritems(keys_by_namespace):
+            prefix = self.prefix(namespace, generations[namespace])
+            for key in keys:
+                prefixed[_check_key(key, allow_unicode_keys, prefix)] = (
+                    namespace, key)
+
+        result = dict((namespace, {}) for namespace in keys_by_namespace)
+        values = self.client.get_many(list(prefixed))
+        for prefixed_key, value in six.iteritems(values):
+            if value is not None:
+                namespace, key = prefixed[prefixed_key]
+                result[namespace][key] = value
+        return result
+
+
+class NamespacedClient(object):
+    """
+    A client prefixing every key with a namespace and its current
+    generation, returned by :py:meth:`Namespaces.namespaced_client`. Every
+    method without a key (``stats``, ``version``...) is forwarded as is to
+    the wrapped client.
+    """
+
+    def __init__(self, namespaces, namespace):
+        self.namespaces = namespaces
+        self.namespace = namespace
+        self.allow_unicode_keys = getattr(namespaces.client,
+                                          'allow_unicode_keys', False)
+
+    def check_key(self, key, prefix=None):
+        """Checks key and add the namespace prefix."""
+        if prefix is None:
+            prefix = self.namespaces.prefix(self.namespace)
+        return _check_key(key, self.allow_unicode_keys, prefix)
+
+    def _map_keys(self, keys):
+        prefix = self.namespaces.prefix(self.namespace)
+        return dict((self.check_key(key, prefix), key) for key in keys)
+
+    def _call(self, name, key, *args, **kwargs):
+        method = getattr(self.namespaces.client, name)
+        return method(self.check_key(key), *args, **kwargs)
+
+    def get(self, key, *args, **kwargs):
+        return self._call('get', key, *args, **kwargs)
+
+    def gets(self, key, *args, **kwargs):
+        return self._call('gets', key, *args, **kwargs)
+
+    def set(self, key, *args, **kwargs):
+        return self._call('set', key, *args, **kwargs)
+
+    def add(self, key, *args, **kwargs):
+        return self._call('add', key, *args, **kwargs)
+
+    def replace(self, key, *args, **kwargs):
+        return self._call('replace', key, *args, **kwargs)
+
+    def append(self, key, *args, **kwargs):
+        return self._call('append', key, *args, **kwargs)
+
+    def prepend(self, key, *args, **kwargs):
+        return self._call('prepend', key, *args, **kwargs)
+
+    def cas(self, key, *args, **kwargs):
+        return self._call('cas', key, *args, **kwargs)
+
+    def delete(self, key, *args, **kwargs):
+        return self._call('delete', key, *args, **kwargs)
+
+    def incr(self, key, *args, **kwargs):
+        return self._call('incr', key, *args, **kwargs)
+
+    def decr(self, key, *args, **kwargs):
+        return self._call('decr', key, *args, **kwargs)
+
+    def touch(self, key, *args, **kwargs):
+        return self._call('touch', key, *args, **kwargs)
+
+    def _get_many(self, name, keys):
+        keys = self._map_keys(keys)
+        method = getattr(self.namespaces.client, name)
+        return dict((keys[key], value)
+                    for key, value in six.iteritems(method(list(keys))))
+
+    def get_many(self, keys):
+        return self._get_many('get_many', keys)
+
+    get_multi = get_many
+
+    def gets_many(self, keys):
+        return self._get_many('gets_many', keys)
+
+    gets_multi = gets_many
+
+    def set_many(self, values, *args, **kwargs):
+        keys = self._map_keys(values)
+        failed = self.namespaces.client.set_many(
+            dict((key, values[original])
+                 for key, original in six.iteritems(keys)),
+            *args, **kwargs)
+        return [keys[key] for key in failed]
+
+    set_multi = set_many
+
+    def delete_many(self, keys, *args, **kwargs):
+        keys = self._map_keys(keys)
+        return self.namespaces.client.delete_many(list(keys), *args, **kwargs)
+
+    delete_multi = delete_many
+
+    def invalidate(self):
+        """Make every key of the namespace unreachable."""
+        return self.namespaces.invalidate(self.namespace)
+
+    def __getattr__(self, name):
+        return getattr(self.namespaces.client, name)
+
+    def __setitem__(self, key, value):
+        self.set(key, value, noreply=True)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError
+        return value
+
+    def __delitem__(self, key):
+        self.delete(key, noreply=True)
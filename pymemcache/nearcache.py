@@ -0,0 +1,290 @@
+"""
+A client keeping recently read values in process, in front of memcached.
+
+Reading the same few keys over and over again costs a network round trip
+each time, even though the values rarely change. The
+:py:class:`NearCacheClient` wraps any client (``Client``, ``PooledClient``,
+``HashClient``...) and keeps the deserialized values it reads in a bounded
+in-process LRU cache for ``ttl`` seconds:
+
+.. code-block:: python
+
+    from pymemcache.client.hash import HashClient
+    from pymemcache.nearcache import NearCacheClient
+
+    client = NearCacheClient(HashClient(servers), ttl=1, max_bytes=2 ** 24)
+    client.get('some_key')  # goes to memcached
+    client.get('some_key')  # served from memory for up to a second
+
+``get`` and ``get_many`` are served from the local cache when possible and
+only the missing keys are sent to memcached. Every write made through the
+wrapper (``set``, ``delete``, ``incr``...) drops the local copy of the key.
+
+Best Practices:
+---------------
+ - Writes made by other processes are not seen until the local copy
+   expires, keep ``ttl`` short unless the values are immutable.
+ - ``None`` values are never cached, as they can't be told apart from a
+   miss.
+ - Use the same type for keys (bytes or text) everywhere, ``b'key'`` and
+   ``u'key'`` are different entries of the local cache.
+ - Cached values are returned by reference, every caller reading a key gets
+   the same object. Never modify them in place, copy them first.
+"""
+
+import collections
+import sys
+import threading
+import time
+import types
+
+import six
+
+_CONTAINER_TYPES = (list, tuple, set, frozenset, collections.deque)
+
+
+def deep_sizeof(value):
+    """
+    Estimate the memory used by a value, including the contents of its
+    dicts, lists, tuples, sets and deques and the attributes of its objects,
+    counting every object once.
+    """
+    size = 0
+    seen = set()
+    pending = [value]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj)
+            pending.extend(six.itervalues(obj))
+        elif isinstance(obj, _CONTAINER_TYPES):
+            pending.extend(obj)
+        elif (hasattr(obj, '__dict__') and
+              not isinstance(obj, (type, types.ModuleType))):
+            pending.append(obj.__dict__)
+    return size
+
+
+class NearCacheClient(object):
+    """
+    Args:
+      client: the client used to talk to memcached.
+      ttl: float, number of seconds a value is kept in the local cache.
+      max_items: maximum number of values kept in the local cache.
+      max_bytes: optional int, maximum size of the values kept in the local
+                 cache, as reported by ``sizeof``.
+      sizeof: function returning the size of a value in bytes, defaults to
+              :py:func:`deep_sizeof`. ``len`` is a cheaper alternative when
+              every value is bytes or text.
+      lock_generator: a callback/type that takes no arguments that will be
+                      called to create the lock protecting the local cache.
+    """
+
+    def __init__(self, client, ttl=1, max_items=10000, max_bytes=None,
+                 sizeof=deep_sizeof, lock_generator=None):
+        if max_items < 1:
+            raise ValueError('"max_items" must be at least 1')
+        self.client = client
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        if lock_generator is None:
+            self._lock = threading.Lock()
+        else:
+            self._lock = lock_generator()
+        # key -> (value, expire time, size), least recently used first
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        # Bumped on every invalidation, so that values fetched before a
+        # write are not stored after it.
+        self._generation = 0
+
+    @property
+    def size(self):
+        """Total size of the values in the local cache, in bytes."""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key, current_time):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if entry[1] <= current_time:
+            self._size -= entry[2]
+            return None
+        # Re-inserting moves the entry to the most recently used end
+        self._entries[key] = entry
+        return entry[0]
+
+    def _store(self, values, generation):
+        expire = time.time() + self.ttl
+        sizes = dict((key, self.sizeof(value))
+                     for key, value in six.iteritems(values))
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            for key, value in six.iteritems(values):
+                size = sizes[key]
+                if self.max_bytes is not None and size > self.max_bytes:
+                    continue
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._size -= old[2]
+                self._entries[key] = (value, expire, size)
+                self._size += size
+
+            while (len(self._entries) > self.max_items or
+                   (self.max_bytes is not None and
+                    self._size > self.max_bytes)):
+                _, entry = self._entries.popitem(last=False)
+                self._size -= entry[2]
+
+    def invalidate(self, keys):
+        """Drop the local copy of ``keys``."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._size -= entry[2]
+
+    def _write(self, keys, func, *args, **kwargs):
+        self.invalidate(keys)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # A read that started before the write completed may have stored
+            # the previous value in the meantime.
+            self.invalidate(keys)
+
+    def clear(self):
+        """Drop every value from the local cache."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._size = 0
+
+    def close(self):
+        self.clear()
+        self.client.close()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key, time.time())
+            generation = self._generation
+        if value is not None:
+            return value
+
+        value = self.client.get(key)
+        if value is None:
+            return default
+        self._store({key: value}, generation)
+        return value
+
+    def get_many(self, keys):
+        result = {}
+        missing = []
+        with self._lock:
+            current_time = time.time()
+            for key in keys:
+                value = self._lookup(key, current_time)
+                if value is None:
+                    missing.append(key)
+                else:
+                    result[key] = value
+            generation = self._generation
+
+        if missing:
+            fetched = self.client.get_many(missing)
+            fetched = dict((key, value)
+                           for key, value in six.iteritems(fetched)
+                           if value is not None)
+            self._store(fetched, generation)
+            result.update(fetched)
+        return result
+
+    get_multi = get_many
+
+    def gets(self, key, *args, **kwargs):
+        return self.client.gets(key, *args, **kwargs)
+
+    def gets_many(self, keys, *args, **kwargs):
+        return self.client.gets_many(keys, *args, **kwargs)
+
+    gets_multi = gets_many
+
+    def set(self, key, *args, **kwargs):
+        return self._write([key], self.client.set, key, *args, **kwargs)
+
+    def set_many(self, values, *args, **kwargs):
+        return self._write(
+            list(values), self.client.set_many, values, *args, **kwargs)
+
+    set_multi = set_many
+
+    def add(self, key, *args, **kwargs):
+        return self._write([key], self.client.add, key, *args, **kwargs)
+
+    def replace(self, key, *args, **kwargs):
+        return self._write([key], self.client.replace, key, *args, **kwargs)
+
+    def append(self, key, *args, **kwargs):
+        return self._write([key], self.client.append, key, *args, **kwargs)
+
+    def prepend(self, key, *args, **kwargs):
+        return self._write([key], self.client.prepend, key, *args, **kwargs)
+
+    def cas(self, key, *args, **kwargs):
+        return self._write([key], self.client.cas, key, *args, **kwargs)
+
+    def delete(self, key, *args, **kwargs):
+        return self._write([key], self.client.delete, key, *args, **kwargs)
+
+    def delete_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        return self._write(
+            keys, self.client.delete_many, keys, *args, **kwargs)
+
+    delete_multi = delete_many
+
+    def incr(self, key, *args, **kwargs):
+        return self._write([key], self.client.incr, key, *args, **kwargs)
+
+    def decr(self, key, *args, **kwargs):
+        return self._write([key], self.client.decr, key, *args, **kwargs)
+
+    def touch(self, key, *args, **kwargs):
+        return self.client.touch(key, *args, **kwargs)
+
+    def stats(self, *args):
+        return self.client.stats(*args)
+
+    def version(self):
+        return self.client.version()
+
+    def flush_all(self, *args, **kwargs):
+        self.clear()
+        return self.client.flush_all(*args, **kwargs)
+
+    def quit(self):
+        return self.client.quit()
+
+    def __setitem__(self, key, value):
+        self.set(key, value, noreply=True)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError
+        return value
+
+    def __delitem__(self, key):
+        self.delete(key, noreply=True)
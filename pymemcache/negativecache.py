@@ -0,0 +1,120 @@
+"""
+Client-side caching of known misses.
+
+Applications often read keys which they know may not exist, such as
+optional settings, and send them to memcached again and again. A
+:py:class:`NegativeCache` given to :py:class:`pymemcache.client.base.Client`,
+:py:class:`pymemcache.client.base.PooledClient` or
+:py:class:`pymemcache.client.hash.HashClient` with the ``negative_cache``
+argument remembers for ``ttl`` seconds the keys that ``get``, ``get_many``,
+``gets`` and ``gets_many`` didn't find, and leaves them out of the next
+requests:
+
+.. code-block:: python
+
+    from pymemcache.client.base import Client
+    from pymemcache.negativecache import NegativeCache
+
+    client = Client(('localhost', 11211), negative_cache=NegativeCache())
+    client.get_many([b'a', b'b'])  # b'b' is missing
+    client.get_many([b'a', b'b'])  # only asks memcached for b'a'
+
+Storing a key through a client using the negative cache (``set``, ``add``,
+``cas``...) removes it from the cache. Writes made by other processes are
+not seen until the miss expires, keep ``ttl`` short. Share a single
+``NegativeCache`` between all the clients of a process, as a key stored by
+one of them is only removed from its own cache.
+"""
+
+import collections
+import threading
+import time
+
+
+class NegativeCache(object):
+    """
+    A bounded set of keys known to be missing, expiring after ``ttl``
+    seconds.
+
+    Args:
+      ttl: float, number of seconds a key is considered missing.
+      max_items: maximum number of keys remembered, the oldest ones are
+                 forgotten first.
+      lock_generator: a callback/type that takes no arguments that will be
+                      called to create the lock protecting the keys.
+    """
+
+    def __init__(self, ttl=1, max_items=100000, lock_generator=None):
+        if max_items < 1:
+            raise ValueError('"max_items" must be at least 1')
+        self.ttl = ttl
+        self.max_items = max_items
+        if lock_generator is None:
+            self._lock = threading.Lock()
+        else:
+            self._lock = lock_generator()
+        # key -> expire time, oldest first
+        self._misses = collections.OrderedDict()
+        # Bumped whenever keys are discarded, so that misses read before a
+        # write are not recorded after it.
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._misses)
+
+    def __contains__(self, key):
+        with self._lock:
+            expire = self._misses.get(key)
+            return expire is not None and expire > time.time()
+
+    def filter(self, keys):
+        """
+        Leave out the keys known to be missing.
+
+        Returns:
+          A tuple (keys, generation) of the keys that may exist, and the
+          generation to pass to :py:meth:`add_many` along with the keys
+          found missing among them.
+        """
+        with self._lock:
+            misses = self._misses
+            if not misses:
+                return keys, self._generation
+            current_time = time.time()
+            remaining = []
+            for key in keys:
+                expire = misses.get(key)
+                if expire is None:
+                    remaining.append(key)
+                elif expire <= current_time:
+                    del misses[key]
+                    remaining.append(key)
+            return remaining, self._generation
+
+    def add_many(self, keys, generation=None):
+        """
+        Remember ``keys`` as missing, unless some keys were discarded since
+        ``generation`` was returned by :py:meth:`filter`.
+        """
+        expire = time.time() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            misses = self._misses
+            for key in keys:
+                misses.pop(key, None)
+                misses[key] = expire
+            while len(misses) > self.max_items:
+                misses.popitem(last=False)
+
+    def discard_many(self, keys):
+        """Forget that ``keys`` are missing."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._misses.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._misses.clear()
@@ -112,3 +112,105 @@ class ObjectPool(object):
             with self._lock:
                 self._free_objs.clear()
                 self._used_objs.clear()
+
+
+class LockFreeObjectPool(ObjectPool):
+    """A pool of objects whose get/release fast path does not take a lock.
+
+    Free objects are kept in a LIFO deque and are handed out and returned
+    with ``deque.pop`` and ``deque.append``, both of which are atomic under
+    the GIL. Objects in use are tracked in a dict, which ``release`` pops
+    from (also atomic), so that releasing an object twice returns it to the
+    free deque only once. The lock is only taken when a new object has to be
+    created or an object is destroyed, so that the size of the pool stays
+    accounted for.
+    """
+
+    def __init__(self, obj_creator,
+                 after_remove=None, max_size=None,
+                 lock_generator=None):
+        super(LockFreeObjectPool, self).__init__(
+            obj_creator,
+            after_remove=after_remove,
+            max_size=max_size,
+            lock_generator=lock_generator)
+        # Every object owned by the pool (used or free), keyed by id() so
+        # that unhashable objects can be pooled as well.
+        self._objs = {}
+        # The objects currently handed out, also keyed by id()
+        self._in_use = {}
+
+    @property
+    def used(self):
+        objs = self._objs
+        return tuple(obj for obj_id, obj in list(self._in_use.items())
+                     if obj_id in objs)
+
+    @property
+    def free(self):
+        # Objects cleared or destroyed while free are only dropped from the
+        # deque when they are popped.
+        objs = self._objs
+        in_use = self._in_use
+        return tuple(obj for obj in tuple(self._free_objs)
+                     if id(obj) in objs and id(obj) not in in_use)
+
+    def _pop_free(self):
+        while True:
+            try:
+                obj = self._free_objs.pop()
+            except IndexError:
+                return None
+            # The object may have been destroyed or cleared while it was
+            # sitting in the free list, in which case it is simply dropped.
+            if id(obj) in self._objs:
+                self._in_use[id(obj)] = obj
+                return obj
+
+    def get(self):
+        obj = self._pop_free()
+        if obj is not None:
+            return obj
+
+        with self._lock:
+            curr_count = len(self._objs)
+            if curr_count >= self.max_size:
+                # Another thread may have released an object while we were
+                # waiting for the lock.
+                obj = self._pop_free()
+                if obj is None:
+                    raise RuntimeError("Too many objects,"
+                                       " %s >= %s" % (curr_count,
+                                                      self.max_size))
+                return obj
+            obj = self._obj_creator()
+            self._objs[id(obj)] = obj
+            self._in_use[id(obj)] = obj
+            return obj
+
+    def destroy(self, obj, silent=True):
+        with self._lock:
+            was_dropped = self._objs.pop(id(obj), None) is not None
+            self._in_use.pop(id(obj), None)
+        if not was_dropped and not silent:
+            raise ValueError("%r is not part of the pool" % (obj,))
+        if was_dropped and self._after_remove is not None:
+            self._after_remove(obj)
+
+    def release(self, obj, silent=True):
+        # Only the first release of an object finds it in use
+        if self._in_use.pop(id(obj), None) is None:
+            if not silent:
+                raise ValueError("%r is not in use" % (obj,))
+            return
+        self._free_objs.append(obj)
+
+    def clear(self):
+        with self._lock:
+            needs_destroy = list(self._objs.values())
+            self._objs.clear()
+            self._in_use.clear()
+            self._free_objs.clear()
+        if self._after_remove is not None:
+            for obj in needs_destroy:
+                self._after_remove(obj)
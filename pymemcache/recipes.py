@@ -0,0 +1,313 @@
+"""
+Common caching patterns built on top of the clients.
+
+Cache-aside with stampede protection
+------------------------------------
+:py:func:`cached` memoizes the results of a function in memcached:
+
+.. code-block:: python
+
+    from pymemcache import serde
+    from pymemcache.client.base import PooledClient
+    from pymemcache.recipes import cached
+
+    client = PooledClient(('localhost', 11211),
+                          serializer=serde.python_memcache_serializer,
+                          deserializer=serde.python_memcache_deserializer)
+
+    @cached(client, ttl=300)
+    def load_user(user_id):
+        return db.query(...)
+
+When a popular entry expires, only one worker recomputes it: the others
+wait for the new value instead of all hitting the database at the same
+time. Workers also recompute entries a little before they expire, with a
+probability growing as the expiration gets closer and as the computation
+gets slower (see "Optimal Probabilistic Cache Stampede Prevention",
+Vattani et al.), so that popular entries are usually refreshed before
+anybody misses them.
+
+Stale-while-revalidate
+----------------------
+:py:func:`stale_while_revalidate` goes one step further for entries which
+may be slightly out of date: once a result is older than ``ttl``, it keeps
+being served for up to ``stale_ttl`` more seconds while a single worker
+recomputes it in the background, so that callers never wait for popular
+entries:
+
+.. code-block:: python
+
+    from concurrent.futures import ThreadPoolExecutor
+    from pymemcache.recipes import stale_while_revalidate
+
+    @stale_while_revalidate(client, ttl=60, stale_ttl=300,
+                            executor=ThreadPoolExecutor(4))
+    def load_homepage(country):
+        return db.query(...)
+
+The new result only replaces the cached one if it wasn't modified in the
+meantime (using ``gets`` and ``cas``), so a concurrent invalidation or
+write is never overwritten by a background refresh.
+
+Both decorators store results along with some metadata, the client must
+therefore use a serializer supporting tuples, such as
+:py:data:`pymemcache.serde.python_memcache_serializer`. The refreshes of
+:py:func:`stale_while_revalidate` run in other threads by default, its
+client must then be thread-safe, such as a ``PooledClient``.
+"""
+
+import functools
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+
+import six
+
+logger = logging.getLogger(__name__)
+
+
+def _default_key(func, args, kwargs):
+    signature = repr((args, sorted(kwargs.items())))
+    if isinstance(signature, six.text_type):
+        signature = signature.encode('utf8')
+    return '%s.%s:%s' % (func.__module__, func.__name__,
+                         hashlib.md5(signature).hexdigest())
+
+
+def _lock_key(key):
+    if isinstance(key, six.binary_type):
+        return key + b':lock'
+    return key + ':lock'
+
+
+def _lock(client, lock_key, lock_timeout):
+    return client.add(lock_key, b'1', expire=lock_timeout, noreply=False)
+
+
+def _wait_for_entry(client, cache_key, lock_key, lock_timeout,
+                    wait_interval):
+    """
+    Wait for whoever holds the lock of a missing entry to store it, the
+    lock is tried again at every step in case they failed.
+
+    Returns:
+      A tuple (entry, locked): the entry if it was stored in the meantime,
+      and whether we now hold the lock. Neither is set when the wait timed
+      out, or when memcached can't be reached.
+    """
+    deadline = time.time() + lock_timeout
+    while not _lock(client, lock_key, lock_timeout):
+        if client.get(lock_key) is None:
+            # Nobody holds the lock, yet it couldn't be taken: the client
+            # failed to reach memcached (and ignores errors). Don't wait
+            # for a lock holder that doesn't exist.
+            return client.get(cache_key), False
+        if time.time() >= deadline:
+            return None, False
+        time.sleep(wait_interval)
+        entry = client.get(cache_key)
+        if entry is not None:
+            return entry, False
+
+    # The entry may have been stored right before we got the lock
+    entry = client.get(cache_key)
+    if entry is not None:
+        client.delete(lock_key, noreply=False)
+        return entry, False
+    return None, True
+
+
+def _should_refresh(delta, expiry, beta):
+    # XFetch: recompute early when now - delta * beta * log(rand()) reaches
+    # the expiration time. log(rand()) is negative, so the gap grows with
+    # the time the value took to compute.
+    return time.time() - delta * beta * math.log(1 - random.random()) >= expiry
+
+
+def cached(client, ttl, key=None, beta=1.0, lock_timeout=30,
+           wait_interval=0.05):
+    """
+    Decorator caching the results of a function in memcached.
+
+    Args:
+      client: the client used to talk to memcached.
+      ttl: int, number of seconds the results are cached for.
+      key: optional function taking the arguments of the decorated function
+           and returning the cache key. Defaults to the name of the function
+           followed by a hash of the arguments.
+      beta: float, how eagerly entries are recomputed before they expire,
+            0 disables early recomputation. Errors raised by early
+            recomputations are logged, and the cached result returned.
+            Defaults to 1.
+      lock_timeout: int, number of seconds a worker may hold the lock of an
+                    entry while recomputing it. Other workers wait up to
+                    that long for the new value before recomputing it
+                    themselves.
+      wait_interval: float, seconds between two reads while waiting for
+                     another worker to recompute an entry.
+
+    The decorated function gains an ``invalidate`` method, taking the same
+    arguments, which deletes the cached result.
+    """
+    def decorator(func):
+        def make_key(args, kwargs):
+            if key is not None:
+                return key(*args, **kwargs)
+            return _default_key(func, args, kwargs)
+
+        def recompute(cache_key, lock_key, args, kwargs):
+            start = time.time()
+            try:
+                value = func(*args, **kwargs)
+                delta = time.time() - start
+                client.set(cache_key, (value, delta, time.time() + ttl),
+                           expire=ttl, noreply=False)
+            finally:
+                if lock_key is not None:
+                    client.delete(lock_key, noreply=False)
+            return value
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = make_key(args, kwargs)
+            lock_key = _lock_key(cache_key)
+            entry = client.get(cache_key)
+
+            if entry is not None:
+                value, delta, expiry = entry
+                if not beta or not _should_refresh(delta, expiry, beta):
+                    return value
+                # Refresh early, unless somebody else already does
+                if not _lock(client, lock_key, lock_timeout):
+                    return value
+                try:
+                    return recompute(cache_key, lock_key, args, kwargs)
+                except Exception:
+                    # The cached value is still valid
+                    logger.exception('Error refreshing %r early', cache_key)
+                    return value
+
+            entry, locked = _wait_for_entry(client, cache_key, lock_key,
+                                            lock_timeout, wait_interval)
+            if entry is not None:
+                return entry[0]
+            return recompute(cache_key, lock_key if locked else None,
+                             args, kwargs)
+
+        def invalidate(*args, **kwargs):
+            client.delete(make_key(args, kwargs), noreply=False)
+
+        wrapper.invalidate = invalidate
+        return wrapper
+
+    return decorator
+
+
+def _start_thread(func, *args):
+    thread = threading.Thread(target=func, args=args)
+    thread.daemon = True
+    thread.start()
+
+
+def stale_while_revalidate(client, ttl, stale_ttl, key=None, executor=None,
+                           lock_timeout=30, wait_interval=0.05):
+    """
+    Decorator caching the results of a function in memcached, and serving
+    expired results while they are recomputed in the background.
+
+    Args:
+      client: the client used to talk to memcached, it must support ``gets``
+              and ``cas``. It is also used by the background refreshes,
+              and must therefore be thread-safe, such as a
+              :py:class:`pymemcache.client.base.PooledClient` (or a
+              ``HashClient`` with ``use_pooling=True``) when ``executor``
+              runs them in other threads, as the default does.
+      ttl: int, number of seconds the results are fresh for.
+      stale_ttl: int, number of seconds expired results keep being served
+                 while they are recomputed. Results are deleted from
+                 memcached after ``ttl + stale_ttl`` seconds.
+      key: optional function taking the arguments of the decorated function
+           and returning the cache key. Defaults to the name of the function
+           followed by a hash of the arguments.
+      executor: optional object with a ``submit(func, *args)`` method, such
+                as a ``concurrent.futures.ThreadPoolExecutor``, running the
+                background recomputations. Defaults to starting a new thread
+                for each of them.
+      lock_timeout: int, number of seconds a worker may hold the lock of an
+                    entry while recomputing it.
+      wait_interval: float, seconds between two reads while waiting for
+                     another worker to compute a missing entry.
+
+    The decorated function gains an ``invalidate`` method, taking the same
+    arguments, which deletes the cached result.
+    """
+    if executor is None:
+        submit = _start_thread
+    else:
+        submit = executor.submit
+
+    def decorator(func):
+        def make_key(args, kwargs):
+            if key is not None:
+                return key(*args, **kwargs)
+            return _default_key(func, args, kwargs)
+
+        def store(cache_key, value, cas=None):
+            entry = (value, time.time() + ttl)
+            if cas is None:
+                client.set(cache_key, entry, expire=ttl + stale_ttl,
+                           noreply=False)
+            else:
+                client.cas(cache_key, entry, cas, expire=ttl + stale_ttl,
+                           noreply=False)
+
+        def refresh(cache_key, lock_key, cas, args, kwargs):
+            try:
+                store(cache_key, func(*args, **kwargs), cas)
+            except Exception:
+                logger.exception('Error refreshing %r', cache_key)
+            finally:
+                client.delete(lock_key, noreply=False)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = make_key(args, kwargs)
+            lock_key = _lock_key(cache_key)
+            # HashClient returns None instead of a tuple on errors
+            entry, cas = client.gets(cache_key) or (None, None)
+
+            if entry is not None:
+                value, stale_at = entry
+                if (time.time() < stale_at or
+                        not _lock(client, lock_key, lock_timeout)):
+                    return value
+                try:
+                    submit(refresh, cache_key, lock_key, cas, args, kwargs)
+                except Exception:
+                    client.delete(lock_key, noreply=False)
+                    logger.exception('Error scheduling the refresh of %r',
+                                     cache_key)
+                return value
+
+            entry, locked = _wait_for_entry(client, cache_key, lock_key,
+                                            lock_timeout, wait_interval)
+            if entry is not None:
+                return entry[0]
+            try:
+                value = func(*args, **kwargs)
+                store(cache_key, value)
+            finally:
+                if locked:
+                    client.delete(lock_key, noreply=False)
+            return value
+
+        def invalidate(*args, **kwargs):
+            client.delete(make_key(args, kwargs), noreply=False)
+
+        wrapper.invalidate = invalidate
+        return wrapper
+
+    return decorator
@@ -12,9 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import defaultdict, namedtuple, OrderedDict
 from functools import partial
 import logging
 from io import BytesIO
+import json
+import struct
+import threading
+import zlib
 import six
 from six.moves import cPickle as pickle
 
@@ -23,13 +28,55 @@ try:
 except NameError:
     long_type = None
 
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    # zlib only supports preset dictionaries on Python 3
+    zlib.compressobj(zdict=b'')
+    zlib_zdict = True
+except TypeError:
+    zlib_zdict = False
+
 
 FLAG_BYTES = 0
 FLAG_PICKLE = 1 << 0
 FLAG_INTEGER = 1 << 1
 FLAG_LONG = 1 << 2
-FLAG_COMPRESSED = 1 << 3  # unused, to main compatibility with python-memcached
+FLAG_COMPRESSED = 1 << 3  # zlib compatible with python-memcached
 FLAG_TEXT = 1 << 4
+FLAG_PICKLE_BUFFERS = 1 << 5
+FLAG_FLOAT = 1 << 6
+FLAG_BOOL = 1 << 7
+FLAG_NONE = 1 << 8
+FLAG_JSON = 1 << 9
+FLAG_COMPACT = 1 << 10
+FLAG_CHECKSUM = 1 << 11
+FLAG_ENCRYPTED = 1 << 12
+FLAG_ZDICT = 1 << 13
+FLAG_NUMPY = 1 << 14
 
 # Pickle protocol version (highest available to runtime)
 # Warning with `0`: If somewhere in your value lies a slotted object,
@@ -40,6 +87,17 @@ FLAG_TEXT = 1 << 4
 DEFAULT_PICKLE_VERSION = pickle.HIGHEST_PROTOCOL
 
 
+def _batch_hook(func, name):
+    """
+    Return the batch version of a serializer or deserializer: its ``name``
+    attribute, or the ``name`` attribute of the object it is a method of.
+    """
+    hook = getattr(func, name, None)
+    if hook is None:
+        hook = getattr(getattr(func, '__self__', None), name, None)
+    return hook
+
+
 def _python_memcache_serializer(key, value, pickle_version=None):
     flags = 0
     value_type = type(value)
@@ -105,3 +163,1020 @@ def python_memcache_deserializer(key, value, flags):
             return None
 
     return value
+
+
+class CompressionCodec(namedtuple('CompressionCodec',
+                                  ['name', 'magic', 'compress',
+                                   'decompress'])):
+    """
+    A compression algorithm usable by :py:func:`get_compressing_serializer`.
+
+    The deserializers recognize the codec of a value from the ``magic``
+    bytes its compressed form starts with. Values without a known magic
+    prefix are decompressed with zlib, as python-memcached does.
+    """
+    __slots__ = ()
+
+
+# name -> CompressionCodec, the codecs whose modules aren't installed are
+# left out.
+COMPRESSION_CODECS = OrderedDict()
+COMPRESSION_CODECS['zlib'] = CompressionCodec(
+    'zlib', None, zlib.compress, zlib.decompress)
+if bz2 is not None:
+    COMPRESSION_CODECS['bz2'] = CompressionCodec(
+        'bz2', b'BZh', bz2.compress, bz2.decompress)
+if lzma is not None:
+    COMPRESSION_CODECS['lzma'] = CompressionCodec(
+        'lzma', b'\xfd7zXZ\x00', lzma.compress, lzma.decompress)
+if lz4 is not None:
+    COMPRESSION_CODECS['lz4'] = CompressionCodec(
+        'lz4', b'\x04\x22\x4d\x18', lz4.frame.compress, lz4.frame.decompress)
+if zstandard is not None:
+    # Compressor objects can't be shared between threads
+    COMPRESSION_CODECS['zstd'] = CompressionCodec(
+        'zstd', b'\x28\xb5\x2f\xfd',
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data))
+
+DEFAULT_MIN_COMPRESS_LEN = 1024
+
+
+def decompress(value):
+    """Decompress a value compressed with any of the known codecs."""
+    for codec in six.itervalues(COMPRESSION_CODECS):
+        if codec.magic is not None and value[:len(codec.magic)] == codec.magic:
+            return codec.decompress(value)
+    return zlib.decompress(value)
+
+
+def _compressing_serializer(key, value, serializer, min_compress_len,
+                            codec):
+    value, flags = serializer(key, value)
+    if not isinstance(value, six.binary_type):
+        value = six.text_type(value).encode('ascii')
+
+    if len(value) >= min_compress_len:
+        compressed = codec.compress(value)
+        # Not worth it for values that don't compress
+        if len(compressed) < len(value):
+            return compressed, flags | FLAG_COMPRESSED
+    return value, flags
+
+
+def get_compressing_serializer(serializer=python_memcache_serializer,
+                               min_compress_len=DEFAULT_MIN_COMPRESS_LEN,
+                               codec='zlib'):
+    """
+    Return a serializer compressing the output of another serializer.
+
+    Args:
+      serializer: the serializer whose output is compressed.
+      min_compress_len: int, values shorter than that are stored as is.
+      codec: the name of one of the :py:data:`COMPRESSION_CODECS`, or a
+             :py:class:`CompressionCodec`. Values compressed with zlib (the
+             default) can be read by python-memcached.
+    """
+    if not isinstance(codec, CompressionCodec):
+        codec = COMPRESSION_CODECS[codec]
+    return partial(_compressing_serializer, serializer=serializer,
+                   min_compress_len=min_compress_len, codec=codec)
+
+
+compressing_serializer = get_compressing_serializer()
+
+
+def _compressing_deserializer(key, value, flags, deserializer):
+    if flags & FLAG_COMPRESSED:
+        value = decompress(value)
+        flags &= ~FLAG_COMPRESSED
+    return deserializer(key, value, flags)
+
+
+def get_compressing_deserializer(deserializer=python_memcache_deserializer):
+    """
+    Return a deserializer decompressing values before passing them to another
+    deserializer.
+    """
+    return partial(_compressing_deserializer, deserializer=deserializer)
+
+
+compressing_deserializer = get_compressing_deserializer()
+
+
+_BUFFER_COUNT = struct.Struct('>I')
+_NATIVE_TYPES = (bytes, six.text_type, int)
+if long_type is not None:
+    _NATIVE_TYPES += (long_type,)
+
+
+def pickle_buffers_serializer(key, value):
+    """
+    A serializer pickling values with protocol 5, with the large buffers
+    of objects supporting it (such as NumPy arrays) laid out after the
+    pickle data instead of being copied into it.
+
+    Bytes, text and integers are serialized as with
+    :py:func:`python_memcache_serializer`, as well as every value with
+    Python versions older than 3.8. Values without out-of-band buffers are
+    stored as regular pickles.
+    """
+    if type(value) in _NATIVE_TYPES or pickle.HIGHEST_PROTOCOL < 5:
+        return python_memcache_serializer(key, value)
+
+    buffers = []
+    data = pickle.dumps(value, protocol=5,
+                        buffer_callback=lambda buffer: buffers.append(
+                            buffer.raw()))
+    if not buffers:
+        return data, FLAG_PICKLE
+
+    sizes = [len(data)] + [buffer.nbytes for buffer in buffers]
+    header = (_BUFFER_COUNT.pack(len(buffers)) +
+              struct.pack('>%dQ' % len(sizes), *sizes))
+    return b''.join([header, data] + buffers), FLAG_PICKLE | FLAG_PICKLE_BUFFERS
+
+
+def pickle_buffers_deserializer(key, value, flags):
+    """
+    The deserializer of :py:func:`pickle_buffers_serializer`. Out-of-band
+    buffers are memoryviews of the received value, so objects built on
+    them, such as NumPy arrays, share its memory and are read-only.
+    """
+    if not flags & FLAG_PICKLE_BUFFERS:
+        return python_memcache_deserializer(key, value, flags)
+
+    try:
+        view = memoryview(value)
+        count, = _BUFFER_COUNT.unpack_from(view)
+        sizes = struct.unpack_from('>%dQ' % (count + 1), view,
+                                   _BUFFER_COUNT.size)
+        offset = _BUFFER_COUNT.size + 8 * len(sizes)
+        slices = []
+        for size in sizes:
+            slices.append(view[offset:offset + size])
+            offset += size
+        return pickle.loads(slices[0], buffers=slices[1:])
+    except Exception:
+        logging.info('Pickle error', exc_info=True)
+        return None
+
+
+def _unpickle(value):
+    try:
+        buf = BytesIO(value)
+        unpickler = pickle.Unpickler(buf)
+        return unpickler.load()
+    except Exception:
+        logging.info('Pickle error', exc_info=True)
+        return None
+
+
+def _encode_text(value):
+    return value.encode('utf8')
+
+
+def _decode_text(value):
+    return value.decode('utf8')
+
+
+def _encode_number(value):
+    return ('%d' % value).encode('ascii')
+
+
+def _encode_float(value):
+    # repr() is the shortest string giving back the same float
+    return repr(value).encode('ascii')
+
+
+def _encode_bool(value):
+    return b'1' if value else b'0'
+
+
+def _decode_bool(value):
+    return value == b'1'
+
+
+_JSON_SCALAR_TYPES = (six.text_type, int, float, bool, type(None))
+if long_type is not None:
+    _JSON_SCALAR_TYPES += (long_type,)
+
+
+def _is_small_json(value, max_items):
+    """Check that a value is made of at most max_items elements which JSON
+    gives back unchanged."""
+    stack = [value]
+    count = 0
+    while stack:
+        item = stack.pop()
+        item_type = type(item)
+        if item_type in _JSON_SCALAR_TYPES:
+            continue
+        elif item_type is list:
+            stack.extend(item)
+        elif item_type is dict:
+            for item_key in item:
+                if type(item_key) is not six.text_type:
+                    return False
+            stack.extend(six.itervalues(item))
+        else:
+            return False
+        count += len(item)
+        if count > max_items:
+            return False
+    return True
+
+
+def _decode_json(value):
+    return json.loads(value.decode('utf8'))
+
+
+class SerdeRegistry(object):
+    """
+    A serializer and deserializer looking up how to encode values from
+    their exact type, and how to decode them from their flags.
+
+    Bytes, text, integers and anything that isn't registered are stored as
+    with :py:func:`python_memcache_serializer`. Floats, booleans and None,
+    as well as lists and dicts of up to ``max_json_items`` elements which
+    JSON gives back unchanged, get their own compact encodings. So do NumPy
+    arrays when NumPy is installed, see :py:func:`numpy_serializer`:
+
+    .. code-block:: python
+
+        registry = SerdeRegistry()
+        registry.register(decimal.Decimal, 1 << 16,
+                          lambda value: str(value).encode('ascii'),
+                          lambda value: decimal.Decimal(value.decode()))
+        client = Client(('localhost', 11211),
+                        serializer=registry.serialize,
+                        deserializer=registry.deserialize)
+
+    Args:
+      pickle_version: the pickle protocol used for the values of other
+                      types.
+      max_json_items: int, the maximum amount of elements of the lists and
+                      dicts encoded with JSON, 0 pickles them all.
+    """
+
+    def __init__(self, pickle_version=DEFAULT_PICKLE_VERSION,
+                 max_json_items=64):
+        self.pickle_version = pickle_version
+        self.max_json_items = max_json_items
+        # type -> (flag, encode)
+        self._encoders = {}
+        # flag -> decode
+        self._decoders = {FLAG_BYTES: None, FLAG_PICKLE: _unpickle}
+
+        self.register(six.text_type, FLAG_TEXT, _encode_text, _decode_text)
+        self.register(int, FLAG_INTEGER, _encode_number, int)
+        if long_type is not None:
+            self.register(long_type, FLAG_LONG, _encode_number, long_type)
+        else:
+            # Longs stored by Python 2 clients
+            self._decoders[FLAG_LONG] = int
+        self.register(float, FLAG_FLOAT, _encode_float, float)
+        self.register(bool, FLAG_BOOL, _encode_bool, _decode_bool)
+        self.register(type(None), FLAG_NONE, lambda value: b'',
+                      lambda value: None)
+        self.register(list, FLAG_JSON, self._encode_json, _decode_json)
+        self.register(dict, FLAG_JSON, self._encode_json, _decode_json)
+        if numpy is not None:
+            self.register(numpy.ndarray, FLAG_NUMPY, _encode_array,
+                          _decode_array)
+
+    def register(self, value_type, flag, encode, decode):
+        """
+        Register how to store the values of a type.
+
+        Args:
+          value_type: the exact type of the values, subclasses aren't
+                      matched.
+          flag: int, the flags stored along with the values. Several types
+                may share the same flags and decode function.
+          encode: function taking a value and returning bytes, or None to
+                  pickle that value instead.
+          decode: function taking the bytes returned by ``encode`` and
+                  returning the value.
+        """
+        self._encoders[value_type] = (flag, encode)
+        self._decoders[flag] = decode
+
+    def _encode_json(self, value):
+        if not _is_small_json(value, self.max_json_items):
+            return None
+        return json.dumps(value, separators=(',', ':')).encode('utf8')
+
+    def serialize(self, key, value):
+        if type(value) is bytes:
+            return value, FLAG_BYTES
+
+        encoder = self._encoders.get(type(value))
+        if encoder is not None:
+            flag, encode = encoder
+            encoded = encode(value)
+            if encoded is not None:
+                return encoded, flag
+
+        output = BytesIO()
+        pickler = pickle.Pickler(output, self.pickle_version)
+        pickler.dump(value)
+        return output.getvalue(), FLAG_PICKLE
+
+    def deserialize(self, key, value, flags):
+        try:
+            decode = self._decoders[flags]
+        except KeyError:
+            # Unknown flags
+            return value
+        if decode is None:
+            return value
+        return decode(value)
+
+    def serialize_many(self, items):
+        """Serialize a list of (key, value) tuples."""
+        serialize = self.serialize
+        return [serialize(key, value) for key, value in items]
+
+    def deserialize_many(self, items):
+        """
+        Deserialize a list of (key, value, flags) tuples. JSON values are
+        all decoded with a single ``json.loads`` call.
+        """
+        deserialize = self.deserialize
+        json_indexes = [index for index, (_, _, flags) in enumerate(items)
+                        if flags == FLAG_JSON]
+        if len(json_indexes) < 2 or self._decoders[FLAG_JSON] is not \
+                _decode_json:
+            return [deserialize(key, value, flags)
+                    for key, value, flags in items]
+
+        result = [None] * len(items)
+        try:
+            values = _decode_json(b'[' + b','.join(
+                items[index][1] for index in json_indexes) + b']')
+            if len(values) != len(json_indexes):
+                raise ValueError('Invalid JSON value')
+        except ValueError:
+            # One of the values is invalid, split the batch
+            values = [_decode_json(items[index][1])
+                      for index in json_indexes]
+        for index, value in zip(json_indexes, values):
+            result[index] = value
+
+        for index, (key, value, flags) in enumerate(items):
+            if flags != FLAG_JSON:
+                result[index] = deserialize(key, value, flags)
+        return result
+
+
+# Tags of the compact format, mostly those of MessagePack
+_COMPACT_FIXMAP = 0x80
+_COMPACT_FIXARRAY = 0x90
+_COMPACT_FIXSTR = 0xa0
+_COMPACT_NONE = 0xc0
+_COMPACT_TUPLE = 0xc1
+_COMPACT_FALSE = 0xc2
+_COMPACT_TRUE = 0xc3
+_COMPACT_BYTES = 0xc6
+_COMPACT_BIGINT = 0xc7
+_COMPACT_FLOAT = 0xcb
+_COMPACT_INT = 0xd3
+_COMPACT_STR = 0xdb
+_COMPACT_ARRAY = 0xdd
+_COMPACT_MAP = 0xdf
+
+# Tags followed by a 32 bits size
+_COMPACT_SIZED_TAGS = frozenset([
+    _COMPACT_TUPLE, _COMPACT_BYTES, _COMPACT_BIGINT, _COMPACT_STR,
+    _COMPACT_ARRAY, _COMPACT_MAP])
+
+_UINT32 = struct.Struct('>I')
+_INT64 = struct.Struct('>q')
+_FLOAT64 = struct.Struct('>d')
+
+if six.PY3:
+    def _decode_utf8(view):
+        return str(view, 'utf8')
+else:
+    def _decode_utf8(view):
+        return view.tobytes().decode('utf8')
+
+
+def _pack_int(value, out):
+    if 0 <= value < 0x80:
+        out.append(value)
+    elif -0x20 <= value < 0:
+        out.append(value & 0xff)
+    elif -0x8000000000000000 <= value <= 0x7fffffffffffffff:
+        out.append(_COMPACT_INT)
+        out += _INT64.pack(value)
+    else:
+        digits = ('%d' % value).encode('ascii')
+        out.append(_COMPACT_BIGINT)
+        out += _UINT32.pack(len(digits))
+        out += digits
+
+
+def _pack_text(value, out):
+    data = value.encode('utf8')
+    if len(data) < 0x20:
+        out.append(_COMPACT_FIXSTR | len(data))
+    else:
+        out.append(_COMPACT_STR)
+        out += _UINT32.pack(len(data))
+    out += data
+
+
+def _pack_bytes(value, out):
+    out.append(_COMPACT_BYTES)
+    out += _UINT32.pack(len(value))
+    out += value
+
+
+def _pack_float(value, out):
+    out.append(_COMPACT_FLOAT)
+    out += _FLOAT64.pack(value)
+
+
+def _pack_bool(value, out):
+    out.append(_COMPACT_TRUE if value else _COMPACT_FALSE)
+
+
+def _pack_none(value, out):
+    out.append(_COMPACT_NONE)
+
+
+def _pack_list(value, out):
+    if len(value) < 0x10:
+        out.append(_COMPACT_FIXARRAY | len(value))
+    else:
+        out.append(_COMPACT_ARRAY)
+        out += _UINT32.pack(len(value))
+    for item in value:
+        _compact_pack(item, out)
+
+
+def _pack_tuple(value, out):
+    out.append(_COMPACT_TUPLE)
+    out += _UINT32.pack(len(value))
+    for item in value:
+        _compact_pack(item, out)
+
+
+def _pack_dict(value, out):
+    if len(value) < 0x10:
+        out.append(_COMPACT_FIXMAP | len(value))
+    else:
+        out.append(_COMPACT_MAP)
+        out += _UINT32.pack(len(value))
+    for item_key, item in six.iteritems(value):
+        _compact_pack(item_key, out)
+        _compact_pack(item, out)
+
+
+_COMPACT_PACKERS = {
+    int: _pack_int,
+    six.text_type: _pack_text,
+    bytes: _pack_bytes,
+    float: _pack_float,
+    bool: _pack_bool,
+    type(None): _pack_none,
+    list: _pack_list,
+    tuple: _pack_tuple,
+    dict: _pack_dict,
+}
+if long_type is not None:
+    _COMPACT_PACKERS[long_type] = _pack_int
+
+
+def _compact_pack(value, out):
+    try:
+        packer = _COMPACT_PACKERS[type(value)]
+    except KeyError:
+        raise TypeError('Unsupported type %r' % type(value))
+    packer(value, out)
+
+
+def _compact_unpack_items(view, offset, count):
+    items = []
+    for _ in range(count):
+        item, offset = _compact_unpack(view, offset)
+        items.append(item)
+    return items, offset
+
+
+def _compact_unpack_dict(view, offset, count):
+    result = {}
+    for _ in range(count):
+        item_key, offset = _compact_unpack(view, offset)
+        result[item_key], offset = _compact_unpack(view, offset)
+    return result, offset
+
+
+def _compact_unpack(view, offset):
+    """Decode the value at ``offset``, return it and the offset of the next
+    value."""
+    tag = six.indexbytes(view, offset)
+    offset += 1
+    if tag < 0x80:
+        return tag, offset
+    elif tag >= 0xe0:
+        return tag - 0x100, offset
+    elif tag >= _COMPACT_FIXSTR and tag < _COMPACT_NONE:
+        end = offset + (tag & 0x1f)
+        return _decode_utf8(view[offset:end]), end
+    elif tag >= _COMPACT_FIXARRAY and tag < _COMPACT_FIXSTR:
+        return _compact_unpack_items(view, offset, tag & 0x0f)
+    elif tag >= _COMPACT_FIXMAP and tag < _COMPACT_FIXARRAY:
+        return _compact_unpack_dict(view, offset, tag & 0x0f)
+    elif tag == _COMPACT_NONE:
+        return None, offset
+    elif tag == _COMPACT_FALSE:
+        return False, offset
+    elif tag == _COMPACT_TRUE:
+        return True, offset
+    elif tag == _COMPACT_INT:
+        return _INT64.unpack_from(view, offset)[0], offset + _INT64.size
+    elif tag == _COMPACT_FLOAT:
+        return _FLOAT64.unpack_from(view, offset)[0], offset + _FLOAT64.size
+    elif tag not in _COMPACT_SIZED_TAGS:
+        raise ValueError('Unknown tag 0x%02x' % tag)
+
+    size, = _UINT32.unpack_from(view, offset)
+    offset += _UINT32.size
+    if tag == _COMPACT_STR:
+        return _decode_utf8(view[offset:offset + size]), offset + size
+    elif tag == _COMPACT_BYTES:
+        return view[offset:offset + size].tobytes(), offset + size
+    elif tag == _COMPACT_ARRAY:
+        return _compact_unpack_items(view, offset, size)
+    elif tag == _COMPACT_TUPLE:
+        items, offset = _compact_unpack_items(view, offset, size)
+        return tuple(items), offset
+    elif tag == _COMPACT_MAP:
+        return _compact_unpack_dict(view, offset, size)
+    else:
+        digits = view[offset:offset + size].tobytes()
+        return int(digits), offset + size
+
+
+def compact_dumps(value):
+    """
+    Encode a value made of dicts, lists, tuples, text, bytes, integers,
+    floats, booleans and None in a compact binary form, close to
+    MessagePack.
+
+    Raises:
+      TypeError: the value contains objects of other types (subclasses
+        included).
+    """
+    out = bytearray()
+    _compact_pack(value, out)
+    return bytes(out)
+
+
+def compact_loads(data):
+    """Decode a value encoded with :py:func:`compact_dumps`."""
+    view = memoryview(data)
+    try:
+        value, offset = _compact_unpack(view, 0)
+    except (IndexError, struct.error):
+        raise ValueError('Truncated data')
+    if offset != len(view):
+        raise ValueError('Trailing data after the value')
+    return value
+
+
+def compact_serializer(key, value):
+    """
+    A serializer storing containers, floats, booleans and None with
+    :py:func:`compact_dumps`. Bytes, text, integers and values of other
+    types are serialized as with :py:func:`python_memcache_serializer`.
+    """
+    if type(value) not in _NATIVE_TYPES:
+        try:
+            return compact_dumps(value), FLAG_COMPACT
+        except TypeError:
+            pass
+    return python_memcache_serializer(key, value)
+
+
+def compact_deserializer(key, value, flags):
+    """The deserializer of :py:func:`compact_serializer`."""
+    if flags != FLAG_COMPACT:
+        return python_memcache_deserializer(key, value, flags)
+    try:
+        return compact_loads(value)
+    except Exception:
+        logging.info('Compact decoding error', exc_info=True)
+        return None
+
+
+class SerdeStage(object):
+    """
+    A transformation of serialized values in a :py:class:`SerdePipeline`.
+
+    Subclasses set ``flag`` to the flag bit stored along with the values
+    they transformed, and implement ``encode`` and ``decode``.
+
+    Args:
+      min_size: int, values shorter than that skip the stage.
+    """
+    flag = 0
+
+    def __init__(self, min_size=0):
+        self.min_size = min_size
+
+    def encode(self, key, data):
+        """Return the transformed bytes, or None to leave ``data`` as is."""
+        raise NotImplementedError()
+
+    def decode(self, key, data):
+        """Reverse ``encode``, raise an exception if ``data`` is invalid."""
+        raise NotImplementedError()
+
+
+class CompressionStage(SerdeStage):
+    """
+    Compress values, with any of the :py:data:`COMPRESSION_CODECS` or a
+    :py:class:`CompressionCodec`. Values that don't get smaller are left
+    as is.
+    """
+    flag = FLAG_COMPRESSED
+
+    def __init__(self, codec='zlib', min_size=DEFAULT_MIN_COMPRESS_LEN):
+        super(CompressionStage, self).__init__(min_size)
+        if not isinstance(codec, CompressionCodec):
+            codec = COMPRESSION_CODECS[codec]
+        self.codec = codec
+
+    def encode(self, key, data):
+        compressed = self.codec.compress(data)
+        if len(compressed) < len(data):
+            return compressed
+        return None
+
+    def decode(self, key, data):
+        return decompress(data)
+
+
+_CRC32 = struct.Struct('>I')
+
+
+class ChecksumStage(SerdeStage):
+    """Prefix values with their CRC32, checked when they are read."""
+    flag = FLAG_CHECKSUM
+
+    def encode(self, key, data):
+        return _CRC32.pack(zlib.crc32(data) & 0xffffffff) + data
+
+    def decode(self, key, data):
+        checksum, = _CRC32.unpack_from(data)
+        data = data[_CRC32.size:]
+        if zlib.crc32(data) & 0xffffffff != checksum:
+            raise ValueError('Checksum mismatch')
+        return data
+
+
+class EncryptionStage(SerdeStage):
+    """
+    Encrypt values with a cipher object providing ``encrypt(data)`` and
+    ``decrypt(data)`` methods, such as ``cryptography.fernet.Fernet``.
+    """
+    flag = FLAG_ENCRYPTED
+
+    def __init__(self, cipher, min_size=0):
+        super(EncryptionStage, self).__init__(min_size)
+        self.cipher = cipher
+
+    def encode(self, key, data):
+        return self.cipher.encrypt(data)
+
+    def decode(self, key, data):
+        return self.cipher.decrypt(data)
+
+
+class SerdePipeline(object):
+    """
+    A serializer and deserializer passing values through a list of
+    stages after serializing them, and through the same stages in reverse
+    order before deserializing them:
+
+    .. code-block:: python
+
+        pipeline = SerdePipeline(stages=[CompressionStage(min_size=1024),
+                                         ChecksumStage()])
+        client = Client(('localhost', 11211),
+                        serializer=pipeline.serialize,
+                        deserializer=pipeline.deserialize)
+
+    A stage is only reversed for the values whose flags have its flag bit,
+    so stages can be added to a pipeline while older values are still
+    cached. Values which fail to decode (wrong checksum...) are treated as
+    misses.
+
+    Args:
+      serializer: the serializer run before the stages.
+      deserializer: the deserializer run after the stages.
+      stages: list of :py:class:`SerdeStage`, with distinct flags which
+              the serializer doesn't use.
+    """
+
+    def __init__(self, serializer=python_memcache_serializer,
+                 deserializer=python_memcache_deserializer, stages=()):
+        used_flags = 0
+        for stage in stages:
+            if not stage.flag or used_flags & stage.flag:
+                raise ValueError(
+                    'Stages must have distinct, non-zero flags')
+            used_flags |= stage.flag
+        self.serializer = serializer
+        self.deserializer = deserializer
+        self.stages = list(stages)
+        self._stage_flags = used_flags
+
+    def serialize(self, key, value):
+        return self._encode(key, *self.serializer(key, value))
+
+    def _encode(self, key, data, flags):
+        if not isinstance(data, six.binary_type):
+            data = six.text_type(data).encode('ascii')
+
+        for stage in self.stages:
+            if len(data) < stage.min_size:
+                continue
+            encoded = stage.encode(key, data)
+            if encoded is not None:
+                data = encoded
+                flags |= stage.flag
+        return data, flags
+
+    def _decode(self, key, value, flags):
+        """Reverse the stages, return the value and flags to deserialize, or
+        None if a stage failed."""
+        if flags & self._stage_flags:
+            try:
+                for stage in reversed(self.stages):
+                    if flags & stage.flag:
+                        value = stage.decode(key, value)
+            except Exception:
+                logging.info('Error decoding the value of %r', key,
+                             exc_info=True)
+                return None
+            flags &= ~self._stage_flags
+        return value, flags
+
+    def deserialize(self, key, value, flags):
+        decoded = self._decode(key, value, flags)
+        if decoded is None:
+            return None
+        return self.deserializer(key, *decoded)
+
+    def serialize_many(self, items):
+        """Serialize a list of (key, value) tuples, with the batch version
+        of the serializer when it has one."""
+        serialize_many = _batch_hook(self.serializer, 'serialize_many')
+        if serialize_many is None:
+            return [self.serialize(key, value) for key, value in items]
+        return [self._encode(key, data, flags) for (key, _), (data, flags)
+                in zip(items, serialize_many(items))]
+
+    def deserialize_many(self, items):
+        """Deserialize a list of (key, value, flags) tuples, with the batch
+        version of the deserializer when it has one."""
+        deserialize_many = _batch_hook(self.deserializer, 'deserialize_many')
+        if deserialize_many is None:
+            return [self.deserialize(key, value, flags)
+                    for key, value, flags in items]
+
+        result = [None] * len(items)
+        indexes = []
+        decoded_items = []
+        for index, (key, value, flags) in enumerate(items):
+            decoded = self._decode(key, value, flags)
+            if decoded is not None:
+                indexes.append(index)
+                decoded_items.append((key,) + decoded)
+        for index, value in zip(indexes, deserialize_many(decoded_items)):
+            result[index] = value
+        return result
+
+
+def train_dictionary(samples, size=32 * 1024, segment_size=16):
+    """
+    Build a preset dictionary for :py:class:`DictionaryCompressionStage`
+    from sample values, made of the segments found in the most samples.
+
+    Args:
+      samples: list of bytes, representative serialized values.
+      size: int, maximum size of the dictionary. zlib only uses the last
+            32KB.
+      segment_size: int, length of the segments looked up in the samples.
+
+    Returns:
+      The dictionary, as bytes.
+    """
+    counts = defaultdict(int)
+    for sample in samples:
+        segments = set(sample[offset:offset + segment_size]
+                       for offset in range(len(sample) - segment_size + 1))
+        for segment in segments:
+            counts[segment] += 1
+
+    common = sorted((count, segment) for segment, count in
+                    six.iteritems(counts) if count > 1)
+    chosen = []
+    covered = bytearray()
+    half = segment_size // 2
+    # Most common segments first, as they are chosen in priority
+    for count, segment in reversed(common):
+        if len(covered) + len(segment) > size:
+            break
+        # Skip the segments overlapping a chosen one, such as the same
+        # text shifted by a few bytes
+        if segment[:half] in covered or segment[half:] in covered:
+            continue
+        chosen.append(segment)
+        covered += segment
+    # ... but they go at the end, where matches are the cheapest to encode
+    return b''.join(reversed(chosen))
+
+
+def train_zstd_dictionary(samples, size=32 * 1024):
+    """
+    Train a zstd dictionary for :py:class:`DictionaryCompressionStage`,
+    requires the ``zstandard`` package.
+    """
+    if zstandard is None:
+        raise ImportError('zstandard is not installed')
+    return zstandard.train_dictionary(size, samples)
+
+
+_DICTIONARY_ID = struct.Struct('>I')
+
+
+class DictionaryCompressionStage(SerdeStage):
+    """
+    Compress values with a preset dictionary, which helps a lot with
+    small values looking alike (JSON documents of the same schema...)
+    that generic compression barely shrinks.
+
+    The id of the dictionary is stored at the beginning of each value, so
+    that dictionaries can be rotated: keep the previous dictionaries in
+    ``dictionaries`` until the values compressed with them expire, values
+    whose dictionary is unknown are treated as misses.
+
+    Args:
+      dictionaries: dict mapping ids (ints below 2 ** 32) to zlib
+                    dictionaries (bytes, see :py:func:`train_dictionary`,
+                    requires Python 3) or ``zstandard.ZstdCompressionDict``
+                    objects (see :py:func:`train_zstd_dictionary`).
+      dictionary_id: the id of the dictionary used to compress values.
+      level: int, the compression level, defaults to the codec's default.
+      min_size: int, values shorter than that are stored as is.
+    """
+    flag = FLAG_ZDICT
+
+    def __init__(self, dictionaries, dictionary_id, level=None, min_size=0):
+        super(DictionaryCompressionStage, self).__init__(min_size)
+        self.dictionaries = dict(dictionaries)
+        if not zlib_zdict and any(
+                isinstance(dictionary, six.binary_type)
+                for dictionary in self.dictionaries.values()):
+            raise ValueError(
+                'zlib dictionaries require Python 3, use zstandard '
+                'dictionaries instead')
+        self.dictionary_id = dictionary_id
+        self.level = level
+        self._header = _DICTIONARY_ID.pack(dictionary_id)
+        # zstd compressors can't be shared between threads
+        self._local = threading.local()
+
+        dictionary = self.dictionaries[dictionary_id]
+        if not isinstance(dictionary, six.binary_type):
+            self._zlib_compressor = None
+        else:
+            level = -1 if level is None else level
+            # Loading the dictionary is expensive, primed compressors are
+            # copied for each value instead. Raw deflate streams save the
+            # zlib header and checksum.
+            self._zlib_compressor = zlib.compressobj(
+                level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+
+    def _zstd_compressor(self):
+        compressor = getattr(self._local, 'compressor', None)
+        if compressor is None:
+            dictionary = self.dictionaries[self.dictionary_id]
+            level = 3 if self.level is None else self.level
+            compressor = self._local.compressor = zstandard.ZstdCompressor(
+                level=level, dict_data=dictionary, write_dict_id=False)
+        return compressor
+
+    def _zstd_decompressor(self, dictionary_id):
+        decompressors = getattr(self._local, 'decompressors', None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dictionary_id)
+        if decompressor is None:
+            decompressor = decompressors[dictionary_id] = (
+                zstandard.ZstdDecompressor(
+                    dict_data=self.dictionaries[dictionary_id]))
+        return decompressor
+
+    def encode(self, key, data):
+        if self._zlib_compressor is not None:
+            compressor = self._zlib_compressor.copy()
+            compressed = compressor.compress(data) + compressor.flush()
+        else:
+            compressed = self._zstd_compressor().compress(data)
+        if len(compressed) + _DICTIONARY_ID.size >= len(data):
+            return None
+        return self._header + compressed
+
+    def decode(self, key, data):
+        dictionary_id, = _DICTIONARY_ID.unpack_from(data)
+        dictionary = self.dictionaries[dictionary_id]
+        data = data[_DICTIONARY_ID.size:]
+        if isinstance(dictionary, six.binary_type):
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS,
+                                              zdict=dictionary)
+            return decompressor.decompress(data) + decompressor.flush()
+        return self._zstd_decompressor(dictionary_id).decompress(data)
+
+
+# ndim, order, length of the dtype, followed by the dtype, the shape and
+# padding up to a multiple of _ARRAY_ALIGNMENT
+_ARRAY_HEADER = struct.Struct('>BcB')
+_ARRAY_ALIGNMENT = 16
+_ARRAY_KINDS = 'biufcmMSU'
+
+
+def _array_offset(ndim, dtype_size):
+    size = _ARRAY_HEADER.size + dtype_size + 8 * ndim
+    return (size + _ARRAY_ALIGNMENT - 1) // _ARRAY_ALIGNMENT * _ARRAY_ALIGNMENT
+
+
+def _encode_array(value):
+    """Encode a NumPy array, or return None if its dtype isn't supported."""
+    if value.dtype.kind not in _ARRAY_KINDS or value.ndim > 255:
+        return None
+    if value.flags.c_contiguous or not value.flags.f_contiguous:
+        order = 'C'
+    else:
+        order = 'F'
+    dtype = value.dtype.str.encode('ascii')
+    header = b''.join([
+        _ARRAY_HEADER.pack(value.ndim, order.encode('ascii'), len(dtype)),
+        dtype,
+        struct.pack('>%dQ' % value.ndim, *value.shape)])
+    padding = _array_offset(value.ndim, len(dtype)) - len(header)
+    return b''.join([header, b'\0' * padding, value.tobytes(order)])
+
+
+def _decode_array(value):
+    ndim, order, dtype_size = _ARRAY_HEADER.unpack_from(value)
+    offset = _ARRAY_HEADER.size
+    dtype = numpy.dtype(bytes(value[offset:offset + dtype_size]).decode(
+        'ascii'))
+    shape = struct.unpack_from('>%dQ' % ndim, value, offset + dtype_size)
+    count = 1
+    for size in shape:
+        count *= size
+    array = numpy.frombuffer(value, dtype, count,
+                             _array_offset(ndim, dtype_size))
+    return array.reshape(shape, order=order.decode('ascii'))
+
+
+def numpy_serializer(key, value):
+    """
+    A serializer storing NumPy arrays as a small header (dtype, shape and
+    memory order) followed by their data, instead of pickling them.
+
+    Arrays of objects, of structured dtypes and subclasses of
+    ``numpy.ndarray`` are pickled, and other values are serialized as with
+    :py:func:`python_memcache_serializer`. Without NumPy, this is
+    :py:func:`python_memcache_serializer`.
+    """
+    if numpy is not None and type(value) is numpy.ndarray:
+        encoded = _encode_array(value)
+        if encoded is not None:
+            return encoded, FLAG_NUMPY
+    return python_memcache_serializer(key, value)
+
+
+def numpy_deserializer(key, value, flags):
+    """
+    The deserializer of :py:func:`numpy_serializer`. Arrays are built with
+    ``numpy.frombuffer`` over the received value without copying it, and
+    are therefore read-only.
+    """
+    if flags != FLAG_NUMPY:
+        return python_memcache_deserializer(key, value, flags)
+    try:
+        if numpy is None:
+            raise ImportError('numpy is not installed')
+        return _decode_array(value)
+    except Exception:
+        logging.info('NumPy array decoding error', exc_info=True)
+        return None
@@ -0,0 +1,20 @@
+"""
+Mocks shared by the unit tests. Unlike ``utils``, this module is not part of
+the public API.
+"""
+
+import mock
+
+from pymemcache.test.utils import MockMemcacheClient
+
+
+def spy_client(*methods, **kwargs):
+    """
+    Return a :py:class:`MockMemcacheClient` whose ``methods`` are wrapped in
+    ``mock.Mock`` objects recording their calls, to check the requests sent
+    by the clients wrapping it.
+    """
+    client = MockMemcacheClient(**kwargs)
+    for name in methods:
+        setattr(client, name, mock.Mock(wraps=getattr(client, name)))
+    return client
@@ -1,3 +1,4 @@
+import mock
 import pytest
 import socket
 
@@ -19,6 +20,18 @@ def pytest_addoption(parser):
                      help='number of keys to use for multi benchmarks')
 
 
+@pytest.fixture
+def clock(request):
+    """
+    Freeze the time at 1000 seconds in the module named by the ``CLOCK``
+    attribute of the test module, by patching its ``time`` module. Yields
+    the mock of the ``time`` module.
+    """
+    with mock.patch(request.module.CLOCK + '.time') as time_mock:
+        time_mock.time.return_value = 1000.0
+        yield time_mock
+
+
 @pytest.fixture(scope='session')
 def host(request):
     return request.config.option.server
@@ -0,0 +1,91 @@
+import threading
+
+import mock
+import pytest
+
+from pymemcache.batching import BatchingClient
+from pymemcache.test._mocks import spy_client
+
+
+def make_client(**kwargs):
+    backend = spy_client('get_many')
+    backend.set_many({b'key1': b'value1', b'key2': b'value2'})
+    return BatchingClient(backend, **kwargs), backend
+
+
+@pytest.mark.unit()
+def test_load_sends_one_get_many():
+    client, backend = make_client(max_delay=0)
+    futures = [client.load(key) for key in [b'key1', b'key2', b'key3']]
+    assert not any(future.done() for future in futures)
+
+    assert [future.result() for future in futures] == [
+        b'value1', b'value2', None]
+    assert backend.get_many.call_count == 1
+    assert sorted(backend.get_many.call_args[0][0]) == [
+        b'key1', b'key2', b'key3']
+
+
+@pytest.mark.unit()
+def test_duplicate_keys_are_fetched_once():
+    client, backend = make_client(max_delay=0)
+    futures = client.load_many([b'key1', b'key1'])
+    assert futures[1].result() == b'value1'
+    assert futures[0].result() == b'value1'
+    backend.get_many.assert_called_once_with([b'key1'])
+
+
+@pytest.mark.unit()
+def test_max_batch_size():
+    client, backend = make_client(max_delay=0, max_batch_size=2)
+    futures = client.load_many([b'key1', b'key2', b'key3'])
+    assert futures[0].done()
+    assert futures[1].done()
+    assert not futures[2].done()
+    assert futures[2].result() is None
+    assert backend.get_many.call_count == 2
+
+
+@pytest.mark.unit()
+def test_get_and_get_many():
+    client, backend = make_client(max_delay=0)
+    assert client.get(b'key1') == b'value1'
+    assert client.get(b'key3', b'default') == b'default'
+    assert client.get_many([b'key1', b'key3']) == {b'key1': b'value1'}
+
+
+@pytest.mark.unit()
+def test_exception_is_shared():
+    client, backend = make_client(max_delay=0)
+    backend.get_many = mock.Mock(side_effect=ValueError)
+    futures = client.load_many([b'key1', b'key2'])
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result()
+
+
+@pytest.mark.unit()
+def test_gets_from_threads_are_batched():
+    client, backend = make_client(max_delay=5, max_batch_size=4)
+    results = {}
+
+    def worker(key):
+        results[key] = client.get(key)
+
+    keys = [b'key1', b'key2', b'key3', b'key4']
+    workers = [threading.Thread(target=worker, args=(key,)) for key in keys]
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+
+    assert results == {b'key1': b'value1', b'key2': b'value2',
+                       b'key3': None, b'key4': None}
+    assert backend.get_many.call_count == 1
+
+
+@pytest.mark.unit()
+def test_other_methods_are_forwarded():
+    client, backend = make_client()
+    assert client.set(b'key', b'value') is True
+    assert client.delete(b'key') is True
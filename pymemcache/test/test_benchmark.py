@@ -13,9 +13,12 @@
 # limitations under the License.
 
 import six
+import threading
 import time
 import pytest
 
+from pymemcache import pool
+
 try:
     import pylibmc
     HAS_PYLIBMC = True
@@ -110,3 +113,30 @@ def test_bench_delete(request, client, pairs, count):
 def test_bench_delete_multi(request, client, pairs, count):
     # deleting missing key takes the same work client-side as real keys
     benchmark(count, client.delete_multi, list(pairs))
+
+
+@pytest.mark.benchmark()
+@pytest.mark.parametrize("pool_class", [
+    pool.ObjectPool,
+    pool.LockFreeObjectPool,
+])
+@pytest.mark.parametrize("threads", [8, 16, 32, 64])
+def test_bench_pool_get_and_release(request, pool_class, threads, count):
+    obj_pool = pool_class(object)
+    per_thread = max(count // threads, 1)
+
+    def worker():
+        for _ in range(per_thread):
+            with obj_pool.get_and_release():
+                pass
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.time()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    duration = time.time() - start
+    print(str(duration))
+
+    assert len(obj_pool.used) == 0
@@ -0,0 +1,142 @@
+import mock
+import pytest
+
+from pymemcache import serde
+from pymemcache.chunking import ChunkingClient
+from pymemcache.test._mocks import spy_client
+from pymemcache.test.utils import MockMemcacheClient
+
+
+def make_client(chunk_size=32):
+    client = spy_client('get_many', 'set_many')
+    return ChunkingClient(client,
+                          serializer=serde.python_memcache_serializer,
+                          deserializer=serde.python_memcache_deserializer,
+                          chunk_size=chunk_size)
+
+
+def chunk_keys(client, key=b'key'):
+    return sorted(k for k in client.client._contents
+                  if k.startswith(key + b':'))
+
+
+@pytest.mark.unit()
+def test_small_value():
+    client = make_client()
+    assert client.set(b'key', u'value') is True
+    assert client.get(b'key') == u'value'
+    assert chunk_keys(client) == []
+    assert not client.client.get_many.called
+
+
+@pytest.mark.unit()
+def test_large_value():
+    client = make_client()
+    value = b'0123456789' * 10
+    assert client.set(b'key', value, expire=60) is True
+    assert len(chunk_keys(client)) == 4
+    assert client.client.set_many.call_args[1]['expire'] == 60
+
+    assert client.get(b'key') == value
+    client.client.get_many.assert_called_once_with(
+        chunk_keys(client))
+    assert client[b'key'] == value
+
+
+@pytest.mark.unit()
+def test_large_pickled_value():
+    client = make_client()
+    value = {'data': list(range(100))}
+    client.set(b'key', value)
+    assert client.get(b'key') == value
+
+
+@pytest.mark.unit()
+def test_missing_chunk():
+    client = make_client()
+    client.set(b'key', b'x' * 100)
+    client.client.delete(chunk_keys(client)[1])
+    assert client.get(b'key') is None
+    assert client.get(b'key', b'default') == b'default'
+    assert client.get_many([b'key']) == {}
+
+
+@pytest.mark.unit()
+def test_corrupted_chunk():
+    client = make_client()
+    client.set(b'key', b'x' * 100)
+    client.client.set(chunk_keys(client)[1], b'y' * 32)
+    assert client.get(b'key') is None
+
+
+@pytest.mark.unit()
+def test_overwrite_uses_new_chunks():
+    client = make_client()
+    client.set(b'key', b'x' * 100)
+    old_chunks = chunk_keys(client)
+    client.set(b'key', b'y' * 100)
+    assert client.get(b'key') == b'y' * 100
+    assert set(old_chunks).isdisjoint(
+        client.client.get_many.call_args[0][0])
+
+
+@pytest.mark.unit()
+def test_invalid_item():
+    client = make_client()
+    client.client.set(b'key', b'\xffgarbage')
+    client.client.set(b'empty', b'')
+    assert client.get(b'key') is None
+    assert client.get_many([b'key', b'empty']) == {}
+
+
+@pytest.mark.unit()
+def test_set_many_get_many():
+    client = make_client()
+    values = {b'a': b'small', b'b': b'b' * 100, b'c': b'c' * 70}
+    assert client.set_many(values) == []
+    client.client.get_many.reset_mock()
+
+    assert client.get_many([b'a', b'b', b'c', b'd']) == values
+    # One request for the items, one for all the chunks
+    assert client.client.get_many.call_count == 2
+
+
+@pytest.mark.unit()
+def test_set_many_failed_chunks():
+    client = make_client()
+    client.client.set_many = mock.Mock(
+        side_effect=lambda values, **kwargs: [
+            key for key in values if key.startswith(b'b:')][:1])
+    failed = client.set_many({b'a': b'small', b'b': b'b' * 100})
+    assert failed == [b'b']
+    assert set(client.client.set_many.call_args[0][0]) == set([b'a'])
+
+
+@pytest.mark.unit()
+def test_set_failed_chunks():
+    client = make_client()
+    client.client.set_many = mock.Mock(return_value=[b'key:0'])
+    assert client.set(b'key', b'x' * 100) is False
+    assert client.get(b'key') is None
+
+
+@pytest.mark.unit()
+def test_add():
+    client = make_client()
+    assert client.add(b'key', b'x' * 100) is True
+    assert client.add(b'key', b'y' * 100) is False
+    assert client.get(b'key') == b'x' * 100
+
+
+@pytest.mark.unit()
+def test_delete():
+    client = make_client()
+    client.set(b'key', b'x' * 100)
+    client.delete(b'key', noreply=False)
+    assert client.get(b'key') is None
+
+
+@pytest.mark.unit()
+def test_chunk_size():
+    with pytest.raises(ValueError):
+        ChunkingClient(MockMemcacheClient(), chunk_size=10)
@@ -0,0 +1,113 @@
+from pymemcache.client.circuit_breaker import CircuitBreaker
+import mock
+import pytest
+
+
+@pytest.fixture
+def clock():
+    with mock.patch('pymemcache.client.circuit_breaker.time') as time_mock:
+        time_mock.time.return_value = 1000.0
+        yield time_mock.time
+
+
+@pytest.mark.unit()
+def test_closed_allows_requests(clock):
+    breaker = CircuitBreaker()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.unit()
+def test_failure_opens(clock):
+    breaker = CircuitBreaker(retry_timeout=1)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.return_value += 1
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+@pytest.mark.unit()
+def test_available_has_no_side_effect(clock):
+    breaker = CircuitBreaker(retry_timeout=1)
+    assert breaker.available()
+    breaker.record_failure()
+    assert not breaker.available()
+
+    clock.return_value += 1
+    assert breaker.available()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.mark.unit()
+def test_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker(retry_timeout=1)
+    breaker.record_failure()
+    clock.return_value += 1
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+@pytest.mark.unit()
+def test_failed_probe_backs_off(clock):
+    breaker = CircuitBreaker(retry_timeout=1, backoff_factor=2,
+                             max_retry_timeout=3)
+    breaker.record_failure()
+
+    for retries, delay in [(1, 2), (2, 3), (3, 3)]:
+        clock.return_value = breaker.retry_at
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.retries == retries
+        assert breaker.retry_at == clock.return_value + delay
+
+
+@pytest.mark.unit()
+def test_failure_threshold_window(clock):
+    breaker = CircuitBreaker(failure_threshold=2, window=10)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    clock.return_value += 11
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    clock.return_value += 1
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.mark.unit()
+def test_success_forgets_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.unit()
+def test_trip_and_reset(clock):
+    breaker = CircuitBreaker()
+    breaker.trip(60)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_at == 1060
+
+    breaker.reset()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+@pytest.mark.unit()
+def test_invalid_threshold():
+    with pytest.raises(ValueError):
+        CircuitBreaker(failure_threshold=0)
@@ -25,7 +25,7 @@ import socket
 import unittest
 import pytest
 
-from pymemcache.client.base import PooledClient, Client
+from pymemcache.client.base import PooledClient, Client, LazyValues
 from pymemcache.exceptions import (
     MemcacheClientError,
     MemcacheServerError,
@@ -35,6 +35,8 @@ from pymemcache.exceptions import (
 )
 
 from pymemcache import pool
+from pymemcache.hotkeys import HotKeySampler
+from pymemcache.negativecache import NegativeCache
 from pymemcache.test.utils import MockMemcacheClient
 
 
@@ -553,6 +555,171 @@ class TestClient(ClientTestMixin, unittest.TestCase):
             b'set key 0 0 10 noreply\r\n{"c": "d"}\r\n'
         ]
 
+    def test_batch_serialization(self):
+        class Serde(object):
+            def __init__(self):
+                self.batches = []
+
+            def serialize(self, key, value):
+                return value.upper(), 1
+
+            def deserialize(self, key, value, flags):
+                return value.lower()
+
+            def serialize_many(self, items):
+                self.batches.append([key for key, _ in items])
+                return [(value.upper(), 1) for _, value in items]
+
+            def deserialize_many(self, items):
+                self.batches.append([key for key, _, _ in items])
+                return [(value.lower(), flags) for _, value, flags in items]
+
+        serde = Serde()
+        client = self.make_client([
+            b'STORED\r\nSTORED\r\n',
+            b'VALUE key1 1 6\r\nVALUE1\r\n'
+            b'VALUE key2 1 6\r\nVALUE2\r\nEND\r\n',
+            b'VALUE key1 1 6 11\r\nVALUE1\r\nEND\r\n',
+            b'VALUE key1 1 6\r\nVALUE1\r\nEND\r\n',
+        ], serializer=serde.serialize, deserializer=serde.deserialize)
+        assert client.set_many(collections.OrderedDict([
+            (b'key1', b'value1'), (b'key2', b'value2')]), noreply=False) == []
+        assert client.sock.send_bufs[0] == (
+            b'set key1 1 0 6\r\nVALUE1\r\nset key2 1 0 6\r\nVALUE2\r\n')
+        assert client.get_many([b'key1', b'key2', b'key3']) == {
+            b'key1': (b'value1', 1), b'key2': (b'value2', 1)}
+        assert client.gets_many([b'key1', b'key2']) == {
+            b'key1': ((b'value1', 1), b'11')}
+        # Single values use the regular deserializer
+        assert client.get(b'key1') == b'value1'
+        assert serde.batches == [[b'key1', b'key2'], [b'key1', b'key2'],
+                                 [b'key1']]
+
+    def test_deserialize_executor(self):
+        class Future(object):
+            def __init__(self, value):
+                self.value = value
+
+            def result(self):
+                return self.value
+
+        class Executor(object):
+            def __init__(self):
+                self.submitted = []
+
+            def submit(self, func, *args):
+                self.submitted.append(args[0])
+                return Future(func(*args))
+
+        def _deserializer(key, value, flags):
+            return value.upper()
+
+        executor = Executor()
+        client = self.make_client([
+            b'VALUE key1 0 6\r\nvalue1\r\nEND\r\n',
+            b'VALUE key1 0 6\r\nvalue1\r\nVALUE key2 0 6\r\nvalue2\r\n'
+            b'VALUE key3 0 6\r\nvalue3\r\nEND\r\n',
+            b'VALUE key1 0 6 11\r\nvalue1\r\n'
+            b'VALUE key2 0 6 12\r\nvalue2\r\nEND\r\n',
+        ], deserializer=_deserializer, deserialize_executor=executor,
+            deserialize_executor_min_size=10)
+
+        # Small responses are deserialized inline
+        assert client.get_many([b'key1']) == {b'key1': b'VALUE1'}
+        assert executor.submitted == []
+
+        assert client.get_many([b'key1', b'key2', b'key3']) == {
+            b'key1': b'VALUE1', b'key2': b'VALUE2', b'key3': b'VALUE3'}
+        assert executor.submitted == [b'key1', b'key2', b'key3']
+
+        assert client.gets_many([b'key1', b'key2']) == {
+            b'key1': (b'VALUE1', b'11'), b'key2': (b'VALUE2', b'12')}
+
+    def test_deserialize_executor_error(self):
+        class Future(object):
+            def result(self):
+                raise ValueError('deserialization failed')
+
+        class Executor(object):
+            def submit(self, func, *args):
+                return Future()
+
+        client = self.make_client([
+            b'VALUE key1 0 6\r\nvalue1\r\nEND\r\n',
+        ], deserializer=lambda key, value, flags: value,
+            deserialize_executor=Executor(), deserialize_executor_min_size=0)
+        with pytest.raises(ValueError):
+            client.get_many([b'key1'])
+        assert client.sock is None
+
+    def test_lazy_deserialize(self):
+        deserialized = []
+
+        def _deserializer(key, value, flags):
+            deserialized.append(key)
+            return value.upper()
+
+        client = self.make_client([
+            b'VALUE key1 0 6\r\nvalue1\r\nVALUE key2 0 6\r\nvalue2\r\n'
+            b'END\r\n',
+            b'VALUE key1 0 6 11\r\nvalue1\r\nEND\r\n',
+        ], deserializer=_deserializer, lazy_deserialize=True,
+            negative_cache=NegativeCache())
+        result = client.get_many([b'key1', b'key2', b'key3'])
+        assert isinstance(result, LazyValues)
+        assert len(result) == 2
+        assert b'key1' in result
+        assert b'key3' not in result
+        assert deserialized == []
+
+        assert result[b'key2'] == b'VALUE2'
+        assert result[b'key2'] == b'VALUE2'
+        assert deserialized == [b'key2']
+        assert result == {b'key1': b'VALUE1', b'key2': b'VALUE2'}
+        assert deserialized == [b'key2', b'key1']
+
+        # gets_many values are always deserialized
+        assert client.gets_many([b'key1']) == {b'key1': (b'VALUE1', b'11')}
+
+    def test_hot_key_sampler(self):
+        sampler = HotKeySampler()
+        client = self.make_client([
+            b'VALUE key1 0 6\r\nvalue1\r\nEND\r\n',
+            b'VALUE key1 0 6\r\nvalue1\r\nEND\r\n',
+            b'END\r\n',
+        ], hot_key_sampler=sampler)
+        client.get(b'key1')
+        client.get_many([b'key1', b'key2'])
+        client.gets(b'key1')
+
+        assert sampler.hot_keys() == [(b'key1', 3), (b'key2', 1)]
+
+    def test_negative_cache(self):
+        negative_cache = NegativeCache()
+        client = self.make_client([
+            b'VALUE key1 0 6\r\nvalue1\r\nEND\r\n',
+            b'VALUE key1 0 6\r\nvalue1\r\nEND\r\n',
+            b'STORED\r\n',
+            b'VALUE key2 0 6\r\nvalue2\r\nEND\r\n',
+        ], negative_cache=negative_cache)
+        assert client.get_many([b'key1', b'key2']) == {b'key1': b'value1'}
+        assert b'key2' in negative_cache
+
+        assert client.get(b'key2') is None
+        assert client.get_many([b'key1', b'key2']) == {b'key1': b'value1'}
+        assert client.sock.send_bufs[-1] == b'get key1\r\n'
+
+        client.set(b'key2', b'value2', noreply=False)
+        assert b'key2' not in negative_cache
+        assert client.get(b'key2') == b'value2'
+
+    def test_negative_cache_error(self):
+        negative_cache = NegativeCache()
+        client = self.make_client([b'ERROR\r\n'], ignore_exc=True,
+                                  negative_cache=negative_cache)
+        assert client.get_many([b'key1']) == {}
+        assert len(negative_cache) == 0
+
     def test_set_socket_handling(self):
         client = self.make_client([b'STORED\r\n'])
         result = client.set(b'key', b'value', noreply=False)
@@ -856,6 +1023,39 @@ class TestClient(ClientTestMixin, unittest.TestCase):
             client.version()
 
 
+@pytest.mark.unit()
+class TestLazyValues(unittest.TestCase):
+    def setUp(self):
+        self.values = LazyValues()
+        self.values.add_raw(b'key1', lambda key, value, flags: int(value),
+                            b'1', 0)
+        self.values[b'key2'] = 2
+
+    def test_mapping(self):
+        assert dict(self.values) == {b'key1': 1, b'key2': 2}
+        self.values.add_raw(b'key2', lambda key, value, flags: -1, b'', 0)
+        assert self.values[b'key2'] == -1
+        del self.values[b'key1']
+        del self.values[b'key2']
+        assert len(self.values) == 0
+        with pytest.raises(KeyError):
+            del self.values[b'key1']
+        with pytest.raises(KeyError):
+            self.values[b'key1']
+
+    def test_update(self):
+        def _fail(key, value, flags):
+            raise AssertionError('deserialized')
+
+        other = LazyValues()
+        other.add_raw(b'key3', _fail, b'3', 0)
+        self.values.update(other)
+        self.values.update({b'key4': 4})
+        assert sorted(self.values) == [b'key1', b'key2', b'key3', b'key4']
+        with pytest.raises(AssertionError):
+            self.values[b'key3']
+
+
 @pytest.mark.unit()
 class TestClientSocketConnect(unittest.TestCase):
     def test_socket_connect(self):
@@ -1,6 +1,13 @@
-from pymemcache.client.hash import HashClient
-from pymemcache.client.base import Client, PooledClient
+from pymemcache.client.hash import (
+    HashClient,
+    ClientGroup,
+    RoundRobinSelector,
+    least_outstanding_selector
+)
+from pymemcache.client.base import Client, LazyValues, PooledClient
+from pymemcache.client.circuit_breaker import CircuitBreaker
 from pymemcache.exceptions import MemcacheError, MemcacheUnknownError
+from pymemcache.negativecache import NegativeCache
 from pymemcache import pool
 
 from .test_client import ClientTestMixin, MockSocket
@@ -8,6 +15,7 @@ import unittest
 import pytest
 import mock
 import socket
+import threading
 
 
 class TestHashClient(ClientTestMixin, unittest.TestCase):
@@ -85,6 +93,32 @@ class TestHashClient(ClientTestMixin, unittest.TestCase):
 
         assert result == {b'key1': b'value1'}
 
+    def test_get_many_lazy_deserialize(self):
+        deserialized = []
+
+        def _deserializer(key, value, flags):
+            deserialized.append(key)
+            return value.upper()
+
+        client = self.make_client(*[
+            [b'VALUE key3 0 6\r\nvalue3\r\nEND\r\n', ],
+            [b'VALUE key1 0 6\r\nvalue1\r\nEND\r\n', ],
+        ], deserializer=_deserializer, lazy_deserialize=True)
+
+        def get_clients(key):
+            if key == b'key3':
+                return client.clients['127.0.0.1:11012']
+            else:
+                return client.clients['127.0.0.1:11013']
+
+        client._get_client = get_clients
+        result = client.get_many([b'key1', b'key3'])
+        assert isinstance(result, LazyValues)
+        assert sorted(result) == [b'key1', b'key3']
+        assert deserialized == []
+        assert result[b'key3'] == b'VALUE3'
+        assert deserialized == [b'key3']
+
     def test_get_many_bad_server_data(self):
         client = self.make_client(*[
             [b'STORED\r\n', b'VAXLUE key3 0 6\r\nvalue2\r\nEND\r\n', ],
@@ -213,6 +247,14 @@ class TestHashClient(ClientTestMixin, unittest.TestCase):
         result = client.get_many(['foo', 'bar'])
         assert result == {'foo': False, 'bar': False}
 
+    def test_no_servers_left_with_get_default(self):
+        from pymemcache.client.hash import HashClient
+        for kwargs in ({'negative_cache': NegativeCache()}, {'replicas': 2}):
+            client = HashClient([], ignore_exc=True, **kwargs)
+            assert client.get('foo') is None
+            assert client.get('foo', 'default') == 'default'
+            assert client.get_many(['foo']) == {'foo': False}
+
     def test_ignore_exec_set_many(self):
         values = {
             'key1': 'value1',
@@ -253,4 +295,446 @@ class TestHashClient(ClientTestMixin, unittest.TestCase):
         result = client.set_many(values, noreply=True)
         assert result == []
 
+    def test_connections_per_server(self):
+        with mock.patch('pymemcache.client.hash.Client') as internal_client:
+            client = HashClient([], connections_per_server=3)
+            client.add_server('127.0.0.1', '11211')
+
+        assert internal_client.call_count == 3
+        group = client.clients['127.0.0.1:11211']
+        assert isinstance(group, ClientGroup)
+        assert group.server == ('127.0.0.1', '11211')
+        assert len(group.clients) == 3
+
+    def test_connections_per_server_invalid(self):
+        with pytest.raises(ValueError):
+            HashClient([], connections_per_server=0)
+        with pytest.raises(ValueError):
+            HashClient([], connection_selector='random')
+        with pytest.raises(ValueError):
+            HashClient([], connections_per_server=2, use_pooling=True)
+
+    def test_client_group_round_robin(self):
+        clients = [mock.Mock(), mock.Mock()]
+        group = ClientGroup(('127.0.0.1', 11211), clients,
+                            RoundRobinSelector())
+        group.get(b'key1')
+        group.get(b'key2')
+        group.get(b'key3')
+
+        assert clients[0].get.call_args_list == [
+            mock.call(b'key1'), mock.call(b'key3')]
+        assert clients[1].get.call_args_list == [mock.call(b'key2')]
+        assert group.outstanding == [0, 0]
+
+    def test_client_group_least_outstanding(self):
+        clients = [mock.Mock(), mock.Mock()]
+        group = ClientGroup(('127.0.0.1', 11211), clients,
+                            least_outstanding_selector)
+        group.outstanding[0] = 1
+        group.get(b'key')
+
+        assert not clients[0].get.called
+        clients[1].get.assert_called_once_with(b'key')
+        assert group.outstanding == [1, 0]
+
+    def test_client_group_never_shares_a_client(self):
+        clients = [mock.Mock(), mock.Mock()]
+        group = ClientGroup(('127.0.0.1', 11211), clients,
+                            RoundRobinSelector())
+        group.outstanding[0] = 1
+        group.get(b'key1')
+        group.get(b'key2')
+        assert not clients[0].get.called
+        assert clients[1].get.call_count == 2
+
+    def test_client_group_waits_for_idle_client(self):
+        clients = [mock.Mock()]
+        group = ClientGroup(('127.0.0.1', 11211), clients,
+                            least_outstanding_selector)
+        index = group._acquire()
+        thread = threading.Thread(target=group.get, args=(b'key',))
+        thread.start()
+        thread.join(0.05)
+        assert thread.is_alive()
+        assert not clients[0].get.called
+
+        group._release(index)
+        thread.join()
+        clients[0].get.assert_called_once_with(b'key')
+        assert group.outstanding == [0]
+
+    def test_client_group_error_releases_connection(self):
+        clients = [mock.Mock()]
+        clients[0].get.side_effect = socket.error
+        group = ClientGroup(('127.0.0.1', 11211), clients,
+                            least_outstanding_selector)
+        with pytest.raises(socket.error):
+            group.get(b'key')
+        assert group.outstanding == [0]
+
+    def test_client_group_close(self):
+        clients = [mock.Mock(), mock.Mock()]
+        group = ClientGroup(('127.0.0.1', 11211), clients,
+                            least_outstanding_selector)
+        group.close()
+        assert clients[0].close.called
+        assert clients[1].close.called
+
+    def test_get_with_connections_per_server(self):
+        client = HashClient([], connections_per_server=2)
+        sockets = [
+            MockSocket([b'VALUE key1 0 6\r\nvalue1\r\nEND\r\n']),
+            MockSocket([b'VALUE key1 0 6\r\nvalue2\r\nEND\r\n']),
+        ]
+        clients = []
+        for sock in sockets:
+            mock_client = Client(('127.0.0.1', 11211))
+            mock_client.sock = sock
+            clients.append(mock_client)
+        client.clients['127.0.0.1:11211'] = ClientGroup(
+            ('127.0.0.1', 11211), clients, RoundRobinSelector())
+        client.hasher.add_node('127.0.0.1:11211')
+
+        assert client.get(b'key1') == b'value1'
+        assert client.get(b'key1') == b'value2'
+
+    def test_check_servers_recovers_failed_server(self):
+        client = HashClient([('127.0.0.1', 11211)])
+        client._mark_failed_server(('127.0.0.1', 11211))
+        breaker = client._breakers[('127.0.0.1', 11211)]
+        assert breaker.state == CircuitBreaker.OPEN
+        client._probe_server = mock.Mock(return_value=True)
+
+        assert client.check_servers() == [('127.0.0.1', 11211)]
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_check_servers_recovers_dead_server(self):
+        client = HashClient([('127.0.0.1', 11211)], retry_attempts=0)
+        client._mark_failed_server(('127.0.0.1', 11211))
+        assert client.hasher.get_node('foo') is None
+
+        client._probe_server = mock.Mock(return_value=False)
+        assert client.check_servers() == []
+        assert ('127.0.0.1', 11211) in client._dead_servers
+
+        client._probe_server = mock.Mock(return_value=True)
+        assert client.check_servers() == [('127.0.0.1', 11211)]
+        assert client._dead_servers == set()
+        assert client.hasher.get_node('foo') == '127.0.0.1:11211'
+
+    def test_probe_server(self):
+        with mock.patch('pymemcache.client.hash.Client') as internal_client:
+            client = HashClient([], timeout=1, connect_timeout=2)
+            assert client._probe_server(('127.0.0.1', 11211)) is True
+            internal_client.return_value.version.side_effect = socket.error
+            assert client._probe_server(('127.0.0.1', 11211)) is False
+
+        kwargs = internal_client.call_args[1]
+        assert kwargs['timeout'] == 1
+        assert kwargs['connect_timeout'] == 2
+        assert internal_client.return_value.close.call_count == 2
+
+    def test_health_check_thread(self):
+        client = HashClient([], health_check_interval=0.01)
+        checked = threading.Event()
+        client.check_servers = mock.Mock(side_effect=checked.set)
+        try:
+            assert checked.wait(5)
+        finally:
+            client.close()
+        assert client._health_check_thread is None
+
+    def _make_failing_client(self, **kwargs):
+        client = HashClient([], **kwargs)
+        client.add_server('127.0.0.1', 11211)
+        internal = mock.Mock()
+        internal.server = ('127.0.0.1', 11211)
+        internal.get.side_effect = socket.error
+        client.clients['127.0.0.1:11211'] = internal
+        return client, internal
+
+    def test_failed_server_is_not_retried_before_retry_timeout(self):
+        client, internal = self._make_failing_client(
+            ignore_exc=True, retry_timeout=60)
+        assert client.get(b'foo') is None
+        assert client.get(b'foo') is None
+        assert internal.get.call_count == 1
+
+    def test_failed_server_is_retried_then_marked_dead(self):
+        client, internal = self._make_failing_client(
+            ignore_exc=True, retry_attempts=2, retry_timeout=0,
+            dead_timeout=60)
+        breaker = client._breakers[('127.0.0.1', 11211)]
+
+        for retries in range(2):
+            assert client.get(b'foo') is None
+            assert breaker.retries == retries
+            assert ('127.0.0.1', 11211) not in client._dead_servers
+
+        assert client.get(b'foo') is None
+        assert ('127.0.0.1', 11211) in client._dead_servers
+        assert internal.get.call_count == 3
+
+        # The server is no longer part of the hash ring
+        assert client.get(b'foo') is None
+        assert internal.get.call_count == 3
+
+    def test_failed_server_recovers(self):
+        client, internal = self._make_failing_client(
+            ignore_exc=True, retry_timeout=0)
+        assert client.get(b'foo') is None
+
+        internal.get.side_effect = None
+        internal.get.return_value = b'bar'
+        assert client.get(b'foo') == b'bar'
+        breaker = client._breakers[('127.0.0.1', 11211)]
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_dead_server_is_brought_back(self):
+        client, internal = self._make_failing_client(
+            ignore_exc=True, retry_attempts=0, dead_timeout=0)
+        assert client.get(b'foo') is None
+        assert ('127.0.0.1', 11211) in client._dead_servers
+
+        internal.get.side_effect = None
+        internal.get.return_value = b'bar'
+        assert client.get(b'foo') == b'bar'
+        assert client._dead_servers == set()
+
+    def test_failed_server_set_many(self):
+        client = HashClient([], ignore_exc=True, retry_timeout=60)
+        client.add_server('127.0.0.1', 11211)
+        internal = mock.Mock()
+        internal.server = ('127.0.0.1', 11211)
+        internal.set.side_effect = socket.error
+        client.clients['127.0.0.1:11211'] = internal
+
+        assert client.set_many({b'foo': b'bar'}) == [b'foo']
+        assert client.set_many({b'foo': b'bar'}) == [b'foo']
+        assert internal.set.call_count == 1
+
+    def test_failover_requires_ranked_hasher(self):
+        class Hasher(object):
+            pass
+
+        with pytest.raises(ValueError):
+            HashClient([], hasher=Hasher, failover=True)
+
+    def test_failover_to_next_ranked_server(self):
+        client = HashClient([], ignore_exc=True, retry_timeout=60,
+                            failover=True)
+        internals = {}
+        for port in (11211, 11212, 11213):
+            client.add_server('127.0.0.1', port)
+            internal = mock.Mock()
+            internal.server = ('127.0.0.1', port)
+            internal.get.return_value = port
+            internal.get_many.return_value = {b'foo': port}
+            internals[port] = internal
+            client.clients['127.0.0.1:%s' % port] = internal
+
+        ranked = client.hasher.get_nodes_ranked(b'foo', 3)
+        primary = int(ranked[0].split(':')[1])
+        secondary = int(ranked[1].split(':')[1])
+        assert client.get(b'foo') == primary
+
+        internals[primary].get.side_effect = socket.error
+        assert client.get(b'foo') is None
+        assert client.get(b'foo') == secondary
+        assert client.get_many([b'foo']) == {b'foo': secondary}
+        assert not internals[primary].get_many.called
+
+    def _make_replicated_client(self, **kwargs):
+        from pymemcache.test.utils import MockMemcacheClient
+
+        client = HashClient([], **kwargs)
+        for port in (11211, 11212, 11213):
+            client.add_server('127.0.0.1', port)
+            internal = MockMemcacheClient(('127.0.0.1', port))
+            client.clients['127.0.0.1:%s' % port] = internal
+        return client
+
+    def _replicas_of(self, client, key):
+        return [client.clients[node]
+                for node in client.hasher.get_nodes_ranked(key, 3)]
+
+    def test_replicas_invalid(self):
+        with pytest.raises(ValueError):
+            HashClient([], replicas=0)
+        with pytest.raises(ValueError):
+            HashClient([], replicas=2, replica_selector='fastest')
+
+    def test_replicated_set(self):
+        client = self._make_replicated_client(replicas=2)
+        assert client.set(b'key', b'value') is True
+
+        first, second, third = self._replicas_of(client, b'key')
+        assert first.get(b'key') == b'value'
+        assert second.get(b'key') == b'value'
+        assert third.get(b'key') is None
+
+        assert client.delete(b'key') is True
+        assert first.get(b'key') is None
+        assert second.get(b'key') is None
+
+    def test_replicated_set_many_delete_many(self):
+        client = self._make_replicated_client(replicas=2)
+        values = dict((('key%d' % i).encode('ascii'),
+                       ('value%d' % i).encode('ascii')) for i in range(10))
+        assert client.set_many(values) == []
+
+        for key, value in values.items():
+            first, second, third = self._replicas_of(client, key)
+            assert first.get(key) == value
+            assert second.get(key) == value
+            assert third.get(key) is None
+
+        client.delete_many(list(values))
+        for key in values:
+            for replica in self._replicas_of(client, key):
+                assert replica.get(key) is None
+
+    def test_replicated_get_falls_back_on_miss(self):
+        client = self._make_replicated_client(replicas=2)
+        first, second, third = self._replicas_of(client, b'key')
+        second.set(b'key', b'value')
+
+        for _ in range(10):
+            assert client.get(b'key') == b'value'
+            assert client.get_many([b'key']) == {b'key': b'value'}
+        assert client.get(b'other') is None
+        assert client.get(b'other', b'default') == b'default'
+
+    def test_replicated_get_falls_back_on_error(self):
+        client = self._make_replicated_client(
+            replicas=2, ignore_exc=True, retry_timeout=60)
+        first, second, third = self._replicas_of(client, b'key')
+        client.set(b'key', b'value')
+        first.get_many = mock.Mock(side_effect=socket.error)
+
+        for _ in range(10):
+            assert client.get(b'key') == b'value'
+            assert client.get_many([b'key']) == {b'key': b'value'}
+
+    def test_replicated_get_falls_back_on_error_without_ignore_exc(self):
+        client = self._make_replicated_client(replicas=2, retry_timeout=60)
+        first, second, third = self._replicas_of(client, b'key')
+        client.set(b'key', b'value')
+        first.get_many = mock.Mock(side_effect=socket.error)
+
+        for _ in range(10):
+            assert client.get(b'key') == b'value'
+            assert client.get_many([b'key']) == {b'key': b'value'}
+
+    def test_replicated_get_raises_when_every_replica_fails(self):
+        client = self._make_replicated_client(replicas=2, retry_timeout=60)
+        first, second, third = self._replicas_of(client, b'key')
+        first.get_many = mock.Mock(side_effect=socket.error)
+        second.get_many = mock.Mock(side_effect=socket.error)
+        with pytest.raises(socket.error):
+            client.get(b'key')
+
+        client = self._make_replicated_client(replicas=2, retry_timeout=60)
+        first, second, third = self._replicas_of(client, b'key')
+        first.get_many = mock.Mock(side_effect=socket.error)
+        second.get_many = mock.Mock(side_effect=socket.error)
+        with pytest.raises(socket.error):
+            client.get_many([b'key'])
+
+    def test_replicated_miss_and_error_is_a_miss(self):
+        client = self._make_replicated_client(replicas=2, retry_timeout=60)
+        first, second, third = self._replicas_of(client, b'key')
+        first.get_many = mock.Mock(side_effect=socket.error)
+        assert client.get(b'key') is None
+        assert client.get_many([b'key']) == {}
+
+    def test_replicated_add_reports_primary(self):
+        client = self._make_replicated_client(replicas=2)
+        first, second, third = self._replicas_of(client, b'key')
+        first.set(b'key', b'taken')
+        assert client.add(b'key', b'value', noreply=False) is False
+        assert first.get(b'key') == b'taken'
+
+        assert client.add(b'other', b'value', noreply=False) is True
+
+    def test_replicated_cas(self):
+        client = self._make_replicated_client(replicas=2)
+        client.set(b'key', b'v1')
+        value, cas = client.gets(b'key')
+        assert value == b'v1'
+        assert client.cas(b'key', b'v2', cas) is True
+
+        first, second, third = self._replicas_of(client, b'key')
+        assert first.get(b'key') == b'v2'
+        assert second.get(b'key') == b'v2'
+        assert third.get(b'key') is None
+        assert set(client.get(b'key') for _ in range(20)) == set([b'v2'])
+
+        # A refused cas leaves every replica unchanged
+        assert client.cas(b'key', b'v3', cas) is False
+        assert first.get(b'key') == b'v2'
+        assert second.get(b'key') == b'v2'
+
+    def test_replicated_negative_cache(self):
+        negative_cache = NegativeCache()
+        client = self._make_replicated_client(
+            replicas=2, negative_cache=negative_cache)
+        first, second, third = self._replicas_of(client, b'key')
+        first.get_many = mock.Mock(wraps=first.get_many)
+        second.get_many = mock.Mock(wraps=second.get_many)
+        second.set(b'key', b'value')
+
+        for _ in range(10):
+            assert client.get_many([b'key']) == {b'key': b'value'}
+            assert client.get(b'key') == b'value'
+        assert b'key' not in negative_cache
+
+        second.delete(b'key')
+        assert client.get(b'key') is None
+        assert b'key' in negative_cache
+        first.get_many.reset_mock()
+        second.get_many.reset_mock()
+        assert client.get_many([b'key']) == {}
+        assert not first.get_many.called
+        assert not second.get_many.called
+
+        client.set(b'key', b'value')
+        assert b'key' not in negative_cache
+        assert client.get(b'key') == b'value'
+
+    def test_replicated_negative_cache_error(self):
+        negative_cache = NegativeCache()
+        client = self._make_replicated_client(
+            replicas=2, negative_cache=negative_cache, ignore_exc=True,
+            retry_timeout=60)
+        first, second, third = self._replicas_of(client, b'key')
+        first.get_many = mock.Mock(side_effect=socket.error)
+        second.get_many = mock.Mock(side_effect=socket.error)
+        assert client.get_many([b'key']) == {}
+        assert b'key' not in negative_cache
+
+    def test_negative_cache_is_not_passed_to_clients(self):
+        with mock.patch('pymemcache.client.hash.Client') as internal_client:
+            client = HashClient([], negative_cache=NegativeCache())
+            client.add_server('127.0.0.1', '11211')
+        assert 'negative_cache' not in internal_client.call_args[1]
+
+    def test_replicated_least_outstanding(self):
+        client = self._make_replicated_client(
+            replicas=3, replica_selector='least_outstanding')
+        first, second, third = self._replicas_of(client, b'key')
+        client._outstanding[first.server] = 2
+        client._outstanding[second.server] = 1
+        assert client._get_read_clients(b'key') == [third, second, first]
+
+    def test_hot_key_sampler(self):
+        sampler = mock.Mock()
+        client = self._make_replicated_client(hot_key_sampler=sampler)
+        client.get(b'key1')
+        client.get_many([b'key1', b'key2'])
+
+        sampler.record.assert_called_once_with(b'key1')
+        sampler.record_many.assert_called_once_with([b'key1', b'key2'])
+
     # TODO: Test failover logic
@@ -0,0 +1,126 @@
+import sys
+import threading
+import time
+
+import mock
+import pytest
+
+from pymemcache.coalesce import CoalescingClient, _Call
+from pymemcache.test._mocks import spy_client
+
+
+def make_client():
+    backend = spy_client('get', 'get_many')
+    return CoalescingClient(backend), backend
+
+
+def resolve_later(call, result=None, exc_info=None):
+    def resolve():
+        time.sleep(0.05)
+        call.result = result
+        call.exc_info = exc_info
+        call.event.set()
+
+    thread = threading.Thread(target=resolve)
+    thread.start()
+    return thread
+
+
+@pytest.mark.unit()
+def test_get():
+    client, backend = make_client()
+    backend.set(b'key', b'value')
+    assert client.get(b'key') == b'value'
+    assert client.get(b'missing', b'default') == b'default'
+    assert client._calls == {}
+
+
+@pytest.mark.unit()
+def test_get_joins_request_in_flight():
+    client, backend = make_client()
+    call = client._calls[b'key'] = _Call()
+    thread = resolve_later(call, {b'key': b'shared'})
+
+    assert client.get(b'key') == b'shared'
+    assert not backend.get.called
+    thread.join()
+
+
+@pytest.mark.unit()
+def test_get_shares_exception():
+    client, backend = make_client()
+    call = client._calls[b'key'] = _Call()
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        thread = resolve_later(call, exc_info=sys.exc_info())
+
+    with pytest.raises(ValueError):
+        client.get(b'key')
+    thread.join()
+
+
+@pytest.mark.unit()
+def test_get_many_only_fetches_keys_not_in_flight():
+    client, backend = make_client()
+    backend.set_many({b'key1': b'value1', b'key2': b'value2'})
+    call = client._calls[b'key2'] = _Call()
+    thread = resolve_later(call, {b'key2': b'shared'})
+
+    result = client.get_many([b'key1', b'key2', b'key3'])
+    assert result == {b'key1': b'value1', b'key2': b'shared'}
+    backend.get_many.assert_called_once_with([b'key1', b'key3'])
+    assert list(client._calls) == [b'key2']
+    thread.join()
+
+
+@pytest.mark.unit()
+def test_concurrent_gets_send_one_request():
+    client, backend = make_client()
+    backend.set(b'key', b'value')
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_get(key):
+        started.set()
+        release.wait()
+        return b'value'
+
+    backend.get = mock.Mock(side_effect=slow_get)
+    # The threads which joined the request in flight
+    joined = []
+    wait = _Call.wait
+
+    def joining_wait(call):
+        joined.append(threading.current_thread())
+        return wait(call)
+
+    results = []
+
+    def worker():
+        results.append(client.get(b'key'))
+
+    workers = [threading.Thread(target=worker) for _ in range(8)]
+    with mock.patch.object(_Call, 'wait', joining_wait):
+        for worker_thread in workers:
+            worker_thread.start()
+        # Only release the request once every other thread joined it
+        started.wait(5)
+        deadline = time.time() + 5
+        while len(joined) < 7 and time.time() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for worker_thread in workers:
+            worker_thread.join()
+
+    assert results == [b'value'] * 8
+    assert backend.get.call_count == 1
+    assert client._calls == {}
+
+
+@pytest.mark.unit()
+def test_other_methods_are_forwarded():
+    client, backend = make_client()
+    assert client.set(b'key', b'value') is True
+    assert backend.get(b'key') == b'value'
+    assert client.delete(b'key') is True
@@ -0,0 +1,90 @@
+import mock
+import pytest
+
+from pymemcache.hotkeys import HotKeySampler
+
+
+CLOCK = 'pymemcache.hotkeys'
+
+
+@pytest.mark.unit()
+def test_estimate(clock):
+    sampler = HotKeySampler()
+    for _ in range(5):
+        sampler.record(b'key1')
+    sampler.record_many([b'key1', b'key2'])
+
+    assert sampler.estimate(b'key1') == 6
+    assert sampler.estimate(b'key2') == 1
+    assert sampler.estimate(b'key3') == 0
+
+
+@pytest.mark.unit()
+def test_hot_keys_bounded(clock):
+    sampler = HotKeySampler(top_k=3)
+    for i in range(20):
+        sampler.record_many([('key%d' % i).encode('ascii')] * (i + 1))
+
+    assert sampler.hot_keys() == [(b'key19', 20), (b'key18', 19),
+                                  (b'key17', 18)]
+    assert sampler.hot_keys(1) == [(b'key19', 20)]
+    assert len(sampler._heap) <= 4 * sampler.top_k
+
+
+@pytest.mark.unit()
+def test_sliding_window(clock):
+    sampler = HotKeySampler(window=10)
+    sampler.record_many([b'key'] * 3)
+
+    clock.time.return_value += 10
+    sampler.record(b'key')
+    assert sampler.estimate(b'key') == 4
+    assert sampler.hot_keys() == [(b'key', 4)]
+
+    clock.time.return_value += 10
+    sampler.record(b'key')
+    assert sampler.estimate(b'key') == 2
+
+    clock.time.return_value += 25
+    sampler.record(b'other')
+    assert sampler.estimate(b'key') == 0
+
+
+@pytest.mark.unit()
+def test_threshold_callback(clock):
+    callback = mock.Mock()
+    sampler = HotKeySampler(threshold=3, callback=callback, window=10)
+    sampler.record_many([b'key'] * 5)
+    callback.assert_called_once_with(b'key', 3)
+
+    clock.time.return_value += 10
+    sampler.record(b'key')
+    assert callback.call_count == 2
+
+
+@pytest.mark.unit()
+def test_sample_rate(clock):
+    with mock.patch('pymemcache.hotkeys.random') as random_mock:
+        random_mock.random.side_effect = [0.1, 0.9, 0.1, 0.9]
+        sampler = HotKeySampler(sample_rate=0.5)
+        sampler.record_many([b'key'] * 4)
+    assert sampler.estimate(b'key') == 4
+
+
+@pytest.mark.unit()
+def test_clear(clock):
+    sampler = HotKeySampler()
+    sampler.record(b'key')
+    sampler.clear()
+    assert sampler.estimate(b'key') == 0
+    assert sampler.hot_keys() == []
+
+
+@pytest.mark.unit()
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        HotKeySampler(width=0)
+    with pytest.raises(ValueError):
+        HotKeySampler(window=0)
+    with pytest.raises(ValueError):
+        HotKeySampler(sample_rate=0)
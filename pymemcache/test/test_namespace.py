@@ -0,0 +1,131 @@
+import pytest
+
+from pymemcache.exceptions import MemcacheIllegalInputError
+from pymemcache.namespace import Namespaces
+from pymemcache.test._mocks import spy_client
+
+
+CLOCK = 'pymemcache.namespace'
+
+
+def make_namespaces(**kwargs):
+    client = spy_client('get_many')
+    return Namespaces(client, **kwargs), client
+
+
+@pytest.mark.unit()
+def test_generation_created_from_time(clock):
+    namespaces, client = make_namespaces()
+    assert namespaces.generation(b'ns') == 1000
+    assert client.get(b'namespace:ns') == 1000
+    assert namespaces.prefix(b'ns') == b'ns:1000:'
+
+
+@pytest.mark.unit()
+def test_generation_existing(clock):
+    namespaces, client = make_namespaces()
+    client.set(b'namespace:ns', b'42')
+    assert namespaces.generation(b'ns') == 42
+    assert namespaces.generation(u'ns') == 42
+
+
+@pytest.mark.unit()
+def test_generation_cached(clock):
+    namespaces, client = make_namespaces(ttl=1)
+    namespaces.generation(b'ns')
+    namespaces.generation(b'ns')
+    assert client.get_many.call_count == 1
+
+    # Invalidations from other processes are seen once the ttl expired
+    client.incr(b'namespace:ns', 1)
+    assert namespaces.generation(b'ns') == 1000
+    clock.time.return_value += 1
+    assert namespaces.generation(b'ns') == 1001
+    assert client.get_many.call_count == 2
+
+
+@pytest.mark.unit()
+def test_generations_single_request(clock):
+    namespaces, client = make_namespaces()
+    client.set(b'namespace:a', 5)
+    namespaces.generation(b'b')
+    client.get_many.reset_mock()
+
+    result = namespaces.generations([b'a', b'b', b'c'])
+    assert result == {b'a': 5, b'b': 1000, b'c': 1000}
+    client.get_many.assert_called_once_with(
+        [b'namespace:a', b'namespace:c'])
+
+
+@pytest.mark.unit()
+def test_invalidate(clock):
+    namespaces, client = make_namespaces()
+    tenant = namespaces.namespaced_client(b'tenant')
+    tenant.set(b'key', b'value')
+    assert client.get(b'tenant:1000:key') == b'value'
+    assert tenant.get(b'key') == b'value'
+
+    assert namespaces.invalidate(b'tenant') == 1001
+    assert tenant.get(b'key') is None
+    tenant.set(b'key', b'other')
+    assert client.get(b'tenant:1001:key') == b'other'
+
+    assert tenant.invalidate() == 1002
+
+
+@pytest.mark.unit()
+def test_invalidate_evicted_generation(clock):
+    namespaces, client = make_namespaces()
+    namespaces.generation(b'ns')
+    client.delete(b'namespace:ns')
+    clock.time.return_value = 2000.0
+    assert namespaces.invalidate(b'ns') == 2000
+    assert namespaces.generation(b'ns') == 2000
+
+
+@pytest.mark.unit()
+def test_namespaced_client_many(clock):
+    namespaces, client = make_namespaces()
+    tenant = namespaces.namespaced_client(b'tenant')
+    assert tenant.set_many({b'a': b'1', b'b': b'2'}) == []
+    assert tenant.get_many([b'a', b'b', b'c']) == {b'a': b'1', b'b': b'2'}
+    tenant.delete_many([b'a'])
+    assert tenant.get_many([b'a', b'b']) == {b'b': b'2'}
+    assert tenant[b'b'] == b'2'
+    with pytest.raises(KeyError):
+        tenant[b'a']
+
+
+@pytest.mark.unit()
+def test_namespaced_client_forwards(clock):
+    namespaces, client = make_namespaces()
+    tenant = namespaces.namespaced_client(b'tenant')
+    assert tenant.add(b'counter', 1) is True
+    assert tenant.incr(b'counter', 2) == 3
+    assert tenant.stats() == client.stats()
+
+
+@pytest.mark.unit()
+def test_namespaced_client_check_key(clock):
+    namespaces, client = make_namespaces()
+    tenant = namespaces.namespaced_client(b'tenant')
+    assert tenant.check_key(u'key') == b'tenant:1000:key'
+    with pytest.raises(MemcacheIllegalInputError):
+        tenant.get(b'key with spaces')
+    with pytest.raises(MemcacheIllegalInputError):
+        tenant.get(b'k' * 250)
+
+
+@pytest.mark.unit()
+def test_get_many_across_namespaces(clock):
+    namespaces, client = make_namespaces()
+    namespaces.namespaced_client(b'a').set(b'key', b'1')
+    namespaces.namespaced_client(b'b').set(b'key', b'2')
+    namespaces._generations.clear()
+    client.get_many.reset_mock()
+
+    result = namespaces.get_many({b'a': [b'key', b'missing'],
+                                  b'b': [b'key'], b'c': [b'key']})
+    assert result == {b'a': {b'key': b'1'}, b'b': {b'key': b'2'}, b'c': {}}
+    # One request for the generations, and one for the keys
+    assert client.get_many.call_count == 2
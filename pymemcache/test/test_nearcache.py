@@ -0,0 +1,163 @@
+import sys
+
+import mock
+import pytest
+
+from pymemcache.nearcache import NearCacheClient, deep_sizeof
+from pymemcache.test._mocks import spy_client
+
+
+CLOCK = 'pymemcache.nearcache'
+
+
+def make_client(**kwargs):
+    backend = spy_client('get', 'get_many')
+    return NearCacheClient(backend, **kwargs), backend
+
+
+@pytest.mark.unit()
+def test_get_is_served_locally(clock):
+    client, backend = make_client()
+    backend.set(b'key', b'value')
+
+    assert client.get(b'key') == b'value'
+    assert client.get(b'key') == b'value'
+    assert backend.get.call_count == 1
+    assert client.get(b'missing', b'default') == b'default'
+
+
+@pytest.mark.unit()
+def test_get_expires(clock):
+    client, backend = make_client(ttl=1)
+    backend.set(b'key', b'value')
+    client.get(b'key')
+
+    clock.time.return_value += 1
+    backend.set(b'key', b'new value')
+    assert client.get(b'key') == b'new value'
+    assert backend.get.call_count == 2
+
+
+@pytest.mark.unit()
+def test_get_many_forwards_misses_only(clock):
+    client, backend = make_client()
+    backend.set_many({b'key1': b'value1', b'key2': b'value2'})
+    client.get(b'key1')
+
+    assert client.get_many([b'key1', b'key2', b'key3']) == {
+        b'key1': b'value1', b'key2': b'value2'}
+    backend.get_many.assert_called_once_with([b'key2', b'key3'])
+
+    assert client.get_many([b'key1', b'key2']) == {
+        b'key1': b'value1', b'key2': b'value2'}
+    assert backend.get_many.call_count == 1
+
+
+@pytest.mark.unit()
+def test_writes_invalidate(clock):
+    client, backend = make_client()
+    client.set(b'key', b'value')
+    assert client.get(b'key') == b'value'
+
+    client.set(b'key', b'new value')
+    assert client.get(b'key') == b'new value'
+
+    client.delete(b'key')
+    assert client.get(b'key') is None
+
+    client.set_many({b'key1': 1, b'key2': 2})
+    assert client.get_many([b'key1', b'key2']) == {b'key1': 1, b'key2': 2}
+    client.incr(b'key1', 1)
+    assert client.get(b'key1') == 2
+    client.delete_many([b'key1', b'key2'])
+    assert client.get_many([b'key1', b'key2']) == {}
+    assert len(client) == 0
+
+
+@pytest.mark.unit()
+def test_fill_racing_with_write_is_dropped(clock):
+    client, backend = make_client()
+    backend.set(b'key', b'old')
+
+    def racing_get(key):
+        # Another thread writes while the value is being fetched
+        client.set(b'key', b'new')
+        return b'old'
+
+    backend.get = racing_get
+    assert client.get(b'key') == b'old'
+    assert len(client) == 0
+
+
+@pytest.mark.unit()
+def test_lru_eviction_by_count(clock):
+    client, backend = make_client(max_items=2)
+    backend.set_many({b'key1': 1, b'key2': 2, b'key3': 3})
+    client.get(b'key1')
+    client.get(b'key2')
+    client.get(b'key1')
+    client.get(b'key3')
+
+    assert list(client._entries) == [b'key1', b'key3']
+
+
+@pytest.mark.unit()
+def test_lru_eviction_by_size(clock):
+    client, backend = make_client(max_bytes=10, sizeof=len)
+    backend.set_many({b'key1': b'x' * 4, b'key2': b'y' * 4,
+                      b'key3': b'z' * 4, b'big': b'b' * 11})
+    # Single gets, get_many doesn't fill the cache in a defined order
+    client.get(b'key1')
+    client.get(b'key2')
+    assert client.size == 8
+
+    client.get(b'key3')
+    assert client.size == 8
+    assert list(client._entries) == [b'key2', b'key3']
+
+    assert client.get(b'big') == b'b' * 11
+    assert b'big' not in client._entries
+
+
+@pytest.mark.unit()
+def test_flush_all_clears(clock):
+    client, backend = make_client()
+    client.set(b'key', b'value')
+    client.get(b'key')
+    backend.flush_all = mock.Mock(return_value=True)
+
+    assert client.flush_all() is True
+    backend.flush_all.assert_called_once_with()
+    assert len(client) == 0
+    assert client.size == 0
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+@pytest.mark.unit()
+def test_deep_sizeof():
+    text = u'x' * 1000
+    assert deep_sizeof([text]) == sys.getsizeof([text]) + sys.getsizeof(text)
+    # Shared objects are counted once
+    assert deep_sizeof([text, text]) < 2 * sys.getsizeof(text)
+    assert deep_sizeof({u'key': [text]}) > sys.getsizeof(text)
+    assert deep_sizeof(Point(text, None)) > sys.getsizeof(text)
+
+    cycle = []
+    cycle.append(cycle)
+    assert deep_sizeof(cycle) == sys.getsizeof(cycle)
+
+
+@pytest.mark.unit()
+def test_max_bytes_counts_contents(clock):
+    client, backend = make_client(max_bytes=4000)
+    backend.set(b'key1', [b'x' * 3000])
+    backend.set(b'key2', {u'a': b'y' * 3000})
+    client.get(b'key1')
+    client.get(b'key2')
+    assert len(client) == 1
+    assert client.size > 3000
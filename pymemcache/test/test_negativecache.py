@@ -0,0 +1,67 @@
+import pytest
+
+from pymemcache.negativecache import NegativeCache
+
+
+CLOCK = 'pymemcache.negativecache'
+
+
+@pytest.mark.unit()
+def test_filter(clock):
+    cache = NegativeCache()
+    assert cache.filter([b'a', b'b']) == ([b'a', b'b'], 0)
+    cache.add_many([b'b'])
+    assert cache.filter([b'a', b'b', b'c']) == ([b'a', b'c'], 0)
+    assert b'b' in cache
+    assert b'a' not in cache
+
+
+@pytest.mark.unit()
+def test_ttl(clock):
+    cache = NegativeCache(ttl=10)
+    cache.add_many([b'a'])
+    clock.time.return_value += 9
+    assert cache.filter([b'a'])[0] == []
+    clock.time.return_value += 1
+    assert b'a' not in cache
+    assert cache.filter([b'a'])[0] == [b'a']
+    assert len(cache) == 0
+
+
+@pytest.mark.unit()
+def test_max_items(clock):
+    cache = NegativeCache(max_items=2)
+    cache.add_many([b'a', b'b'])
+    cache.add_many([b'a'])
+    cache.add_many([b'c'])
+    assert len(cache) == 2
+    assert b'b' not in cache
+    assert b'a' in cache
+    assert b'c' in cache
+
+    with pytest.raises(ValueError):
+        NegativeCache(max_items=0)
+
+
+@pytest.mark.unit()
+def test_discard(clock):
+    cache = NegativeCache()
+    cache.add_many([b'a', b'b'])
+    cache.discard_many([b'a'])
+    assert cache.filter([b'a', b'b'])[0] == [b'a']
+    cache.clear()
+    assert len(cache) == 0
+
+
+@pytest.mark.unit()
+def test_discard_during_read(clock):
+    cache = NegativeCache()
+    keys, generation = cache.filter([b'a'])
+    # A write happened while reading
+    cache.discard_many([b'a'])
+    cache.add_many(keys, generation)
+    assert b'a' not in cache
+
+    keys, generation = cache.filter([b'a'])
+    cache.add_many(keys, generation)
+    assert b'a' in cache
@@ -0,0 +1,107 @@
+import threading
+import unittest
+
+import pytest
+
+from pymemcache import pool
+
+
+@pytest.mark.unit()
+class TestObjectPool(unittest.TestCase):
+    pool_class = pool.ObjectPool
+
+    def test_get_and_release(self):
+        obj_pool = self.pool_class(object)
+        obj = obj_pool.get()
+        assert obj_pool.used == (obj,)
+        assert obj_pool.free == ()
+
+        obj_pool.release(obj)
+        assert obj_pool.used == ()
+        assert obj_pool.free == (obj,)
+        assert obj_pool.get() is obj
+
+    def test_max_size(self):
+        obj_pool = self.pool_class(object, max_size=1)
+        obj = obj_pool.get()
+        with pytest.raises(RuntimeError):
+            obj_pool.get()
+
+        obj_pool.release(obj)
+        assert obj_pool.get() is obj
+
+    def test_destroy(self):
+        removed = []
+        obj_pool = self.pool_class(object, after_remove=removed.append)
+        obj = obj_pool.get()
+        obj_pool.destroy(obj)
+        assert removed == [obj]
+        assert obj_pool.used == ()
+        assert obj_pool.free == ()
+
+    def test_release_unknown(self):
+        obj_pool = self.pool_class(object)
+        obj_pool.release(object())
+        with pytest.raises(ValueError):
+            obj_pool.release(object(), silent=False)
+
+    def test_double_release(self):
+        obj_pool = self.pool_class(object)
+        obj = obj_pool.get()
+        obj_pool.release(obj)
+        obj_pool.release(obj)
+        with pytest.raises(ValueError):
+            obj_pool.release(obj, silent=False)
+        assert obj_pool.free == (obj,)
+        assert obj_pool.get() is not obj_pool.get()
+
+    def test_clear(self):
+        removed = []
+        obj_pool = self.pool_class(object, after_remove=removed.append)
+        obj1 = obj_pool.get()
+        obj2 = obj_pool.get()
+        obj_pool.release(obj1)
+        obj_pool.clear()
+        assert set(removed) == set([obj1, obj2])
+        assert obj_pool.used == ()
+        assert obj_pool.free == ()
+
+    def test_threads(self):
+        obj_pool = self.pool_class(object)
+        seen = []
+
+        def worker():
+            for _ in range(200):
+                with obj_pool.get_and_release() as obj:
+                    seen.append(obj)
+
+        workers = [threading.Thread(target=worker) for _ in range(8)]
+        for worker_thread in workers:
+            worker_thread.start()
+        for worker_thread in workers:
+            worker_thread.join()
+
+        assert len(seen) == 1600
+        assert obj_pool.used == ()
+        assert len(obj_pool.free) <= 8
+
+
+@pytest.mark.unit()
+class TestLockFreeObjectPool(TestObjectPool):
+    pool_class = pool.LockFreeObjectPool
+
+    def test_cleared_object_is_not_reused(self):
+        obj_pool = self.pool_class(object)
+        obj = obj_pool.get()
+        obj_pool.clear()
+        # A late release of an object that was cleared is ignored
+        obj_pool.release(obj)
+        assert obj_pool.get() is not obj
+
+    def test_destroy_free(self):
+        obj_pool = self.pool_class(object)
+        obj = obj_pool.get()
+        obj_pool.release(obj)
+        obj_pool.destroy(obj)
+        assert obj_pool.free == ()
+        assert obj_pool.get() is not obj
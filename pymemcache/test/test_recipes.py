@@ -0,0 +1,320 @@
+import mock
+import pytest
+
+from pymemcache.recipes import cached, stale_while_revalidate
+from pymemcache.test.utils import MockMemcacheClient
+
+
+CLOCK = 'pymemcache.recipes'
+
+
+def make_function(client, **kwargs):
+    calls = []
+
+    @cached(client, key=lambda x: ('key:%d' % x).encode('ascii'), **kwargs)
+    def func(x):
+        calls.append(x)
+        return x * 2
+
+    return func, calls
+
+
+@pytest.mark.unit()
+def test_cached(clock):
+    client = MockMemcacheClient()
+    func, calls = make_function(client, ttl=60)
+
+    assert func(1) == 2
+    assert func(1) == 2
+    assert func(2) == 4
+    assert calls == [1, 2]
+    assert client.get(b'key:1') == (2, 0.0, 1060.0)
+    assert client.get(b'key:1:lock') is None
+
+
+@pytest.mark.unit()
+def test_default_key():
+    client = MockMemcacheClient(allow_unicode_keys=True)
+
+    @cached(client, ttl=60)
+    def func(x, y=0):
+        return x + y
+
+    assert func(1, y=2) == 3
+    keys = list(client._contents)
+    assert len(keys) == 1
+    assert keys[0].startswith('%s.func:' % __name__)
+
+
+@pytest.mark.unit()
+def test_invalidate(clock):
+    client = MockMemcacheClient()
+    func, calls = make_function(client, ttl=60)
+    func(1)
+    func.invalidate(1)
+    func(1)
+    assert calls == [1, 1]
+
+
+@pytest.mark.unit()
+def test_none_is_cached(clock):
+    client = MockMemcacheClient()
+    calls = []
+
+    @cached(client, ttl=60, key=lambda: b'key')
+    def func():
+        calls.append(None)
+
+    assert func() is None
+    assert func() is None
+    assert len(calls) == 1
+
+
+@pytest.mark.unit()
+def test_early_refresh(clock):
+    client = MockMemcacheClient()
+    func, calls = make_function(client, ttl=60)
+    func(1)
+
+    with mock.patch('pymemcache.recipes.random') as random_mock:
+        # log(1 - 0.5) * 0 delta: no early refresh far from the expiry
+        random_mock.random.return_value = 0.5
+        client.set(b'key:1', (2, 10.0, 1060.0))
+        assert func(1) == 2
+        assert calls == [1]
+
+        # 10 * log(0.5) ~ -6.9, recomputed when less than 6.9s are left
+        clock.time.return_value = 1054.0
+        assert func(1) == 2
+        assert calls == [1, 1]
+
+
+@pytest.mark.unit()
+def test_early_refresh_skipped_when_locked(clock):
+    client = MockMemcacheClient()
+    func, calls = make_function(client, ttl=60)
+    client.set(b'key:1', (2, 10.0, 1000.0))
+    client.add(b'key:1:lock', b'1')
+
+    assert func(1) == 2
+    assert calls == []
+
+
+@pytest.mark.unit()
+def test_early_refresh_error_returns_cached_value(clock):
+    client = MockMemcacheClient()
+
+    @cached(client, ttl=60, key=lambda: b'key')
+    def func():
+        raise ValueError('boom')
+
+    client.set(b'key', (2, 10.0, 1000.0))
+    assert func() == 2
+    assert client.get(b'key:lock') is None
+
+    # Without a cached value the error is raised
+    client.delete(b'key')
+    with pytest.raises(ValueError):
+        func()
+
+
+@pytest.mark.unit()
+def test_miss_waits_for_lock_holder(clock):
+    client = MockMemcacheClient()
+    func, calls = make_function(client, ttl=60, beta=0)
+    client.add(b'key:1:lock', b'1')
+
+    def other_worker_stores(interval):
+        client.set(b'key:1', (42, 1.0, 1060.0))
+
+    clock.sleep.side_effect = other_worker_stores
+    assert func(1) == 42
+    assert calls == []
+
+
+@pytest.mark.unit()
+def test_miss_recomputes_after_lock_timeout(clock):
+    client = MockMemcacheClient()
+    func, calls = make_function(client, ttl=60, lock_timeout=1)
+    client.add(b'key:1:lock', b'1')
+
+    def wait(interval):
+        clock.time.return_value += interval
+
+    clock.sleep.side_effect = wait
+    assert func(1) == 2
+    assert calls == [1]
+    # The lock belongs to somebody else
+    assert client.get(b'key:1:lock') == b'1'
+
+
+def make_down_client():
+    # A client ignoring errors, with memcached unreachable
+    client = mock.Mock()
+    client.get.return_value = None
+    client.gets.return_value = None
+    client.add.return_value = False
+    client.set.return_value = False
+    client.cas.return_value = False
+    return client
+
+
+@pytest.mark.unit()
+def test_memcached_down(clock):
+    client = make_down_client()
+    func, calls = make_function(client, ttl=60)
+    clock.sleep.side_effect = AssertionError('waited for the lock')
+
+    assert func(1) == 2
+    assert func(1) == 2
+    assert calls == [1, 1]
+
+
+class FakeExecutor(object):
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, func, *args):
+        self.calls.append((func, args))
+
+    def run(self):
+        calls, self.calls = self.calls, []
+        for func, args in calls:
+            func(*args)
+
+
+def make_swr_function(client, **kwargs):
+    calls = []
+
+    @stale_while_revalidate(client,
+                            key=lambda x: ('key:%d' % x).encode('ascii'),
+                            **kwargs)
+    def func(x):
+        calls.append(x)
+        return x * len(calls)
+
+    return func, calls
+
+
+@pytest.mark.unit()
+def test_swr_fresh(clock):
+    client = MockMemcacheClient()
+    executor = FakeExecutor()
+    func, calls = make_swr_function(client, ttl=60, stale_ttl=300,
+                                    executor=executor)
+
+    assert func(1) == 1
+    assert func(1) == 1
+    assert calls == [1]
+    assert executor.calls == []
+    assert client.get(b'key:1') == (1, 1060.0)
+
+
+@pytest.mark.unit()
+def test_swr_stale_value_served_while_refreshing(clock):
+    client = MockMemcacheClient()
+    executor = FakeExecutor()
+    func, calls = make_swr_function(client, ttl=60, stale_ttl=300,
+                                    executor=executor)
+    func(1)
+
+    clock.time.return_value = 1060.0
+    assert func(1) == 1
+    assert func(1) == 1
+    # A single refresh is scheduled, and holds the lock until it's done
+    assert len(executor.calls) == 1
+    assert client.get(b'key:1:lock') == b'1'
+
+    executor.run()
+    assert calls == [1, 1]
+    assert client.get(b'key:1:lock') is None
+    assert func(1) == 2
+    assert client.get(b'key:1') == (2, 1120.0)
+
+
+@pytest.mark.unit()
+def test_swr_refresh_does_not_overwrite_writes(clock):
+    client = MockMemcacheClient()
+    executor = FakeExecutor()
+    func, calls = make_swr_function(client, ttl=60, stale_ttl=300,
+                                    executor=executor)
+    func(1)
+
+    clock.time.return_value = 1060.0
+    func(1)
+    client.set(b'key:1', (42, 2000.0))
+    executor.run()
+    assert client.get(b'key:1') == (42, 2000.0)
+
+    # Nor resurrect invalidated results
+    clock.time.return_value = 2000.0
+    func(1)
+    func.invalidate(1)
+    executor.run()
+    assert client.get(b'key:1') is None
+
+
+@pytest.mark.unit()
+def test_swr_refresh_error(clock):
+    client = MockMemcacheClient()
+    executor = FakeExecutor()
+    results = [1, ValueError()]
+
+    @stale_while_revalidate(client, ttl=60, stale_ttl=300,
+                            key=lambda: b'key', executor=executor)
+    def func():
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    func()
+    clock.time.return_value = 1060.0
+    assert func() == 1
+    with mock.patch('pymemcache.recipes.logger') as logger:
+        executor.run()
+    assert logger.exception.called
+    assert client.get(b'key:lock') is None
+    assert func() == 1
+    assert len(executor.calls) == 1
+
+
+@pytest.mark.unit()
+def test_swr_default_executor(clock):
+    client = MockMemcacheClient()
+    func, calls = make_swr_function(client, ttl=60, stale_ttl=300)
+    func(1)
+
+    clock.time.return_value = 1060.0
+    with mock.patch('pymemcache.recipes.threading.Thread') as thread:
+        assert func(1) == 1
+    assert thread.return_value.start.called
+    assert thread.return_value.daemon
+
+
+@pytest.mark.unit()
+def test_swr_miss_waits_for_lock_holder(clock):
+    client = MockMemcacheClient()
+    func, calls = make_swr_function(client, ttl=60, stale_ttl=300)
+    client.add(b'key:1:lock', b'1')
+
+    def other_worker_stores(interval):
+        client.set(b'key:1', (42, 1060.0))
+
+    clock.sleep.side_effect = other_worker_stores
+    assert func(1) == 42
+    assert calls == []
+
+
+@pytest.mark.unit()
+def test_swr_memcached_down(clock):
+    client = make_down_client()
+    executor = FakeExecutor()
+    func, calls = make_swr_function(client, ttl=60, stale_ttl=300,
+                                    executor=executor)
+    clock.sleep.side_effect = AssertionError('waited for the lock')
+
+    assert func(1) == 1
+    assert func(1) == 2
+    assert calls == [1, 1]
+    assert executor.calls == []
@@ -201,3 +201,22 @@ def test_rendezvous_names():
 
     for i in range(10):
         assert 'a' == rendezvous.get_node(i)
+
+
+@pytest.mark.unit()
+def test_get_nodes_ranked():
+    nodes = ['node%d' % i for i in range(10)]
+    rendezvous = RendezvousHash(nodes=list(nodes))
+
+    for key in ['a', 'b', 'c', 'd']:
+        ranked = rendezvous.get_nodes_ranked(key, 3)
+        assert len(ranked) == 3
+        assert ranked[0] == rendezvous.get_node(key)
+
+        # The next node is the one the key moves to if the first one is gone
+        rendezvous.remove_node(ranked[0])
+        assert rendezvous.get_node(key) == ranked[1]
+        rendezvous.add_node(ranked[0])
+
+    assert len(rendezvous.get_nodes_ranked('a', 20)) == 10
+    assert RendezvousHash().get_nodes_ranked('a', 2) == []
@@ -1,10 +1,31 @@
 # -*- coding: utf-8 -*-
+import json
+import os
+import random
+import zlib
 from unittest import TestCase
 
 from pymemcache.serde import (python_memcache_serializer,
                               get_python_memcache_serializer,
                               python_memcache_deserializer, FLAG_BYTES,
-                              FLAG_PICKLE, FLAG_INTEGER, FLAG_LONG, FLAG_TEXT)
+                              FLAG_PICKLE, FLAG_INTEGER, FLAG_LONG, FLAG_TEXT,
+                              FLAG_COMPRESSED, FLAG_PICKLE_BUFFERS,
+                              FLAG_FLOAT, FLAG_BOOL, FLAG_NONE, FLAG_JSON,
+                              FLAG_COMPACT, compact_dumps, compact_loads,
+                              FLAG_CHECKSUM, FLAG_ENCRYPTED, SerdePipeline,
+                              SerdeStage, CompressionStage, ChecksumStage,
+                              EncryptionStage, compressing_serializer,
+                              FLAG_ZDICT, DictionaryCompressionStage,
+                              train_dictionary, train_zstd_dictionary,
+                              zstandard, zlib_zdict,
+                              compact_serializer, compact_deserializer,
+                              COMPRESSION_CODECS, SerdeRegistry,
+                              CompressionCodec, compressing_deserializer,
+                              get_compressing_deserializer,
+                              get_compressing_serializer,
+                              pickle_buffers_deserializer,
+                              pickle_buffers_serializer, FLAG_NUMPY, numpy,
+                              numpy_serializer, numpy_deserializer)
 import pytest
 import six
 from six.moves import cPickle as pickle
@@ -83,3 +104,529 @@ class TestSerdePickleVersion2(TestCase):
 class TestSerdePickleVersionHighest(TestCase):
     serializer = get_python_memcache_serializer(
         pickle_version=pickle.HIGHEST_PROTOCOL)
+
+
+@pytest.mark.unit()
+class TestCompressingSerde(TestCase):
+    def check(self, value, expected_flags, **kwargs):
+        serializer = get_compressing_serializer(**kwargs)
+        serialized, flags = serializer(b'key', value)
+        assert flags == expected_flags
+        deserialized = compressing_deserializer(b'key', serialized, flags)
+        assert deserialized == value
+        return serialized
+
+    def test_small_values(self):
+        self.check(b'value', FLAG_BYTES)
+        self.check(1, FLAG_INTEGER)
+        self.check(u'value', FLAG_TEXT)
+
+    def test_large_values(self):
+        serialized = self.check(b'value' * 1000, FLAG_COMPRESSED)
+        assert len(serialized) < 1000
+        self.check(u'value' * 1000, FLAG_TEXT | FLAG_COMPRESSED)
+        self.check({'a': ['value'] * 1000}, FLAG_PICKLE | FLAG_COMPRESSED)
+
+    def test_min_compress_len(self):
+        self.check(b'value' * 10, FLAG_COMPRESSED, min_compress_len=10)
+        self.check(b'value' * 1000, FLAG_BYTES, min_compress_len=10000)
+
+    def test_incompressible(self):
+        value = os.urandom(2000)
+        self.check(value, FLAG_BYTES)
+
+    def test_codecs(self):
+        for name in COMPRESSION_CODECS:
+            self.check(b'value' * 1000, FLAG_COMPRESSED, codec=name)
+
+    def test_custom_codec(self):
+        codec = CompressionCodec('zlib1', None,
+                                 lambda data: zlib.compress(data, 1),
+                                 zlib.decompress)
+        self.check(b'value' * 1000, FLAG_COMPRESSED, codec=codec)
+
+    def test_python_memcache_compatibility(self):
+        # python-memcached stores zlib.compress() output with the flag set
+        value = pickle.dumps({'a': 'dict'})
+        assert compressing_deserializer(
+            b'key', zlib.compress(value),
+            FLAG_PICKLE | FLAG_COMPRESSED) == {'a': 'dict'}
+
+    def test_wrapped_deserializer(self):
+        deserializer = get_compressing_deserializer(
+            lambda key, value, flags: (value, flags))
+        assert deserializer(b'key', zlib.compress(b'value'),
+                            FLAG_COMPRESSED | FLAG_TEXT) == (b'value',
+                                                             FLAG_TEXT)
+
+
+def _rebuild_blob(data):
+    return Blob(data)
+
+
+class Blob(object):
+    """Holds a buffer which is pickled out-of-band with protocol 5."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce_ex__(self, protocol):
+        if protocol >= 5:
+            return _rebuild_blob, (pickle.PickleBuffer(self.data),)
+        return _rebuild_blob, (bytes(self.data),)
+
+
+@pytest.mark.unit()
+class TestPickleBuffersSerde(TestCase):
+    def roundtrip(self, value):
+        serialized, flags = pickle_buffers_serializer(b'key', value)
+        if not isinstance(serialized, six.binary_type):
+            serialized = six.text_type(serialized).encode('ascii')
+        return (pickle_buffers_deserializer(b'key', serialized, flags),
+                serialized, flags)
+
+    def test_native_types(self):
+        for value, expected_flags in [(b'value', FLAG_BYTES),
+                                      (u'value', FLAG_TEXT),
+                                      (1, FLAG_INTEGER)]:
+            deserialized, _, flags = self.roundtrip(value)
+            assert deserialized == value
+            assert flags == expected_flags
+
+    def test_without_buffers(self):
+        deserialized, serialized, flags = self.roundtrip({'a': 'dict'})
+        assert deserialized == {'a': 'dict'}
+        assert flags == FLAG_PICKLE
+        assert python_memcache_deserializer(
+            b'key', serialized, flags) == {'a': 'dict'}
+
+    @pytest.mark.skipif(pickle.HIGHEST_PROTOCOL < 5,
+                        reason='requires pickle protocol 5')
+    def test_out_of_band_buffers(self):
+        value = {'a': Blob(bytearray(b'a' * 1000)),
+                 'b': [Blob(bytearray(b'b' * 10)), Blob(bytearray())]}
+        deserialized, serialized, flags = self.roundtrip(value)
+        assert flags == FLAG_PICKLE | FLAG_PICKLE_BUFFERS
+        assert bytes(deserialized['a'].data) == b'a' * 1000
+        assert bytes(deserialized['b'][0].data) == b'b' * 10
+        assert bytes(deserialized['b'][1].data) == b''
+        # No copy of the received value
+        assert deserialized['a'].data.obj is serialized
+        assert serialized.count(b'a' * 1000) == 1
+
+    def test_invalid_value(self):
+        assert pickle_buffers_deserializer(
+            b'key', b'\x00', FLAG_PICKLE | FLAG_PICKLE_BUFFERS) is None
+
+
+@pytest.mark.unit()
+class TestSerdeRegistry(TestCase):
+    def setUp(self):
+        self.registry = SerdeRegistry()
+
+    def check(self, value, expected_flags):
+        serialized, flags = self.registry.serialize(b'key', value)
+        assert isinstance(serialized, six.binary_type)
+        assert flags == expected_flags
+        deserialized = self.registry.deserialize(b'key', serialized, flags)
+        assert deserialized == value
+        assert type(deserialized) is type(value)
+        return serialized
+
+    def test_compatible_types(self):
+        for value, expected_flags in [(b'value', FLAG_BYTES),
+                                      (u'£ $ €', FLAG_TEXT),
+                                      (123, FLAG_INTEGER),
+                                      ({'a': ('tuple',)}, FLAG_PICKLE)]:
+            serialized = self.check(value, expected_flags)
+            assert python_memcache_deserializer(
+                b'key', serialized, expected_flags) == value
+
+            # And the other way around
+            serialized, flags = python_memcache_serializer(b'key', value)
+            if not isinstance(serialized, six.binary_type):
+                serialized = serialized.encode('ascii')
+            assert self.registry.deserialize(
+                b'key', serialized, flags) == value
+
+    def test_long(self):
+        value = self.registry.deserialize(
+            b'key', b'12345678901234567890', FLAG_LONG)
+        assert value == 12345678901234567890
+        assert value == python_memcache_deserializer(
+            b'key', b'12345678901234567890', FLAG_LONG)
+        assert isinstance(value, six.integer_types)
+
+    def test_float(self):
+        assert self.check(0.1, FLAG_FLOAT) == b'0.1'
+        self.check(-1e300, FLAG_FLOAT)
+        self.check(float('inf'), FLAG_FLOAT)
+
+    def test_bool(self):
+        assert self.check(True, FLAG_BOOL) == b'1'
+        assert self.check(False, FLAG_BOOL) == b'0'
+
+    def test_none(self):
+        assert self.check(None, FLAG_NONE) == b''
+
+    def test_json(self):
+        value = {u'name': u'£', u'count': 1, u'ratio': 0.5, u'ok': True,
+                 u'tags': [u'a', None]}
+        serialized = self.check(value, FLAG_JSON)
+        assert len(serialized) < len(pickle.dumps(value))
+        self.check([1, [2, [3]]], FLAG_JSON)
+        self.check({}, FLAG_JSON)
+
+    def test_json_unsafe_values_are_pickled(self):
+        self.check({1: u'int key'}, FLAG_PICKLE)
+        self.check([(1, 2)], FLAG_PICKLE)
+        self.check({u'set': set([1])}, FLAG_PICKLE)
+        self.check([CustomInt(1)], FLAG_PICKLE)
+        self.check(list(range(65)), FLAG_PICKLE)
+
+    def test_max_json_items(self):
+        self.registry = SerdeRegistry(max_json_items=0)
+        self.check([1], FLAG_PICKLE)
+        self.check([], FLAG_JSON)
+
+    def test_subtype(self):
+        self.check(CustomInt(123), FLAG_PICKLE)
+
+    def test_register(self):
+        self.registry.register(
+            complex, 1 << 16,
+            lambda value: repr(value).encode('ascii'),
+            lambda value: complex(value.decode('ascii')))
+        self.check(1 + 2j, 1 << 16)
+
+    def test_register_fallback(self):
+        self.registry.register(
+            complex, 1 << 16,
+            lambda value: None if value.imag else repr(value).encode('ascii'),
+            lambda value: complex(value.decode('ascii')))
+        self.check(complex(1), 1 << 16)
+        self.check(1 + 2j, FLAG_PICKLE)
+
+    def test_unknown_flags(self):
+        assert self.registry.deserialize(b'key', b'value', 1 << 20) == \
+            b'value'
+
+    def test_pickle_error(self):
+        assert self.registry.deserialize(b'key', b'value', FLAG_PICKLE) is None
+
+    def test_many(self):
+        values = [{u'a': 1}, b'bytes', [1, 2], 0.5, [], {u'b': [None]}]
+        items = self.registry.serialize_many(
+            [(b'key', value) for value in values])
+        assert items == [self.registry.serialize(b'key', value)
+                         for value in values]
+        assert self.registry.deserialize_many(
+            [(b'key', data, flags) for data, flags in items]) == values
+
+    def test_many_invalid_json(self):
+        items = [(b'key1', b'1, 2', FLAG_JSON), (b'key2', b'[3]', FLAG_JSON)]
+        with pytest.raises(ValueError):
+            self.registry.deserialize_many(items)
+        items[0] = (b'key1', b'{}', FLAG_JSON)
+        assert self.registry.deserialize_many(items) == [{}, [3]]
+
+
+@pytest.mark.unit()
+class TestCompactSerde(TestCase):
+    def check(self, value, expected_flags=FLAG_COMPACT):
+        serialized, flags = compact_serializer(b'key', value)
+        if not isinstance(serialized, six.binary_type):
+            serialized = six.text_type(serialized).encode('ascii')
+        assert flags == expected_flags
+        deserialized = compact_deserializer(b'key', serialized, flags)
+        assert deserialized == value
+        assert type(deserialized) is type(value)
+        return serialized
+
+    def test_native_types(self):
+        self.check(b'value', FLAG_BYTES)
+        self.check(u'value', FLAG_TEXT)
+        self.check(1, FLAG_INTEGER)
+
+    def test_scalars(self):
+        assert self.check(None) == b'\xc0'
+        assert self.check(True) == b'\xc3'
+        assert self.check(False) == b'\xc2'
+        self.check(0.1)
+        self.check(float('inf'))
+
+    def test_ints(self):
+        for value in [0, 127, 128, -1, -32, -33, 2 ** 63 - 1, -2 ** 63,
+                      2 ** 63, -2 ** 100]:
+            assert compact_loads(compact_dumps(value)) == value
+        assert compact_dumps(5) == b'\x05'
+        assert compact_dumps(-1) == b'\xff'
+
+    def test_text(self):
+        for value in [u'', u'£ $ €', u'x' * 31, u'x' * 32, u'x' * 100000]:
+            assert compact_loads(compact_dumps(value)) == value
+        assert compact_dumps(u'abc') == b'\xa3abc'
+
+    def test_bytes(self):
+        assert compact_loads(compact_dumps(b'\x00\xff')) == b'\x00\xff'
+        assert type(compact_loads(compact_dumps(b'\x00\xff'))) is bytes
+
+    def test_containers(self):
+        value = {u'name': u'value', u'count': 12, u'ratio': 0.5,
+                 u'tags': [u'a', b'b', None, True],
+                 u'point': (1, -2), 3: {}}
+        serialized = self.check(value)
+        assert len(serialized) < len(pickle.dumps(value, -1))
+        self.check([])
+        self.check(())
+        self.check(list(range(1000)))
+        self.check(dict((i, i) for i in range(20)))
+        self.check([[[[u'nested']]]])
+
+    def test_unsupported_types_are_pickled(self):
+        self.check({u'set': set([1])}, FLAG_PICKLE)
+        self.check([CustomInt(1)], FLAG_PICKLE)
+
+    def test_dumps_unsupported_type(self):
+        with pytest.raises(TypeError):
+            compact_dumps(object())
+
+    def test_loads_memoryview(self):
+        data = compact_dumps([u'abc', b'def'])
+        assert compact_loads(memoryview(data)) == [u'abc', b'def']
+
+    def test_invalid_data(self):
+        with pytest.raises(ValueError):
+            compact_loads(compact_dumps(1) + b'\x00')
+        with pytest.raises(ValueError):
+            compact_loads(b'\xc4')
+        with pytest.raises(ValueError):
+            compact_loads(b'\xdb\x00')
+        assert compact_deserializer(b'key', b'\x92\x01', FLAG_COMPACT) is None
+
+
+class XorCipher(object):
+    def encrypt(self, data):
+        return bytes(bytearray(byte ^ 0x42 for byte in bytearray(data)))
+
+    decrypt = encrypt
+
+
+@pytest.mark.unit()
+class TestSerdePipeline(TestCase):
+    def roundtrip(self, pipeline, value):
+        serialized, flags = pipeline.serialize(b'key', value)
+        assert pipeline.deserialize(b'key', serialized, flags) == value
+        return serialized, flags
+
+    def test_no_stages(self):
+        pipeline = SerdePipeline()
+        assert self.roundtrip(pipeline, 1) == (b'1', FLAG_INTEGER)
+        assert self.roundtrip(pipeline, {'a': 'dict'})[1] == FLAG_PICKLE
+
+    def test_stages(self):
+        pipeline = SerdePipeline(stages=[
+            CompressionStage(), ChecksumStage(), EncryptionStage(XorCipher())])
+        serialized, flags = self.roundtrip(pipeline, u'value' * 1000)
+        assert flags == (FLAG_TEXT | FLAG_COMPRESSED | FLAG_CHECKSUM |
+                         FLAG_ENCRYPTED)
+        checksummed = XorCipher().decrypt(serialized)
+        assert zlib.decompress(checksummed[4:]) == b'value' * 1000
+
+    def test_min_size(self):
+        pipeline = SerdePipeline(stages=[
+            CompressionStage(min_size=100), ChecksumStage(min_size=10)])
+        assert self.roundtrip(pipeline, b'short') == (b'short', FLAG_BYTES)
+        assert self.roundtrip(pipeline, b'x' * 50)[1] == FLAG_CHECKSUM
+        flags = self.roundtrip(pipeline, b'x' * 500)[1]
+        assert flags == FLAG_COMPRESSED | FLAG_CHECKSUM
+
+    def test_incompressible(self):
+        pipeline = SerdePipeline(stages=[CompressionStage(min_size=0)])
+        assert self.roundtrip(pipeline, os.urandom(100))[1] == FLAG_BYTES
+
+    def test_checksum_mismatch(self):
+        pipeline = SerdePipeline(stages=[ChecksumStage()])
+        serialized, flags = pipeline.serialize(b'key', b'value')
+        corrupted = serialized[:-1] + b'x'
+        assert pipeline.deserialize(b'key', corrupted, flags) is None
+
+    def test_values_stored_before_adding_stages(self):
+        serialized, flags = python_memcache_serializer(b'key', u'value')
+        pipeline = SerdePipeline(stages=[ChecksumStage()])
+        assert pipeline.deserialize(b'key', serialized, flags) == u'value'
+
+    def test_compatible_with_compressing_serializer(self):
+        serialized, flags = compressing_serializer(b'key', b'value' * 1000)
+        pipeline = SerdePipeline(stages=[CompressionStage()])
+        assert pipeline.deserialize(b'key', serialized, flags) == \
+            b'value' * 1000
+
+    def test_custom_serializer(self):
+        pipeline = SerdePipeline(compact_serializer, compact_deserializer,
+                                 stages=[ChecksumStage()])
+        assert self.roundtrip(pipeline, [1, 2.5])[1] == (FLAG_COMPACT |
+                                                         FLAG_CHECKSUM)
+
+    def test_many(self):
+        registry = SerdeRegistry()
+        pipeline = SerdePipeline(registry.serialize, registry.deserialize,
+                                 stages=[ChecksumStage()])
+        values = [[1, 2], {u'a': u'b'}, b'bytes']
+        items = pipeline.serialize_many(
+            [(b'key', value) for value in values])
+        assert all(flags & FLAG_CHECKSUM for _, flags in items)
+        assert items == [pipeline.serialize(b'key', value)
+                         for value in values]
+
+        items = [(b'key', data, flags) for data, flags in items]
+        corrupted = items[0][1][:-1] + b'x'
+        items.append((b'key', corrupted, items[0][2]))
+        assert pipeline.deserialize_many(items) == values + [None]
+
+    def test_many_without_batch_hooks(self):
+        pipeline = SerdePipeline(stages=[ChecksumStage()])
+        items = pipeline.serialize_many([(b'key1', 1), (b'key2', u'two')])
+        assert pipeline.deserialize_many(
+            [(b'key', data, flags) for data, flags in items]) == [1, u'two']
+
+    def test_distinct_flags(self):
+        with pytest.raises(ValueError):
+            SerdePipeline(stages=[ChecksumStage(), ChecksumStage()])
+        with pytest.raises(ValueError):
+            SerdePipeline(stages=[SerdeStage()])
+
+
+def _json_documents(count, seed):
+    rng = random.Random(seed)
+    return [json.dumps({
+        'user_id': rng.randint(1, 10 ** 6),
+        'settings': {'theme': rng.choice(['dark', 'light']),
+                     'language': rng.choice(['en-US', 'fr-FR'])},
+        'roles': rng.sample(['admin', 'editor', 'viewer', 'owner'], 2),
+    }).encode('ascii') for _ in range(count)]
+
+
+@pytest.mark.unit()
+class TestDictionaryCompression(TestCase):
+    def test_train_dictionary(self):
+        dictionary = train_dictionary(_json_documents(100, 1), size=512)
+        assert 0 < len(dictionary) <= 512
+        assert b'"language": "' in dictionary
+
+    def test_train_dictionary_without_common_segments(self):
+        assert train_dictionary([b'a' * 10, b'b' * 10]) == b''
+
+    @pytest.mark.skipif(not zlib_zdict, reason='requires zlib zdict')
+    def test_compression(self):
+        dictionary = train_dictionary(_json_documents(200, 1))
+        stage = DictionaryCompressionStage({7: dictionary}, 7)
+        documents = _json_documents(50, 2)
+        size = 0
+        for document in documents:
+            compressed = stage.encode(b'key', document)
+            assert compressed[:4] == b'\x00\x00\x00\x07'
+            assert stage.decode(b'key', compressed) == document
+            size += len(compressed)
+
+        # Much smaller than with zlib alone
+        assert size < sum(len(zlib.compress(document))
+                          for document in documents) / 2
+
+    @pytest.mark.skipif(not zlib_zdict, reason='requires zlib zdict')
+    def test_incompressible(self):
+        stage = DictionaryCompressionStage({1: b'dictionary'}, 1)
+        assert stage.encode(b'key', os.urandom(100)) is None
+
+    @pytest.mark.skipif(not zlib_zdict, reason='requires zlib zdict')
+    def test_rotation(self):
+        old = DictionaryCompressionStage({1: b'"theme": "dark"'}, 1)
+        new = DictionaryCompressionStage(
+            {1: b'"theme": "dark"', 2: b'"language": "en-US"'}, 2)
+        value = b'{"theme": "dark", "language": "en-US"}' * 2
+        assert new.decode(b'key', old.encode(b'key', value)) == value
+        assert new.encode(b'key', value)[:4] == b'\x00\x00\x00\x02'
+
+    @pytest.mark.skipif(not zlib_zdict, reason='requires zlib zdict')
+    def test_pipeline(self):
+        dictionary = train_dictionary(_json_documents(200, 1))
+        pipeline = SerdePipeline(stages=[
+            DictionaryCompressionStage({1: dictionary}, 1, min_size=10)])
+        value = _json_documents(1, 2)[0]
+        serialized, flags = pipeline.serialize(b'key', value)
+        assert flags == FLAG_ZDICT
+        assert pipeline.deserialize(b'key', serialized, flags) == value
+
+        # Values compressed with a dictionary which was dropped are misses
+        pipeline = SerdePipeline(stages=[
+            DictionaryCompressionStage({2: dictionary}, 2)])
+        assert pipeline.deserialize(b'key', serialized, flags) is None
+
+    @pytest.mark.skipif(zlib_zdict, reason='zlib supports zdict')
+    def test_zlib_without_zdict(self):
+        with pytest.raises(ValueError):
+            DictionaryCompressionStage({1: b'dictionary'}, 1)
+
+    @pytest.mark.skipif(zstandard is None, reason='requires zstandard')
+    def test_zstd(self):
+        dictionary = train_zstd_dictionary(_json_documents(1000, 1),
+                                           size=1024)
+        stage = DictionaryCompressionStage({1: dictionary}, 1)
+        value = _json_documents(1, 2)[0]
+        assert stage.decode(b'key', stage.encode(b'key', value)) == value
+
+
+@pytest.mark.unit()
+@pytest.mark.skipif(numpy is None, reason='requires numpy')
+class TestNumpySerde(TestCase):
+    def roundtrip(self, value, expected_flags=FLAG_NUMPY):
+        serialized, flags = numpy_serializer(b'key', value)
+        assert flags == expected_flags
+        deserialized = numpy_deserializer(b'key', serialized, flags)
+        assert type(deserialized) is type(value)
+        assert deserialized.dtype == value.dtype
+        assert deserialized.shape == value.shape
+        assert (deserialized == value).all()
+        return serialized, deserialized
+
+    def test_dtypes(self):
+        for dtype in ['int8', '>i4', 'float64', 'complex64', 'bool',
+                      'datetime64[s]', 'U3', 'S2']:
+            self.roundtrip(numpy.arange(6).astype(dtype).reshape(2, 3))
+        self.roundtrip(numpy.array(1.5, dtype='float32'))
+        self.roundtrip(numpy.zeros((0, 4)))
+
+    def test_zero_copy(self):
+        value = numpy.arange(100, dtype='float64')
+        serialized, deserialized = self.roundtrip(value)
+        assert len(serialized) == 16 + value.nbytes
+        assert not deserialized.flags.writeable
+        assert not deserialized.flags.owndata
+        assert deserialized.flags.aligned
+
+    def test_memory_order(self):
+        value = numpy.asfortranarray(numpy.arange(12).reshape(3, 4))
+        assert self.roundtrip(value)[1].flags.f_contiguous
+        self.roundtrip(numpy.arange(24).reshape(4, 6)[::2, 1::3])
+
+    def test_pickled(self):
+        self.roundtrip(numpy.array([{}, None]), FLAG_PICKLE)
+        self.roundtrip(numpy.zeros(2, dtype=[('a', 'i4'), ('b', 'f8')]),
+                       FLAG_PICKLE)
+        value = numpy.ma.masked_array([1, 2], mask=[0, 1])
+        assert numpy_serializer(b'key', value)[1] == FLAG_PICKLE
+        assert numpy_serializer(b'key', b'bytes') == (b'bytes', FLAG_BYTES)
+
+    def test_corrupted(self):
+        serialized, _ = numpy_serializer(b'key', numpy.arange(10))
+        assert numpy_deserializer(b'key', serialized[:-1], FLAG_NUMPY) is None
+
+    def test_registry(self):
+        registry = SerdeRegistry()
+        value = numpy.arange(10)
+        serialized, flags = registry.serialize(b'key', value)
+        assert flags == FLAG_NUMPY
+        assert (registry.deserialize(b'key', serialized, flags) ==
+                value).all()
+        assert registry.serialize(
+            b'key', numpy.array([None]))[1] == FLAG_PICKLE
@@ -5,6 +5,7 @@ This module is considered public API.
 
 """
 
+import itertools
 import time
 
 import six
@@ -30,6 +31,8 @@ class MockMemcacheClient(object):
                  allow_unicode_keys=False):
 
         self._contents = {}
+        self._cas_ids = {}
+        self._next_cas_id = itertools.count(1)
 
         self.serializer = serializer
         self.deserializer = deserializer
@@ -42,7 +45,7 @@ class MockMemcacheClient(object):
         self.no_delay = no_delay
         self.ignore_exc = ignore_exc
 
-    def get(self, key, default=None):
+    def _check_key(self, key):
         if not self.allow_unicode_keys:
             if isinstance(key, six.text_type):
                 raise MemcacheIllegalInputError(key)
@@ -54,6 +57,10 @@ class MockMemcacheClient(object):
                         key = key.encode('ascii')
                 except (UnicodeEncodeError, UnicodeDecodeError):
                     raise MemcacheIllegalInputError
+        return key
+
+    def get(self, key, default=None):
+        key = self._check_key(key)
 
         if key not in self._contents:
             return default
@@ -67,6 +74,12 @@ class MockMemcacheClient(object):
             return self.deserializer(key, value, flags)
         return value
 
+    def gets(self, key, default=None, cas_default=None):
+        value = self.get(key)
+        if value is None:
+            return default, cas_default
+        return value, self._cas_ids[self._check_key(key)]
+
     def get_many(self, keys):
         out = {}
         for key in keys:
@@ -78,17 +91,7 @@ class MockMemcacheClient(object):
     get_multi = get_many
 
     def set(self, key, value, expire=0, noreply=True):
-        if not self.allow_unicode_keys:
-            if isinstance(key, six.text_type):
-                raise MemcacheIllegalInputError(key)
-            if isinstance(key, six.string_types):
-                try:
-                    if isinstance(key, bytes):
-                        key = key.decode().encode('ascii')
-                    else:
-                        key = key.encode('ascii')
-                except (UnicodeEncodeError, UnicodeDecodeError):
-                    raise MemcacheIllegalInputError
+        key = self._check_key(key)
         if isinstance(value, six.text_type):
             raise MemcacheIllegalInputError(value)
         if (isinstance(value, six.string_types) and
@@ -106,6 +109,7 @@ class MockMemcacheClient(object):
             expire += time.time()
 
         self._contents[key] = expire, value, flags
+        self._cas_ids[key] = ('%d' % next(self._next_cas_id)).encode('ascii')
         return True
 
     def set_many(self, values, expire=None, noreply=True):
@@ -115,6 +119,13 @@ class MockMemcacheClient(object):
 
     set_multi = set_many
 
+    def cas(self, key, value, cas, expire=0, noreply=False):
+        if self.get(key) is None:
+            return None
+        if self._cas_ids[self._check_key(key)] != cas:
+            return False
+        return self.set(key, value, expire, noreply)
+
     def incr(self, key, value, noreply=False):
         current = self.get(key)
         present = current is not None